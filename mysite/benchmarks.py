@@ -0,0 +1,251 @@
+#!/usr/bin/python
+
+# whatis: Benchmarks for the slow parts of CStree, run on made-up scenes so they can be scaled up.
+# Usage: `python benchmarks.py singleparent allvars` (or no args to run them all)
+
+import io
+import sys
+import time
+import copy
+import tracemalloc
+import contextlib
+
+from rich.console import Console
+from rich.table import Table
+
+import csparse
+from csgraph import CSgraph
+from cstree import CStree, Type, bignum
+from varmap import VarMap
+
+console = Console()
+
+# CStree's stages print a lot. Keep that out of the timings' way
+def quiet():
+	stack = contextlib.ExitStack()
+	stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+	stack.enter_context(contextlib.redirect_stderr(io.StringIO()))
+	return stack
+
+def timeit(func, *args):
+	start = time.perf_counter()
+	with quiet():
+		ret = func(*args)
+	return time.perf_counter() - start, ret
+
+# A scene with nlabels labels, each one *goto'd from gotos options of earlier labels' *choice's, so every label has several parents
+def sharedlabelscene(nlabels, gotos=4):
+	lines = ['*create strength 50']
+	for i in range(nlabels):
+		lines.append(f'*label hub{i}')
+		lines.append(f'Hub {i}.')
+		lines.append('*choice')
+		for j in range(1, gotos+1):
+			lines.append(f'\t#Option {j}')
+			lines.append('\t\t*set strength +1')
+			lines.append(f'\t\t*goto hub{min(i+j, nlabels-1)}' if i+j < nlabels else '\t\t*finish')
+	return '\n'.join(lines) + '\n'
+
+# A scene with nblocks *choice's one after the other, each option *set'ing strength its own way, so there are 2**nblocks paths to the end
+def sequentialchoicescene(nblocks):
+	lines = ['*create strength 50']
+	for i in range(nblocks):
+		lines.append(f'*label block{i}')
+		lines.append('*choice')
+		lines.append('\t#Train')
+		lines.append('\t\t*set strength +2')
+		lines.append(f'\t\t*goto block{i+1}')
+		lines.append('\t#Rest')
+		lines.append('\t\t*set strength -1')
+		lines.append(f'\t\t*goto block{i+1}')
+	lines.append(f'*label block{nblocks}')
+	lines.append('*finish')
+	return '\n'.join(lines) + '\n'
+
+# A long scene: nvars vars, then depth *set's one after the other, with a *choice every 10 that can *finish, so there's a path ending at each of those
+def deepscene(depth, nvars=20):
+	lines = [f'*create v{i} {i}' for i in range(nvars)]
+	for i in range(depth):
+		lines.append(f'*set v{i % nvars} +1')
+		if i % 10 == 9:
+			lines.append('*choice')
+			lines.append('\t#Stop here')
+			lines.append('\t\t*finish')
+			lines.append('\t#Go on')
+			lines.append(f'\t\t*goto part{i}')
+			lines.append(f'*label part{i}')
+	lines.append('*finish')
+	return '\n'.join(lines) + '\n'
+
+# nblocks *choice's that each raise one of two stats by its own amount, so each ends up with hundreds of values, then *set's and an *if reading both: allvalues() tries those on every combination (values of a times values of b)
+def twostatscene(nblocks):
+	lines = ['*create a 0', '*create b 0', '*create c 0']
+	for i in range(nblocks):
+		lines.append(f'*label block{i}')
+		lines.append('*choice')
+		lines.append('\t#Study')
+		lines.append(f'\t\t*set a +{i+1}')
+		lines.append(f'\t\t*goto block{i+1}')
+		lines.append('\t#Train')
+		lines.append(f'\t\t*set b +{i+1}')
+		lines.append(f'\t\t*goto block{i+1}')
+	lines.append(f'*label block{nblocks}')
+	lines.append('*set c (a * 2) + (b modulo 7)')
+	lines.append('*set c %+ 10')
+	lines.append('*if (a > b) and (a + b > 50)')
+	lines.append('\t*set c +1')
+	lines.append('*finish')
+	return '\n'.join(lines) + '\n'
+
+def benchsingleparent(labelcounts=(25, 50, 100, 200, 400, 800), gotos=4):
+	table = Table('shared labels', 'nodes', 'gotos added', 'singleparent (s)', 'per label (ms)', title='singleparent')
+	tree = CStree()
+	for nlabels in labelcounts:
+		dot = CSgraph.from_agraph(csparse.scene2agraph(csparse.parsescene(sharedlabelscene(nlabels, gotos))))
+		with quiet():
+			tree.remove_cycles(dot)
+		nodes = len(dot)
+		elapsed, ret = timeit(tree.singleparent, dot)
+		table.add_row(str(nlabels), str(nodes), str(len(dot) - nodes), f'{elapsed:.4f}', f'{elapsed/nlabels*1000:.3f}')
+	console.print(table)
+
+# allvars()'s paths mode against its values mode, and what estimate() makes of the scene (paths, the mode auto would pick, how long it took). Paths mode is left out once it gets past maxpaths paths (it doubles every block)
+def benchallvars(blockcounts=(2, 4, 6, 8, 50, 100, 200, 400), maxpaths=2**8):
+	table = Table('choice blocks', 'nodes', 'paths', 'estimate (ms)', 'auto', 'paths mode (s)', 'memo hits/misses', 'values mode (s)', 'end values', title='allvars')
+	for nblocks in blockcounts:
+		agraph = csparse.scene2agraph(csparse.parsescene(sequentialchoicescene(nblocks)))
+		times = {}
+		memo = '-'
+		for mode in ['paths', 'values']:
+			if mode == 'paths' and 2**nblocks > maxpaths:
+				continue
+			tree = CStree()
+			with quiet():
+				tree.readagraph(agraph)
+			times[mode], ret = timeit(tree.allvars, mode)
+			if mode == 'paths':
+				memo = f'{tree.memohits}/{tree.memomisses}'
+		endvalues = {val for node in tree.nodes.values() if node.type == Type.end for val in node.vars.get('strength', {}).values()}
+		estimatetime, estimated = timeit(tree.estimate)
+		table.add_row(str(nblocks), str(len(tree.nodes)), bignum(estimated['paths']), f'{estimatetime*1000:.2f}', tree.choosemode(estimated), f"{times['paths']:.4f}" if 'paths' in times else '-', memo, f"{times['values']:.4f}", str(len(endvalues)))
+	console.print(table)
+
+# allvars() on deepscene()'s: time and peak memory (tracemalloc), and what handing the vars to a child used to cost (deepcopy of the dict of dicts) against a VarMap *set
+def benchvarmap(depths=(50, 100, 200), nvars=20, reps=1000):
+	table = Table('depth', 'nodes', 'vars', 'allvars (s)', 'peak (MB)', 'deepcopy (us)', 'VarMap.set (us)', title='varmap')
+	for depth in depths:
+		tree = CStree()
+		with quiet():
+			tree.readagraph(csparse.scene2agraph(csparse.parsescene(deepscene(depth, nvars))))
+		tracemalloc.start()
+		elapsed, ret = timeit(tree.allvars, 'paths')
+		current, peak = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+		curvars = {f'v{i}': {'.'.join(str(j) for j in range(depth)): i} for i in range(nvars)}
+		varmap = VarMap()
+		for i in range(nvars):
+			varmap = varmap.set(f'v{i}', i)
+		start = time.perf_counter()
+		for i in range(reps):
+			copy.deepcopy(curvars)
+		deepcopytime = (time.perf_counter() - start) / reps
+		start = time.perf_counter()
+		for i in range(reps):
+			varmap.set('v0', i)
+		settime = (time.perf_counter() - start) / reps
+		table.add_row(str(depth), str(len(tree.nodes)), str(nvars), f'{elapsed:.4f}', f'{peak/1e6:.2f}', f'{deepcopytime*1e6:.1f}', f'{settime*1e6:.2f}')
+	console.print(table)
+
+# allvalues() with vectoreval() doing each *set/*if on all the combinations at once as numpy arrays, against one seteval()/ifeval() per combination
+def benchvector(blockcounts=(5, 10, 20, 30, 40)):
+	table = Table('choice blocks', 'a values', 'b values', 'combinations', 'scalar (s)', 'numpy (s)', 'speedup', title='vector')
+	for nblocks in blockcounts:
+		agraph = csparse.scene2agraph(csparse.parsescene(twostatscene(nblocks)))
+		times = {}
+		for vectorize in [False, True]:
+			tree = CStree()
+			with quiet():
+				tree.readagraph(agraph)
+			times[vectorize], ret = timeit(tree.allvalues, vectorize)
+		end = [node for node in tree.nodes.values() if node.plainlabel.startswith('SET c')][0]
+		avalues, bvalues = len(end.varvalues['a']), len(end.varvalues['b'])
+		table.add_row(str(nblocks), str(avalues), str(bvalues), str(avalues*bvalues), f'{times[False]:.4f}', f'{times[True]:.4f}', f'{times[False]/times[True]:.1f}x')
+	console.print(table)
+
+# sequentialchoicescene() with a way back in each block: an option that *set's strength and *goto's the block's own *label, so a path can go around it any number of times
+def loopscene(nblocks):
+	lines = ['*create strength 50']
+	for i in range(nblocks):
+		lines.append(f'*label block{i}')
+		lines.append('*choice')
+		lines.append('\t#Train again')
+		lines.append('\t\t*set strength +1')
+		lines.append(f'\t\t*goto block{i}')
+		lines.append('\t#Move on')
+		lines.append(f'\t\t*goto block{i+1}')
+	lines.append(f'*label block{nblocks}')
+	lines.append('*finish')
+	return '\n'.join(lines) + '\n'
+
+# A loop with no way out: every path goes around it forever
+def endlessscene():
+	return '*create n 0\n*label top\n*set n +1\n*goto top\n'
+
+# allsamples() on sequentialchoicescene()'s, more walks each time, against values mode (which has every value there is): how long it takes and how many of the values at the end it finds
+def benchsample(nblocks=100, walkcounts=(100, 1000, 10000), workers=1):
+	table = Table('choice blocks', 'walks', 'sample (s)', 'end values found', 'of', 'confidence', title='sample')
+	agraph = csparse.scene2agraph(csparse.parsescene(sequentialchoicescene(nblocks)))
+	tree = CStree()
+	with quiet():
+		tree.readagraph(agraph)
+	tree.allvalues()
+	allvalues = len([node for node in tree.nodes.values() if node.type == Type.end][0].varvalues['strength'])
+	for nwalks in walkcounts:
+		tree = CStree()
+		with quiet():
+			tree.readagraph(agraph)
+		elapsed, ret = timeit(tree.allsamples, nwalks, 0, workers)
+		end = [node for node in tree.nodes.values() if node.type == Type.end][0]
+		table.add_row(str(nblocks), str(nwalks), f'{elapsed:.4f}', str(len(end.varvalues['strength'])), str(allvalues), f'{end.confidence:.1%}')
+	console.print(table)
+	# and on scenes with loops, which walks can go around until they're cut short (see sampler.STEPSPERNODE)
+	table = Table('scene', 'nodes', 'walks', 'sample (s)', 'cut short', title='sample, loops')
+	for name, scene in [(f'loopscene({nblocks})', loopscene(nblocks)), ('endlessscene()', endlessscene())]:
+		tree = CStree()
+		with quiet():
+			tree.readagraph(csparse.scene2agraph(csparse.parsescene(scene)))
+		elapsed, ret = timeit(tree.allsamples, walkcounts[-1], 0, workers)
+		table.add_row(name, str(len(tree.nodes)), str(walkcounts[-1]), f'{elapsed:.4f}', str(tree.truncated))
+	console.print(table)
+
+# countpaths() on sequentialchoicescene()'s and twostatscene()'s: how long it takes, against how many paths it counts
+def benchcountpaths(blockcounts=(10, 50, 100, 200, 400)):
+	table = Table('scene', 'choice blocks', 'nodes', 'paths to the end', 'end values', 'countpaths (s)', title='countpaths')
+	for scene in [sequentialchoicescene, twostatscene]:
+		for nblocks in blockcounts:
+			if scene is twostatscene and nblocks > 50:
+				continue
+			tree = CStree()
+			with quiet():
+				tree.readagraph(csparse.scene2agraph(csparse.parsescene(scene(nblocks))))
+			elapsed, ret = timeit(tree.countpaths)
+			end = [node for node in tree.nodes.values() if node.type == Type.end][0]
+			table.add_row(scene.__name__, str(nblocks), str(len(tree.nodes)), bignum(end.npaths), str(max(len(vals) for vals in end.histogram.values())), f'{elapsed:.4f}')
+	console.print(table)
+
+BENCHMARKS = {
+	'singleparent': benchsingleparent,
+	'allvars': benchallvars,
+	'varmap': benchvarmap,
+	'vector': benchvector,
+	'sample': benchsample,
+	'countpaths': benchcountpaths,
+}
+
+if __name__ == '__main__':
+	names = sys.argv[1:] or list(BENCHMARKS)
+	for name in names:
+		if name not in BENCHMARKS:
+			print(f'Unknown benchmark: {name}. Choose from: {", ".join(BENCHMARKS)}', file=sys.stderr)
+			sys.exit(1)
+		BENCHMARKS[name]()
@@ -0,0 +1,57 @@
+#!/usr/bin/python
+
+# whatis: Analyze a scene from the command line, like the website does (CStree.readscene() then analyze()), with how long each stage took shown on stderr. The dot code goes to stdout, or --out.
+# Usage: `python csanalyze.py ../uploads/mygame-orig.txt --out mygame.dot`. --mode picks the allvars mode (default config's, else auto), --parser the parser (python or java), --workers how many processes sample mode walks on (default one per cpu), --json saves the stages' numbers.
+# --memory N: run with tracemalloc on, snapshotting around each stage (see stagetimer.py), and show each stage's peak and allocated memory, per node and per path, and its top N allocators. Everything runs a lot slower like that, so the times are off.
+
+import sys
+import json
+import argparse
+import tracemalloc
+
+from rich.console import Console
+
+from cstree import CStree
+from stagetimer import StageTimer, timetable, memorytable
+
+consolef = Console(stderr=True)
+
+def main(args):
+	parser = argparse.ArgumentParser(description='Analyze a choicescript scene, timing each stage')
+	parser.add_argument('scene', help='the scene file')
+	parser.add_argument('--mode', help='allvars mode (paths, values, sample or auto; default: config.ini main.allvars, else auto)')
+	parser.add_argument('--parser', help='python or java (default: config.ini main.parser, else python)')
+	parser.add_argument('--csgv', default='../choicescript-graphviz', help="where choicescript-graphviz is, for --parser java")
+	parser.add_argument('--workers', type=int, default=0, help='processes for sample mode to walk on (default 0: one per cpu)')
+	parser.add_argument('--out', help='write the dot code here instead of stdout')
+	parser.add_argument('--json', help="save the stages' numbers here, as JSON")
+	parser.add_argument('--memory', type=int, default=0, metavar='N', help='tracemalloc snapshots around each stage, showing its top N allocators')
+	args = parser.parse_args(args)
+
+	tree = CStree()
+	tree.config.set('main', 'sampleworkers', str(args.workers))
+	tree.stages = StageTimer(args.scene, snapshots=args.memory)
+	if args.memory:
+		tracemalloc.start()
+	try:
+		tree.readscene(args.scene, parser=args.parser, csgvfolder=args.csgv)
+		dotcode = tree.analyze(args.mode)
+	finally:
+		if args.memory:
+			tracemalloc.stop()
+	stages = tree.stages.asdict()
+
+	if args.out:
+		with open(args.out, 'w') as f:
+			f.write(dotcode)
+	else:
+		print(dotcode, end='')
+	consolef.print(timetable(stages, title=args.scene))
+	if args.memory:
+		consolef.print(memorytable(stages, title=f'{args.scene}: memory'))
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump(stages, f, indent=1)
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
@@ -0,0 +1,340 @@
+#!/usr/bin/python
+
+# whatis: Compiles choicescript *set/*if expressions into python functions, once, so allvars() can evaluate them over and over as plain function calls instead of re-interpreting strings with asteval.
+# Choicescript semantics: = is equality (and <=, >=, != still work), %+ and %- are fairmath, & is string concatenation, and/or/not, true/false, "strings", round() and length().
+# Usage: expr = compilecommand('SET strength %+ 20') (or a label like 'IF strength > 15'), then expr({'strength': 50}) -> 60. expr.varnames is the vars it reads, expr.target the var a *set sets.
+# The python code is generated from the tokens here (vars become v['name'] lookups) and run without builtins. *, / and modulo only take numbers (or strings of one), like in choicescript, so a string stat can't be multiplied into a huge string.
+# expr.vectorized() is the same expression over numpy arrays (v['name'] an array, one value per row), for evaluating it on lots of values at once. Only for plain numbers: strings, & and length() aren't vectorized, and without numpy nothing is.
+
+import re
+import math
+from functools import lru_cache
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+import cslog
+
+log = cslog.getlogger('allvars')
+
+class CSExprError(Exception):
+	pass
+
+TOKENS = re.compile(r'''
+	\s*(?:
+	(?P<number>\d+(?:\.\d+)?) |
+	(?P<string>"(?:[^"\\]|\\.)*") |
+	(?P<name>[A-Za-z_][A-Za-z_0-9]*) |
+	(?P<op>%\+|%-|<=|>=|!=|==|=|<|>|\+|-|\*|/|&|\(|\)|,)
+	)''', re.VERBOSE)
+
+COMPARISONS = {'=': '==', '==': '==', '!=': '!=', '<': '<', '>': '>', '<=': '<=', '>=': '>='}
+FUNCTIONS = {'round': 'round', 'length': 'cslength', 'not': 'csnot'}
+KEYWORDS = ['and', 'or', 'not', 'modulo', 'true', 'false'] + list(FUNCTIONS)
+
+# Fairmath, as choicescript does it: %+ moves toward 100 and %- toward 0 by a percentage of the distance left, staying within 1..99
+def fairadd(value, percent):
+	return max(1, min(99, math.floor(value + (100-value)*percent/100)))
+
+def fairsub(value, percent):
+	return max(1, min(99, math.ceil(value - value*percent/100)))
+
+def cat(a, b):
+	return f'{csstr(a)}{csstr(b)}'
+
+def csstr(a):
+	if a is True:
+		return 'true'
+	if a is False:
+		return 'false'
+	return str(a)
+
+# a as a number for *, / and modulo: numbers as is, strings only if they're one (choicescript's "5" * 2 is 10), anything else (true/false, "abc") an error
+def csnum(a):
+	if isinstance(a, bool):
+		raise TypeError(f'not a number: {csstr(a)}')
+	if isinstance(a, (int, float)):
+		return a
+	try:
+		return int(a)
+	except (TypeError, ValueError):
+		pass
+	try:
+		return float(a)
+	except (TypeError, ValueError):
+		raise TypeError(f'not a number: {a!r}') from None
+
+def mul(a, b):
+	return csnum(a) * csnum(b)
+
+def div(a, b):
+	return csnum(a) / csnum(b)
+
+def mod(a, b):
+	return csnum(a) % csnum(b)
+
+def cslength(a):
+	return len(csstr(a))
+
+def csnot(a):
+	return not a
+
+HELPERS = {'__builtins__': {}, 'fairadd': fairadd, 'fairsub': fairsub, 'cat': cat, 'cslength': cslength, 'csnot': csnot, 'round': round, 'mul': mul, 'div': div, 'mod': mod}
+TERMS = {'*': 'mul', '/': 'div', '%': 'mod'}
+
+# The same, elementwise on numpy arrays. and/or give what python's would (an operand, not a bool)
+def npfairadd(value, percent):
+	return np.clip(np.floor(value + (100-value)*percent/100), 1, 99)
+
+def npfairsub(value, percent):
+	return np.clip(np.ceil(value - value*percent/100), 1, 99)
+
+def npand(a, b):
+	return np.where(np.asarray(a) != 0, b, a)
+
+def npor(a, b):
+	return np.where(np.asarray(a) != 0, a, b)
+
+def npnot(a):
+	return np.asarray(a) == 0
+
+NPHELPERS = {'__builtins__': {}, 'fairadd': npfairadd, 'fairsub': npfairsub, 'npand': npand, 'npor': npor, 'csnot': npnot, 'round': np.round if np else None}
+
+def tokenize(src):
+	tokens = []
+	pos = 0
+	src = src.rstrip()
+	while pos < len(src):
+		m = TOKENS.match(src, pos)
+		if m is None or m.end() == pos:
+			raise CSExprError(f'bad token at "{src[pos:]}" in: {src}')
+		kind = m.lastgroup
+		tokens.append((kind, m.group(kind)))
+		pos = m.end()
+	return tokens
+
+# Recursive descent over the tokens, returning python source. Precedence, loosest first: or, and, not, comparisons, + - & %+ %-, * / modulo, unary -
+# With numpy=True, generates code for NPHELPERS instead (see CSExpr.vectorized()), and raises CSExprError for what can't be vectorized
+class Parser():
+	def __init__(self, tokens, src, numpy=False):
+		self.tokens = tokens
+		self.src = src
+		self.numpy = numpy
+		self.pos = 0
+		self.varnames = []
+
+	def peek(self):
+		if self.pos < len(self.tokens):
+			return self.tokens[self.pos]
+		return (None, None)
+
+	def take(self, value=None):
+		token = self.peek()
+		if token[0] is None or (value is not None and token[1] != value):
+			raise CSExprError(f'expected {value or "more"} in: {self.src}')
+		self.pos += 1
+		return token
+
+	def parse(self):
+		code = self.orexpr()
+		if self.pos != len(self.tokens):
+			raise CSExprError(f'unexpected "{self.peek()[1]}" in: {self.src}')
+		return code
+
+	def orexpr(self):
+		code = self.andexpr()
+		while self.peek() == ('name', 'or'):
+			self.take()
+			code = f'npor({code}, {self.andexpr()})' if self.numpy else f'({code} or {self.andexpr()})'
+		return code
+
+	def andexpr(self):
+		code = self.notexpr()
+		while self.peek() == ('name', 'and'):
+			self.take()
+			code = f'npand({code}, {self.notexpr()})' if self.numpy else f'({code} and {self.notexpr()})'
+		return code
+
+	def notexpr(self):
+		if self.peek() == ('name', 'not'):
+			self.take()
+			return f'csnot({self.notexpr()})' if self.numpy else f'(not {self.notexpr()})'
+		return self.comparison()
+
+	def comparison(self):
+		code = self.sum()
+		kind, value = self.peek()
+		if kind == 'op' and value in COMPARISONS:
+			self.take()
+			code = f'({code} {COMPARISONS[value]} {self.sum()})'
+		return code
+
+	def sum(self):
+		code = self.term()
+		while True:
+			kind, value = self.peek()
+			if kind != 'op' or value not in ['+', '-', '&', '%+', '%-']:
+				return code
+			self.take()
+			code = self.binop(value, code, self.term())
+
+	def term(self):
+		code = self.unary()
+		while True:
+			kind, value = self.peek()
+			if (kind, value) == ('name', 'modulo'):
+				value = '%'
+			elif kind != 'op' or value not in ['*', '/']:
+				return code
+			self.take()
+			# numpy arrays are only ever numbers (see vectorized())
+			code = f'({code} {value} {self.unary()})' if self.numpy else f'{TERMS[value]}({code}, {self.unary()})'
+
+	def unary(self):
+		if self.peek() == ('op', '-'):
+			self.take()
+			return f'(-{self.unary()})'
+		return self.atom()
+
+	def atom(self):
+		kind, value = self.take()
+		if kind == 'number':
+			return value
+		if kind == 'string':
+			if self.numpy:
+				raise CSExprError(f'strings are not vectorized: {self.src}')
+			return repr(unquote(value))
+		if kind == 'op' and value == '(':
+			code = self.orexpr()
+			self.take(')')
+			return code
+		if kind == 'name':
+			if value in ['true', 'false']:
+				return str(value == 'true')
+			if value in FUNCTIONS and self.peek() == ('op', '('):
+				if self.numpy and value == 'length':
+					raise CSExprError(f'length() is not vectorized: {self.src}')
+				self.take()
+				code = self.orexpr()
+				self.take(')')
+				return f'{FUNCTIONS[value]}({code})'
+			if value not in self.varnames:
+				self.varnames.append(value)
+			return f'v[{value!r}]'
+		raise CSExprError(f'unexpected "{value}" in: {self.src}')
+
+	def binop(self, op, left, right):
+		if op == '&':
+			if self.numpy:
+				raise CSExprError(f'& is not vectorized: {self.src}')
+			return f'cat({left}, {right})'
+		if op == '%+':
+			return f'fairadd({left}, {right})'
+		if op == '%-':
+			return f'fairsub({left}, {right})'
+		return f'({left} {op} {right})'
+
+def unquote(string):
+	return re.sub(r'\\(.)', r'\1', string[1:-1])
+
+class CSExpr():
+	def __init__(self, src, cmd=None, target=None, display=None):
+		self.src = src
+		self.cmd = cmd
+		self.target = target
+		self.display = src if display is None else display
+		tokens = tokenize(src)
+		parser = Parser(tokens, src)
+		self.code = parser.parse()
+		self.varnames = parser.varnames
+		self.func = eval(compile(f'lambda v: {self.code}', '<choicescript>', 'eval'), HELPERS)
+		self.npfunc = None
+
+	# The expression as a function of numpy arrays (v['name'] an array of values, one per row), or None if it can't be (see top). Unlike calling it, errors aren't caught: call it in np.errstate(all='raise') and fall back to the scalar one on any exception
+	def vectorized(self):
+		if self.npfunc is None:
+			self.npfunc = False
+			if np is not None:
+				try:
+					parser = Parser(tokenize(self.src), self.src, numpy=True)
+					self.npfunc = eval(compile(f'lambda v: {parser.parse()}', '<choicescript>', 'eval'), NPHELPERS)
+				except CSExprError:
+					pass
+		return self.npfunc or None
+
+	# Evaluate with vars (name -> value). Like asteval did, an error (e.g. a var that was never created) is logged (a warning) and gives None
+	def __call__(self, vars):
+		try:
+			return self.func(vars)
+		except Exception as e:
+			log.warning('%s: %s in: %s', type(e).__name__, e, self.display)
+			return None
+
+# Stands in for an expression that didn't compile, so the error only gets reported when it's evaluated (what asteval did)
+class BadExpr():
+	def __init__(self, src, error, cmd=None, target=None, display=None):
+		self.src = src
+		self.error = error
+		self.cmd = cmd
+		self.target = target
+		self.display = src if display is None else display
+		self.varnames = [name for name in dict.fromkeys(re.findall(r'[A-Za-z_][A-Za-z_0-9]*', re.sub(r'"(?:[^"\\]|\\.)*"', '', src))) if name not in KEYWORDS]
+
+	def __call__(self, vars):
+		log.warning('%s', self.error)
+		return None
+
+	def vectorized(self):
+		return None
+
+# Compile a var/cond node's label (what choicescript-graphviz gives: 'SET strength +10', 'IF strength > 15', 'CREATE strength 50', ...). For a *set, an expression starting with an operator applies it to the var itself, like choicescript does
+@lru_cache(maxsize=4096)
+def compilecommand(label):
+	cmd, _, rest = label.strip().partition(' ')
+	target = None
+	if cmd in ['SET', 'CREATE', 'TEMP']:
+		target, _, src = rest.strip().partition(' ')
+		src = src.strip()
+		try:
+			first = tokenize(src)[0] if src else None
+		except CSExprError:
+			first = None
+		if cmd == 'SET' and first is not None and first[0] == 'op' and first[1] in ['+', '-', '*', '/', '%+', '%-', '&']:
+			src = f'{target} {src}'
+	elif cmd == 'ELSE':
+		# what the *if's before it left over, so always true
+		src = 'true'
+	else:
+		src = rest.strip()
+	try:
+		display = ' '.join(token[1] for token in tokenize(src))
+		return CSExpr(src, cmd, target, display)
+	except CSExprError as e:
+		return BadExpr(src, e, cmd, target)
+
+# The value of a choicescript literal ('50', '"bob"', 'true'), for values that are still the source text (what *create leaves in allvars' curvars). Anything else is already a value and is returned as is
+@lru_cache(maxsize=4096)
+def literal(val):
+	try:
+		tokens = tokenize(val)
+	except CSExprError:
+		return val
+	if len(tokens) == 2 and tokens[0] == ('op', '-') and tokens[1][0] == 'number':
+		tokens = [('number', '-' + tokens[1][1])]
+	if len(tokens) != 1:
+		return val
+	kind, value = tokens[0]
+	if kind == 'number':
+		return float(value) if '.' in value else int(value)
+	if kind == 'string':
+		return unquote(value)
+	if value in ['true', 'false']:
+		return value == 'true'
+	return val
+
+def value(val):
+	if isinstance(val, str):
+		return literal(val)
+	return val
@@ -0,0 +1,271 @@
+#!/usr/bin/python
+
+# whatis: CSgraph, a small array-backed directed multigraph for CStree's preprocessing (fixemptylabels, remove_cycles, singleparent, make_csnodes), so those don't go through pygraphviz's string lookups into libcgraph or get converted to networkx over and over. pygraphviz is only used at the edges: from_agraph() to read, to_agraph() for drawing/layout.
+# Nodes are ints 0..n-1 in creation order (names[i] is the graphviz id, e.g. '12'), edges are ints in creation order. shape and startln are typed columns (see SHAPES and UNSET), everything else is a column of strings per attribute name. Successors and predecessors come from CSR arrays (a node's edges are edges[start[i]:start[i+1]]), rebuilt when first needed after a change.
+# get_node()/get_edge()/nodes()/edges() return views that act like pgv's Node/Edge (a str/tuple with .attr), with the same ordering pgv gives, so code written against a pgv.AGraph works as is.
+
+from array import array
+
+import pygraphviz as pgv
+
+# shape column codes. Shapes not in here get added (per graph) as they're seen
+SHAPES = ['', 'box', 'point', 'cds', 'triangle', 'hexagon', 'diamond', 'doublecircle']
+# startln column value for "no startln" (pgv gives '' for these)
+UNSET = -2**31
+
+class NodeAttr():
+	def __init__(self, graph, i):
+		self.graph = graph
+		self.i = i
+
+	def __getitem__(self, key):
+		return self.graph.getnodeattr(self.i, key)
+
+	def __setitem__(self, key, val):
+		self.graph.setnodeattr(self.i, key, val)
+
+class EdgeAttr():
+	def __init__(self, graph, e):
+		self.graph = graph
+		self.e = e
+
+	def __getitem__(self, key):
+		return self.graph.getedgeattr(self.e, key)
+
+	def __setitem__(self, key, val):
+		self.graph.setedgeattr(self.e, key, val)
+
+class NodeView(str):
+	def __new__(cls, graph, i):
+		self = str.__new__(cls, graph.names[i])
+		self.i = i
+		self.attr = NodeAttr(graph, i)
+		return self
+
+class EdgeView(tuple):
+	def __new__(cls, graph, e):
+		self = tuple.__new__(cls, (graph.nodeview(graph.tail[e]), graph.nodeview(graph.head[e])))
+		self.e = e
+		self.attr = EdgeAttr(graph, e)
+		return self
+
+class CSgraph():
+	def __init__(self):
+		self.names = []
+		self.index = {}  # name -> node
+		self.shapes = list(SHAPES)
+		self.shape = array('b')
+		self.startln = array('l')
+		self.nattrs = {}  # attr name -> list of str (None: not set on that node)
+		self.tail = array('l')  # -1: removed edge
+		self.head = array('l')
+		self.estartln = array('l')
+		self.eattrs = {}
+		self.edgemap = {}  # (tail, head) -> its edges, oldest first
+		self.node_defaults = {}
+		self.edge_defaults = {}
+		self.ndeclared = set()	# attrs any node has (pgv gives '' for these if a node doesn't have it, None for the rest)
+		self.edeclared = set()
+		self.views = []
+		self.csr = None
+
+	@classmethod
+	def from_agraph(cls, agraph):
+		graph = cls()
+		graph.node_defaults = dict(agraph.node_attr)
+		graph.edge_defaults = dict(agraph.edge_attr)
+		for n in agraph.nodes():
+			graph.add_node(str(n), **dict(n.attr))	# only what differs from the defaults
+		for e in agraph.edges():
+			graph.add_edge(str(e[0]), str(e[1]), **dict(e.attr))
+		return graph
+
+	def to_agraph(self):
+		agraph = pgv.AGraph(strict=False, directed=True)
+		agraph.node_attr.update(self.node_defaults)
+		agraph.edge_attr.update(self.edge_defaults)
+		for n in self.nodes():
+			agraph.add_node(n, **self.nodeattrs(n.i))
+		for e in self.edges():
+			agraph.add_edge(e[0], e[1], **self.edgeattrs(e.e))
+		return agraph
+
+	def add_node(self, name, **attrs):
+		i = len(self.names)
+		self.names.append(name)
+		self.index[name] = i
+		self.shape.append(0)
+		self.startln.append(UNSET)
+		for col in self.nattrs.values():
+			col.append(None)
+		self.views.append(None)
+		for key, val in attrs.items():
+			self.setnodeattr(i, key, val)
+		self.csr = None
+		return i
+
+	def add_edge(self, u, v, **attrs):
+		e = len(self.tail)
+		self.tail.append(self.index[u])
+		self.head.append(self.index[v])
+		self.edgemap.setdefault((self.tail[e], self.head[e]), []).append(e)
+		self.estartln.append(UNSET)
+		for col in self.eattrs.values():
+			col.append(None)
+		for key, val in attrs.items():
+			self.setedgeattr(e, key, val)
+		self.csr = None
+		return e
+
+	# Like pgv, removes the last u -> v edge added if there are several
+	def remove_edge(self, u, v):
+		e = self.findedge(u, v)
+		self.edgemap[(self.tail[e], self.head[e])].pop()
+		self.tail[e] = -1
+		self.head[e] = -1
+		self.csr = None
+
+	def findedge(self, u, v):
+		try:
+			return self.edgemap[(self.index[u], self.index[v])][-1]
+		except (KeyError, IndexError):
+			raise KeyError(f'Edge {u}-{v} not in graph.')
+
+	def nodeview(self, i):
+		if self.views[i] is None:
+			self.views[i] = NodeView(self, i)
+		return self.views[i]
+
+	def get_node(self, name):
+		try:
+			return self.nodeview(self.index[name])
+		except KeyError:
+			raise KeyError(f'Node {name} not in graph.')
+
+	def get_edge(self, u, v):
+		return EdgeView(self, self.findedge(u, v))
+
+	def has_node(self, name):
+		return name in self.index
+
+	def __contains__(self, name):
+		return name in self.index
+
+	def __iter__(self):
+		return iter(self.nodes())
+
+	def __len__(self):
+		return len(self.names)
+
+	def nodes(self):
+		return [self.nodeview(i) for i in range(len(self.names))]
+
+	# Same order as pgv: by tail, then by head, then oldest first
+	def edges(self):
+		return [EdgeView(self, e) for i in range(len(self.names)) for e in self.outedges(i)]
+
+	def number_of_edges(self):
+		return len(self.tail) - self.tail.count(-1)
+
+	def getnodeattr(self, i, key):
+		if key == 'shape':
+			val = self.shapes[self.shape[i]] if self.shape[i] else None
+		elif key == 'startln':
+			val = None if self.startln[i] == UNSET else str(self.startln[i])
+		else:
+			val = self.nattrs[key][i] if key in self.nattrs else None
+		if val is not None:
+			return val
+		if key in self.node_defaults:
+			return self.node_defaults[key]
+		return '' if key in self.ndeclared else None
+
+	def setnodeattr(self, i, key, val):
+		val = str(val)
+		self.ndeclared.add(key)
+		if key == 'shape' and val:
+			if val not in self.shapes:
+				self.shapes.append(val)
+			self.shape[i] = self.shapes.index(val)
+		elif key == 'startln' and val.lstrip('-').isdigit():
+			self.startln[i] = int(val)
+		else:
+			if key not in self.nattrs:
+				self.nattrs[key] = [None] * len(self.names)
+			self.nattrs[key][i] = val
+
+	def getedgeattr(self, e, key):
+		if key == 'startln' and self.estartln[e] != UNSET:
+			val = str(self.estartln[e])
+		else:
+			val = self.eattrs[key][e] if key in self.eattrs else None
+		if val is not None:
+			return val
+		if key in self.edge_defaults:
+			return self.edge_defaults[key]
+		return '' if key in self.edeclared else None
+
+	def setedgeattr(self, e, key, val):
+		val = str(val)
+		self.edeclared.add(key)
+		if key == 'startln' and val.lstrip('-').isdigit():
+			self.estartln[e] = int(val)
+		else:
+			if key not in self.eattrs:
+				self.eattrs[key] = [None] * len(self.tail)
+			self.eattrs[key][e] = val
+
+	def nodeattrs(self, i):
+		attrs = {}
+		if self.shape[i]:
+			attrs['shape'] = self.shapes[self.shape[i]]
+		if self.startln[i] != UNSET:
+			attrs['startln'] = str(self.startln[i])
+		for key, col in self.nattrs.items():
+			if col[i] is not None:
+				attrs[key] = col[i]
+		return attrs
+
+	def edgeattrs(self, e):
+		attrs = {}
+		if self.estartln[e] != UNSET:
+			attrs['startln'] = str(self.estartln[e])
+		for key, col in self.eattrs.items():
+			if col[e] is not None:
+				attrs[key] = col[e]
+		return attrs
+
+	# CSR successor and predecessor arrays. Successors in pgv's out-edge order (by head, then oldest first), predecessors by tail, then oldest first
+	def buildcsr(self):
+		n = len(self.names)
+		live = [e for e in range(len(self.tail)) if self.tail[e] != -1]
+		self.csr = (self.makecsr(n, sorted(live, key=lambda e: (self.tail[e], self.head[e], e)), self.tail),
+			self.makecsr(n, sorted(live, key=lambda e: (self.head[e], self.tail[e], e)), self.head))
+
+	@staticmethod
+	def makecsr(n, edges, key):
+		start = array('l', [0] * (n+1))
+		for e in edges:
+			start[key[e]+1] += 1
+		for i in range(n):
+			start[i+1] += start[i]
+		return start, array('l', edges)
+
+	def outedges(self, i):
+		if self.csr is None:
+			self.buildcsr()
+		start, edges = self.csr[0]
+		return edges[start[i]:start[i+1]]
+
+	def inedges(self, i):
+		if self.csr is None:
+			self.buildcsr()
+		start, edges = self.csr[1]
+		return edges[start[i]:start[i+1]]
+
+	def successors(self, i):
+		return [self.head[e] for e in self.outedges(i)]
+
+	# Distinct predecessors, in the order networkx's predecessors() would give them
+	def predecessors(self, i):
+		return list(dict.fromkeys(self.tail[e] for e in self.inedges(i)))
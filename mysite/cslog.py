@@ -0,0 +1,49 @@
+#!/usr/bin/python
+
+# whatis: Logging for cstree, instead of printing. Each part has its own logger (getlogger('allvars') is 'cstree.allvars'), so one part's debug output can be turned on without the rest, all going to stderr through rich. Nothing's shown below setup()'s level (default warning).
+# Usage: log = cslog.getlogger('hide'), then log.debug('...%s', arg) (formatted only if shown). In code run once per node, first debug = log.isEnabledFor(cslog.DEBUG), then `if debug: log.debug(...)`, so with debug off it costs one check of a local. log.debug('%s', cslog.Inspected(node)) logs what rich.inspect() would show, made only if shown.
+# Levels: debug (what each stage does to each node), info (a line or so per stage), warning (something wrong with the scene, e.g. *set before *create), error (something wrong with cstree)
+
+import io
+import os
+import logging
+
+from rich import inspect
+from rich.console import Console
+from rich.logging import RichHandler
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+
+root = logging.getLogger('cstree')
+
+def getlogger(name):
+	return root.getChild(name)
+
+# Set how much gets logged: level is a level name (debug, info, warning, error) for all of cstree, optionally followed by name=level's for single parts, e.g. 'warning, allvars=debug'. CSTREE_LOGLEVEL (same form) wins over level. Adds the stderr handler the first time
+def setup(level=None):
+	level = os.getenv('CSTREE_LOGLEVEL') or level or 'warning'
+	if not root.handlers:
+		handler = RichHandler(console=Console(stderr=True), show_path=False, markup=False)
+		handler.setFormatter(logging.Formatter('%(name)s: %(message)s'))
+		root.addHandler(handler)
+		root.propagate = False
+	for part in level.split(','):
+		part = part.strip()
+		if '=' in part:
+			name, partlevel = part.split('=', 1)
+			getlogger(name.strip()).setLevel(partlevel.strip().upper())
+		elif part:
+			root.setLevel(part.upper())
+
+# What rich.inspect() shows for obj, as a log message argument: only made if it's logged
+class Inspected():
+	def __init__(self, obj):
+		self.obj = obj
+
+	def __str__(self):
+		out = io.StringIO()
+		inspect(self.obj, console=Console(file=out, width=100))
+		return out.getvalue()
@@ -0,0 +1,389 @@
+#!/usr/bin/python
+
+# whatis: Pure-Python port of mmitch's choicescript-graphviz parser (the .class files in ../choicescript-graphviz). Parses a choicescript scene into the same nodes and edges `java Main` writes to its .dot file (same ids, startln's, shapes, labels, tooltips, #option and Y/N edges), but straight into memory, so no JVM and no .dot round-trip.
+# Usage: items = parsescene(text), then scene2agraph(items) for CStree.readagraph(), or scene2dot(items) to get the exact text the java parser would have printed (handy for diffing the two parsers).
+# items is a list, in .dot order, of ('node', id, attrs) and ('edge', fromid, toid, attrs), attrs being a dict of the graphviz attributes.
+
+import re
+
+import pygraphviz as pgv
+
+# java's \s (not python's, which also matches unicode spaces)
+JAVA_SPACE = '[ \t\n\x0b\f\r]'
+
+# commands that choicescript-graphviz just treats as text
+TEXT_COMMANDS = ['advertisement', 'link', 'title', 'author', 'comment', 'input_text', 'input_number', 'params', 'script', 'check_achievements', 'bug', 'line_break', 'achieve', 'text_image', 'image', 'page_break']
+
+# java's String.trim() (strips everything <= ' ', not just whitespace)
+def javatrim(s):
+	start = 0
+	end = len(s)
+	while start < end and s[start] <= ' ':
+		start += 1
+	while end > start and s[end-1] <= ' ':
+		end -= 1
+	return s[start:end]
+
+class Node():
+	def __init__(self, scene, indent, startln):
+		self.indent = indent
+		self.id = scene.nextid()
+		self.startln = startln
+		self.next = None
+
+	def append(self, node):
+		self.next = node
+
+	def isdeeper(self, node):
+		return node.indent > self.indent
+
+	# Walk start's chain of next's and hang target onto its loose end (unless the chain already gets there or ends in a goto)
+	def appendifdangling(self, start, target):
+		cur = start
+		while True:
+			if cur is target:
+				return
+			if cur is None:
+				# java: NullPointerException, e.g. an *if with nothing indented under it
+				raise Exception(f'nothing to connect to line {target.startln} (empty *if or #option block?)')
+			if isinstance(cur, GotoNode):
+				return
+			if cur.next is None:
+				cur.append(target)
+				return
+			cur = cur.next
+
+	def dotnode(self, items, shape, color, label, tooltip=None):
+		attrs = {'startln': str(self.startln), 'shape': shape, 'fillcolor': color, 'style': 'filled', 'label': label}
+		if tooltip is not None:
+			attrs['tooltip'] = tooltip
+		items.append(('node', self.id, attrs))
+
+	def dotedgeto(self, items, node, label=None, startln=None):
+		attrs = {}
+		if startln is not None:
+			attrs['startln'] = str(startln)
+		if label is not None:
+			attrs['label'] = label
+		items.append(('edge', self.id, node.id, attrs))
+
+	def dotedgetonext(self, items):
+		if self.next is not None:
+			self.dotedgeto(items, self.next)
+
+class LabelNode(Node):
+	def __init__(self, scene, label, startln):
+		# labels are always at indent 0 (so never "deeper" than anything)
+		Node.__init__(self, scene, 0, startln)
+		self.label = label
+		if label in scene.labels:
+			raise Exception(f"duplicate label `{label}' defined")
+		scene.labels[label] = self
+
+	def format(self, items):
+		self.dotnode(items, 'cds', 'orange', self.label)
+		self.dotedgetonext(items)
+
+class StartNode(LabelNode):
+	def __init__(self, scene):
+		LabelNode.__init__(self, scene, 'START', 0)
+
+	def format(self, items):
+		self.dotnode(items, 'doublecircle', 'chartreuse', 'START')
+		self.dotedgetonext(items)
+
+class EndNode(LabelNode):
+	def __init__(self, scene):
+		LabelNode.__init__(self, scene, 'END', -1)
+
+	def format(self, items):
+		self.dotnode(items, 'doublecircle', 'firebrick', 'END')
+
+class TextNode(Node):
+	def __init__(self, scene, indent, startln):
+		Node.__init__(self, scene, indent, startln)
+		self.text = ''
+
+	def appendtext(self, line):
+		if self.text != '':
+			self.text += ' '
+		self.text += line
+
+	def tooltip(self):
+		length = len(self.text)
+		suffix = ''
+		if length > 100:
+			if length - 100 > 1111:
+				suffix = '....'
+			elif length - 100 > 111:
+				suffix = '...'
+			else:
+				suffix = '..'
+			length = 100
+		return self.text[0:length] + suffix
+
+	def format(self, items):
+		self.dotnode(items, 'box', 'none', f'T[{len(self.text)}]', self.tooltip())
+		self.dotedgetonext(items)
+
+class SceneListNode(Node):
+	def format(self, items):
+		self.dotnode(items, 'box', 'none', 'Put scene list here')
+		self.dotedgetonext(items)
+
+class VariableNode(Node):
+	def __init__(self, scene, indent, vartype, variable, startln):
+		Node.__init__(self, scene, indent, startln)
+		self.vartype = vartype
+		self.variable = variable
+
+	def format(self, items):
+		self.dotnode(items, 'hexagon', 'powderblue', f'{self.vartype} {self.variable}')
+		self.dotedgetonext(items)
+
+class IfNode(Node):
+	def __init__(self, scene, indent, command, condition, startln):
+		Node.__init__(self, scene, indent, startln)
+		self.command = command
+		self.condition = condition
+		self.conditionalpath = None
+
+	def append(self, node):
+		if self.isdeeper(node):
+			self.conditionalpath = node
+		else:
+			self.appendifdangling(self.conditionalpath, node)
+			Node.append(self, node)
+
+	def format(self, items):
+		self.dotnode(items, 'diamond', 'cornsilk', f'{self.command.upper()} {self.condition}')
+		if self.conditionalpath is not None:
+			self.dotedgeto(items, self.conditionalpath, 'Y')
+		if self.next is not None:
+			self.dotedgeto(items, self.next, 'N')
+
+class ChoiceNode(Node):
+	def __init__(self, scene, indent, startln):
+		Node.__init__(self, scene, indent, startln)
+		self.children = []
+
+	def append(self, node):
+		if self.isdeeper(node):
+			self.children.append(node)
+		else:
+			for child in self.children:
+				self.appendifdangling(child, node)
+			Node.append(self, node)
+
+	def format(self, items):
+		self.dotnode(items, 'triangle', 'cornsilk', '?')
+		for child in self.children:
+			target = child.next if child.next is not None else self.next
+			if target is None:
+				# java: NullPointerException
+				raise Exception(f'#option on line {child.startln} leads nowhere')
+			if isinstance(child, SelectionNode):
+				self.dotedgeto(items, target, child.selection, child.startln)
+			else:
+				self.dotedgeto(items, target)
+
+# A #option. Never shows up in the graph itself; its ChoiceNode draws the edge (labeled with the option) to whatever follows it.
+class SelectionNode(Node):
+	def __init__(self, scene, indent, selection, startln):
+		Node.__init__(self, scene, indent, startln)
+		self.selection = selection
+
+	def format(self, items):
+		pass
+
+class GotoNode(Node):
+	def __init__(self, scene, indent, target, startln):
+		Node.__init__(self, scene, indent, startln)
+		# target is a label name (looked up when formatting, so forward *goto's work) or the END node
+		self.target = target
+		self.scene = scene
+
+	def append(self, node):
+		# nothing falls through a *goto
+		pass
+
+	def format(self, items):
+		if self.next is None:
+			if isinstance(self.target, str):
+				self.next = self.scene.labels.get(self.target)
+			else:
+				self.next = self.target
+		self.dotnode(items, 'point', 'none', '')
+		self.dotedgetonext(items)
+
+# Port of choicescript-graphviz's ParseFile (+ Main's output loop)
+class SceneParser():
+	def __init__(self):
+		self.idsequencer = 0
+		self.labels = {}
+		self.nodes = []
+		self.stack = []
+		self.lastindent = 0
+		self.curline = 0
+		self.indenter = ''
+		self.current = None
+		self.current = self.registernewnode(StartNode(self))
+		self.end = self.registernewnode(EndNode(self))
+
+	def nextid(self):
+		id = str(self.idsequencer)
+		self.idsequencer += 1
+		return id
+
+	def registernewnode(self, node):
+		self.nodes.append(node)
+		return node
+
+	def appendnodetocurrent(self, node):
+		if self.current is not None:
+			self.current.append(node)
+		return self.registernewnode(node)
+
+	def parse(self, text):
+		# same line splitting as java's Files.lines()
+		lines = re.split(r'\r\n|\r|\n', text)
+		if lines and lines[-1] == '':
+			del lines[-1]
+		for line in lines:
+			self.parseline(line)
+		return self
+
+	def parseline(self, line):
+		self.curline += 1
+		if re.fullmatch(f'{JAVA_SPACE}*', line):
+			return
+		indent = 0
+		while self.isindented(line):
+			indent += 1
+			line = self.removefirst(line)
+		while indent > self.lastindent:
+			self.stack.append(self.current)
+			self.lastindent += 1
+		while indent < self.lastindent:
+			self.current = self.stack.pop()
+			self.lastindent -= 1
+		line = javatrim(line)
+		if line.startswith('*'):
+			self.parsecommand(indent, self.removefirst(line))
+		elif line.startswith('#'):
+			self.parsechoice(indent, self.removefirst(line).replace('"', ''))
+		else:
+			self.parsetext(indent, line)
+
+	def parsecommand(self, indent, line):
+		split = re.split(f'{JAVA_SPACE}+', line, maxsplit=1)
+		command = split[0]
+		params = ''
+		if len(split) == 2:
+			params = split[1].replace('"', '')
+		if command == 'scene_list':
+			node = SceneListNode(self, indent, self.curline)
+		elif command in ['choice', 'fake_choice']:
+			node = ChoiceNode(self, indent, self.curline)
+		elif command in ['if', 'else', 'elseif', 'elsif']:
+			node = IfNode(self, indent, command, params, self.curline)
+		elif command in ['create', 'set', 'rand', 'temp']:
+			vartype = {'create': 'CREATE', 'set': 'SET', 'rand': 'RANDOM', 'temp': 'TEMP'}[command]
+			node = VariableNode(self, indent, vartype, params, self.curline)
+		elif command in ['goto_scene', 'gosub_scene', 'ending', 'return', 'finish']:
+			node = GotoNode(self, indent, self.end, self.curline)
+		elif command in ['goto', 'gosub']:
+			node = GotoNode(self, indent, params, self.curline)
+		elif command == 'label':
+			node = LabelNode(self, params, self.curline)
+		elif command in ['selectable_if', 'disable_reuse', 'hide_reuse']:
+			split = params.split('#', 1)
+			if len(split) < 2:
+				raise Exception(f"no #option after *{command} in line:\n{line}")
+			self.parsechoice(indent, split[1].replace('"', ''))
+			return
+		elif command in TEXT_COMMANDS:
+			self.parsetext(indent, line)
+			return
+		else:
+			raise Exception(f"unknown command `{command}' in line:\n{line}")
+		self.current = self.appendnodetocurrent(node)
+
+	def parsechoice(self, indent, text):
+		if not self.stack:
+			raise Exception(f'#option outside of a *choice on line {self.curline}')
+		self.current = self.stack[-1]
+		self.current = self.appendnodetocurrent(SelectionNode(self, indent, text, self.curline))
+
+	def parsetext(self, indent, line):
+		if not isinstance(self.current, TextNode):
+			self.current = self.appendnodetocurrent(TextNode(self, indent, self.curline))
+		self.current.appendtext(line)
+
+	def removefirst(self, line):
+		n = 1
+		if line.startswith(' '):
+			n = len(self.indenter)
+		if n > len(line):
+			# java: StringIndexOutOfBoundsException
+			raise Exception(f'inconsistent indentation on line {self.curline}')
+		return line[n:]
+
+	def isindented(self, line):
+		if self.indenter == '':
+			# first indented line decides what one level of indentation is
+			if line.startswith('\t'):
+				self.indenter = '\t'
+			elif line.startswith(' '):
+				self.indenter = ' ' * (len(line) - len(line.lstrip(' ')))
+		if self.indenter == '\t':
+			return line.startswith('\t')
+		return line.startswith(' ')
+
+	def items(self):
+		items = []
+		for node in self.nodes:
+			node.format(items)
+		return items
+
+# Parse choicescript scene text into .dot items (see top of file)
+def parsescene(text):
+	return SceneParser().parse(text).items()
+
+# Parse choicescript scene file into .dot items
+def parsescenefile(scenefile):
+	with open(scenefile, encoding='utf-8') as f:
+		return parsescene(f.read())
+
+# Build the pygraphviz graph pgv.AGraph(dotfile) would have given for the java parser's output (nodes and edges added in the same order, so ids, iteration order, etc. all match)
+def scene2agraph(items):
+	dot = pgv.AGraph(strict=False, directed=True)
+	dot.node_attr['label'] = ''  # what reading the java dot gives. Otherwise empty labels become '\N' (the node id)
+	for item in items:
+		if item[0] == 'node':
+			dot.add_node(item[1], **item[2])
+		else:
+			dot.add_edge(item[1], item[2], **item[3])
+	return dot
+
+# Same text `java Main` prints
+def scene2dot(items):
+	def attrstr(key, val):
+		if key in ['label', 'tooltip']:
+			# java only ever escapes the tooltip, but labels had their quotes stripped anyway
+			val = val.replace('"', '\\"')
+			return f'{key}="{val}"'
+		return f'{key}={val}'
+
+	dotstr = 'digraph {\n'
+	for item in items:
+		if item[0] == 'node':
+			attrs = ','.join(attrstr(k, v) for k, v in item[2].items())
+			dotstr += f' {item[1]} [ {attrs} ];\n'
+		elif item[3]:
+			attrs = ','.join(attrstr(k, v) for k, v in item[3].items())
+			dotstr += f' {item[1]} -> {item[2]} [ {attrs} ];\n'
+		else:
+			dotstr += f' {item[1]} -> {item[2]};\n'
+	dotstr += '}\n'
+	return dotstr
@@ -8,25 +8,34 @@
 import os
 import sys
 import enum
-import copy
+import math
 import re
 import signal
-import subprocess
-import shlex
 import time
-from itertools import product
-from itertools import cycle
+from itertools import cycle, product
+import heapq
 import asyncio
 
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
 from ctree import Ctree
+import csparse
+import cseval
+from csgraph import CSgraph
+from varmap import VarMap
+from pathtrie import PathTrie
+import sampler
+from stagetimer import StageTimer
+import cslog
+from cslog import Inspected
 
 from configparser import ConfigParser
-#import asteval
-from asteval import Interpreter
 
 import pygraphviz as pgv  # See: https://pygraphviz.github.io/documentation/stable/tutorial.html
 # PyGraphviz AGraph reference: https://pygraphviz.github.io/documentation/stable/reference/agraph.html
-import networkx as nx
 
 from rich import inspect
 from rich import print
@@ -48,9 +57,17 @@ from prompt_toolkit.keys import Keys
 
 console = Console()
 consolef = Console(stderr=True)
-safeeval = Interpreter()
 sess = PromptSession()
 
+# one logger per stage (see cslog.py)
+logtree = cslog.getlogger('tree')  # CSnode's, node types, labels, ln lookups
+logcycles = cslog.getlogger('cycles')  # remove_cycles(), singleparent()
+lognodes = cslog.getlogger('nodes')  # make_csnodes()
+logparse = cslog.getlogger('parse')  # readscene()
+logsquash = cslog.getlogger('squash')  # squash_*()
+loghide = cslog.getlogger('hide')  # hide(), addhidden(), hideall()
+logvars = cslog.getlogger('allvars')  # allvars() in all its modes, estimate(), countpaths(), showvars()
+
 def debug_pedge(node):
 	if hasattr(node, 'parent_edge_label'):
 		print(f' \[pedge: {node.parent_edge_label}] ', end='')
@@ -91,26 +108,20 @@ def csexpr(cscode):
 		valuestr = None
 	return (cmd, varname, varvalue, valuestr)
 
-def seteval(cscode, curvars):
-	curvars = curvars.copy()
-	# TODO: check if cscode even uses the var, but for now, just set them all
-	#for perm in allperms(curvars):
-	for varname, varvals in curvars.items():
-		#print(f"\tvar: {varname} = {varvals}")
-		for path, val in varvals.items():
-			#print(f"\t set {varname} = {val}")
-			safeeval(f'{varname} = {val}')
-	cmd, varname, varvalue, valuestr = csexpr(cscode)
-	#if cmd == 'CREATE' or cmd == 'TEMP':	  # no need to even proc these at all
-	#	safeeval(f'{varname} = {varvalue}')
-	#	#print(safeeval.symtable[varname])
-	#elif cmd == 'SET':
-	if varvalue[0] in ['+', '-', '*', '/', '%']:
-		varvalue = f'{varname} {valuestr}'	# need add varname if operator first, cuz choicescript
-	else:
-		varvalue = valuestr
-	#safeeval(f'{varname} = {varvalue}')
-	result = safeeval(f'{varvalue}')
+# The compiled *set/*if of a var/cond node (see cseval.py). Compiled the first time it's needed, then kept on the node
+def nodeexpr(node):
+	if getattr(node, 'exprlabel', None) != node.plainlabel:
+		node.expr = cseval.compilecommand(node.plainlabel)
+		node.exprlabel = node.plainlabel
+	return node.expr
+
+# The vars (var: value, e.g. allvars()' VarMap) the compiled expression reads, with values ready for it
+def bindvars(expr, vars):
+	return {varname: cseval.value(vars[varname]) for varname in expr.varnames if varname in vars}
+
+def seteval(node, vars):
+	expr = nodeexpr(node)
+	result = expr(bindvars(expr, vars))
 	try:
 		result = int(result)
 	except TypeError:
@@ -119,31 +130,54 @@ def seteval(cscode, curvars):
 	except ValueError:
 		# if not an int-able (was a str)
 		pass
-	#print(f'*set {varname} {varvalue} = {result}')
-	return result, f' -> {varvalue} = {result}'
-
-def ifeval(cscode, curvars):
-	def allperms(d):
-		# From: https://stackoverflow.com/questions/15211568/combine-python-dictionary-permutations-into-list-of-dictionaries
-		# delme = oh wait, didn't work (but thought it had to work on the node.vars, not curvars, which has only one value each var, geez)
-		return [dict(zip(d, v)) for v in product(*d.values())]
-
-	curvars = curvars.copy()
-	cscode = re.sub(r'IF', '', cscode)
-	cscode = re.sub(r'=', '==', cscode)  # TODO: check for if already is == ? Maybe unnecessary?
-	#print(f"ifeval'ing: {cscode}")
-	# TODO: check if cscode even uses the var, but for now, just set them all
-	#for perm in allperms(curvars):
-	for varname, varvals in curvars.items():
-		#print(f"\tvar: {varname} = {varvals}")
-		for path, val in varvals.items():
-			#print(f"\t set {varname} = {val}")
-			safeeval(f'{varname} = {val}')
-	# now all vars set, so check the cond
-	ret = safeeval(cscode.strip())
-	#print(f"result: {cscode} -> {ret}")
-	#prompt('k')
-	return ret
+	#print(f'*set {expr.target} {expr.display} = {result}')
+	return result, f' -> {expr.display} = {result}'
+
+def ifeval(node, vars):
+	expr = nodeexpr(node)
+	return expr(bindvars(expr, vars))
+
+# Fewer combinations than this and vectoreval() isn't worth setting up
+VECTORROWS = 64
+
+# expr on every combination of the values of varnames (vars is var: {val: path}, as allvalues() has them) at once, with numpy. Returns (varnames, rows, results): rows is var: which of list(vars[var]) each row has, results is expr's value for each row, rows in the order product() would give them. None if it can't be done that way (no numpy, too few rows, a value or the expression isn't plain numbers, an error like dividing by 0): then do them one by one with seteval()/ifeval(), which also reports the error
+def vectoreval(expr, varnames, vars):
+	func = expr.vectorized()
+	if func is None:
+		return None
+	varnames = [varname for varname in dict.fromkeys(varnames) if varname in vars]
+	sizes = [len(vars[varname]) for varname in varnames]
+	if math.prod(sizes) < VECTORROWS:
+		return None
+	columns = {}
+	for varname in varnames:
+		values = [cseval.value(val) for val in vars[varname]]
+		if not all(type(val) in (int, float) and abs(val) < 2**53 for val in values):
+			return None
+		columns[varname] = np.array(values, dtype=float)
+	index = np.indices(sizes).reshape(len(sizes), -1)
+	rows = {varname: index[i] for i, varname in enumerate(varnames)}
+	try:
+		with np.errstate(all='raise'):
+			results = func({varname: columns[varname][rows[varname]] for varname in varnames})
+	except Exception:
+		return None
+	return varnames, rows, np.broadcast_to(results, index.shape[1:])
+
+# A traversal came back around to a node it's still under (a *goto loop remove_cycles() didn't catch). Used to be a RecursionError
+class LoopError(Exception):
+	pass
+
+# estimate() says the scene is too big for any allvars() mode to do in reasonable time (see CStree.choosemode())
+class TooBigError(Exception):
+	pass
+
+# A big int (like estimate()'s path counts, which can have hundreds of digits) short enough to show, e.g. 1.27e+30
+def bignum(n):
+	digits = str(n)
+	if len(digits) <= 6:
+		return digits
+	return f'{digits[0]}.{digits[1:3]}e+{len(digits)-1}'
 
 class Type(enum.IntEnum):
 	start = 0; end = -1; text = 7; choice = 1; var = 3; label = 4; cond = 5; goto = 6
@@ -213,7 +247,7 @@ def getnodetype(dotnode):
 	try:
 		gototype = dotnode.attr['loopgoto']
 	except IndexError:
-		consolef.print('non-graphviz node has no loopgoto either')
+		logtree.error('non-graphviz node has no loopgoto either')
 		sys.exit(1)
 	if gototype == 0:  # false
 		return Type.loopgoto
@@ -221,7 +255,7 @@ def getnodetype(dotnode):
 		# assume it's a multigoto
 		return Type.multigoto
 	# TODO: throw error?
-	consolef.print('cannot determine node type')
+	logtree.error('cannot determine node type')
 	sys.exit(1)
 	return None
 
@@ -257,7 +291,7 @@ def colorlabel(startln, type, plainlabel):
 			clabel = f'[red]{plainlabel} [grey27](line {startln})'  # TODO: if next node is a goto, this startln is redundant
 		else:
 			clabel = f'[red]{plainlabel}'
-			print('nlg')  # seems imp also
+			logtree.error('nlg')  # seems imp also
 			raise
 	elif type == Type.label:
 		clabel += f'[plum3]{plainlabel}'
@@ -265,7 +299,7 @@ def colorlabel(startln, type, plainlabel):
 		if int(startln) >= 0:
 			clabel = f'[red]{plainlabel} [grey27](line {startln})'
 		else:
-			print('imp?')
+			logtree.error('imp?')
 			raise
 	elif type == Type.option:
 		clabel += f'[orange3]{plainlabel}'
@@ -305,7 +339,7 @@ class CSnode(Ctree):
 			if type(dotnode) is int:
 				dotnode = str(dotnode)
 			elif type(dotnode) is not str:
-				print(f'Trying to init a CSnode with id of {dotnode}')
+				logtree.error('Trying to init a CSnode with id of %s', dotnode)
 				sys.exit(1)
 		if type(dotnode) is not str:
 			nodetype = getnodetype(dotnode)
@@ -333,6 +367,14 @@ class CSnode(Ctree):
 		self.closed = False
 		self.squasheds = []
 		self.vars = {}
+		self.varvalues = {}  # var: {val: how many of its paths have it}, kept by setvar()
+		self.nmultivals = 0  # how many vars have more than one value
+		self.samples = 0  # allvars()' sample mode: how many walks came through here (see allsamples())
+		self.samplecounts = {}  # var: {val: how many of those walks had it}
+		self.confidence = None  # about how many of all the paths through here have one of the values the sampling saw (0 to 1, see sampler.confidence())
+		self.npaths = None  # countpaths(): how many paths from the start get here
+		self.histogram = {}  # countpaths(): var: {val: how many of those paths have it}
+		self.unbounded = set()  # values mode: vars that had more than main.maxvalues values here (going around a loop), so only some are in vars
 		if hasattr(dotnode, 'attr'):
 			oldgoto = dotnode.attr['oldgoto']
 			if oldgoto:
@@ -424,10 +466,7 @@ class CSnode(Ctree):
 #					consolef = Console(file=report_file)
 #					consolef.rule(f"Report Generated {datetime.now().ctime()}")
 #					inspect(self.tree.cur.children[0], console=consolef)
-				consolef.rule(f"Report Generated datetime.now().ctime()")
-				inspect(self.tree.cur, console=consolef)
-				inspect(self.tree.cur.children, console=consolef)
-				inspect(self.tree.cur.children[0], console=consolef)
+				logtree.error('gochildren: child is not a CSnode\n%s%s%s', Inspected(self.tree.cur), Inspected(self.tree.cur.children), Inspected(self.tree.cur.children[0]))
 				sys.exit(2)
 			return self.tree.cur
 		else:
@@ -539,6 +578,38 @@ class CSnode(Ctree):
 			else:
 				self.label.renderables.append(labelchild)
 
+	# node.vars[var][path] = val, keeping varvalues and nmultivals up to date so multival() doesn't have to look through the paths
+	def setvar(self, var, path, val):
+		paths = self.vars.setdefault(var, {})
+		counts = self.varvalues.setdefault(var, {})
+		wasmulti = len(counts) > 1
+		if path in paths:
+			old = paths[path]
+			counts[old] -= 1
+			if counts[old] == 0:
+				del counts[old]
+		paths[path] = val
+		counts[val] = counts.get(val, 0) + 1
+		self.nmultivals += (len(counts) > 1) - wasmulti
+
+	# node.vars[var] = paths (path: val), same as setvar()'ing each one but replacing whatever var had
+	def setvars(self, var, paths):
+		counts = {}
+		for val in paths.values():
+			counts[val] = counts.get(val, 0) + 1
+		self.nmultivals += (len(counts) > 1) - (len(self.varvalues.get(var, ())) > 1)
+		self.vars[var] = paths
+		self.varvalues[var] = counts
+
+	def clearvars(self):
+		self.vars = {}
+		self.varvalues = {}
+		self.nmultivals = 0
+		self.samples = 0
+		self.samplecounts = {}
+		self.confidence = None
+		self.unbounded = set()
+
 	# Children of node become children of parent. (Remove node done elsewhere.)
 	def squash(self):
 		# after the two nodes squashed together, call this to combine their labels in the right way (so far, does nothing except for Type.text where it merges with parent (which will always be a *label since squash_label() only calls squash() in this case)
@@ -573,7 +644,7 @@ class CSnode(Ctree):
 				#inspect(self.parent)
 				#prompt('after')
 			else:
-				print('should never happen')
+				logsquash.error('should never happen')
 				raise
 			# from previous version: (del?)
 			# v.parent.tooltip += v.tooltip  # += just in case already had, but... ever happen?
@@ -643,27 +714,28 @@ class CSnode(Ctree):
 
 		def showvars_long():
 			tablevars = []
-			# tablevars: [[1.2, str, 17], [1.2.7, str, 18], [1.2, int, 7], ... ]
+			# tablevars: [[1.2, str, 17], [1.2.7, str, 18], [1.2, int, 7], ... ] (paths as self.tree.paths ids)
 			for var, paths in self.vars.items():
 				if var in showvars:
 					for path, val in paths.copy().items():
 						tablevars.append([path, var, str(val)])
-			tablevars.sort(key=lambda x: sum(map(int, x[0].split('.'))))
-			curpath = ''
+			tablevars.sort(key=lambda x: self.tree.paths.sum[x[0]])
+			curpath = None
 			row = ''
 			for path in tablevars:
 				color = self.tree.varcolors[path[1]]
 				if path[0] != curpath:
+					pathstr = self.tree.paths.str(path[0])
 					# new path, so show path
 					if not row:
 						# new row, so make row
 						color = self.tree.varcolors[path[1]]
-						row = f"[{self.tree.config.get('default colors', 'path')}]{path[0]}: [white on {color}]{path[1]}[{self.tree.config.get('default colors', 'equals')} on default]=[{self.tree.config.get('default colors', 'varvalue')}]{path[2]} "
+						row = f"[{self.tree.config.get('default colors', 'path')}]{pathstr}: [white on {color}]{path[1]}[{self.tree.config.get('default colors', 'equals')} on default]=[{self.tree.config.get('default colors', 'varvalue')}]{path[2]} "
 					else:
 						# append another path to row (\n if perline)
 						if perline:
 							row += '\n'
-						row += f"[{self.tree.config.get('default colors', 'path')}]{path[0]}: [white on {color}]{path[1]}[{self.tree.config.get('default colors', 'equals')} on default]=[{self.tree.config.get('default colors', 'varvalue')}]{path[2]} "
+						row += f"[{self.tree.config.get('default colors', 'path')}]{pathstr}: [white on {color}]{path[1]}[{self.tree.config.get('default colors', 'equals')} on default]=[{self.tree.config.get('default colors', 'varvalue')}]{path[2]} "
 				else:
 					# not a new path, append to row without path marker
 					row += f"[white on {color}]{path[1]}[{self.tree.config.get('default colors', 'equals')} on default]=[{self.tree.config.get('default colors', 'varvalue')}]{path[2]} "
@@ -696,29 +768,27 @@ class CSnode(Ctree):
 		colorcycle = cycle(vardark)
 		for var, paths in self.vars.items():
 			for path, val in paths.copy().items():
-				tablevars.append([path, var, str(val)])
+				tablevars.append([self.tree.paths.str(path), var, str(val)])
 		tablevars.sort()
 		curpath = ''
 		row = ''
 		for path in tablevars:
 			path = path.copy()
-			print(f'cp: "{curpath}" - "{path[0]}", {path[1]}, {path[2]}')
+			logvars.debug('cp: "%s" - "%s", %s, %s', curpath, path[0], path[1], path[2])
 			#prompt()
 			if path[0] != curpath:
 				if row:
-					print('writing row')
+					logvars.debug('writing row')
 					self.label_append(row)
-				print('new row')
+				logvars.debug('new row')
 				row = f'{path[0]}: [on {next(colorcycle)}]{path[1]}={path[2]}'
 			else:
-				print('append to row')
+				logvars.debug('append to row')
 				row += f'[on {next(colorcycle)}]{path[1]}={path[2]}'
-			print(f'setting curpath:	"{curpath}" = path0: "{path[0]}"')
 			curpath = path[0]
-			print(f'is it set? curpath: "{curpath}" = path0: "{path[0]}"')
 		# last one
 		if row:
-			print('writing last row')
+			logvars.debug('writing last row')
 			self.label_append(row)
 
 	def append2toplabel(self, toappend):
@@ -752,29 +822,30 @@ class CSnode(Ctree):
 		# debugging note: checked swallowed for parent_edge_label here, always had, but sometimes '', other times was what shows in xdot, but Y's did not
 		if not hasattr(self, 'hiddens'):
 			self.hiddens = []
-		print(f'before: on [{self.startln}]')
-		inspect(self.hiddens)
-		inspect(swallowed.label)
+		debug = loghide.isEnabledFor(cslog.DEBUG)
+		if debug:
+			loghide.debug('addhidden: on [%s], hiddens before: %s, swallowing: %s', self.startln, self.hiddens, swallowed.label)
 		if not isinstance(swallowed.label, Group):
-			print(f'swallow {swallowed.label} not a group. Hiding: {nostyle(swallowed.label)}')
+			if debug:
+				loghide.debug('swallow %s not a group. Hiding: %s', swallowed.label, nostyle(swallowed.label))
 			if prepend:
 				self.hiddens = [nostyle(swallowed.label)] + self.hiddens
 			else:
 				self.hiddens.append(nostyle(swallowed.label))
 		else:
-			print(f'swallow is a group')
+			if debug:
+				loghide.debug('swallow is a group')
 			if not prepend:
 				ret = self.hiddens
 			else:
 				ret = []
-			print(f'ret set to {ret}')
 			for hidden in swallowed.label.renderables:
 				ret.append(nostyle(hidden))
-			print(f'now ret is {ret}')
 			if prepend:
 				ret.extend(self.hiddens)
 			self.hiddens = ret
-		print('after')
+		if debug:
+			loghide.debug('addhidden: hiddens after: %s', self.hiddens)
 		#inspect(self.hiddens)
 		#if int(swallowed.startln) in [4, 15, 19, 24, 35, 37, 48, 51, 56]:
 		#	prompt()
@@ -790,12 +861,11 @@ class CSnode(Ctree):
 	def hide(self, updatecur=True):
 		# can call this on a ... or next to it above or below
 		if not self.parent:
-			consolef.rule(f'HIDE: {self.plainlabel} - ' + str(subprocess.check_output(shlex.split('date +%I:%M'))) + ' - Cannot hide STARTing node')
+			loghide.debug('HIDE: %s - Cannot hide STARTing node', self.plainlabel)
 			return
-		consolef.rule(f'HIDE: {self.plainlabel} - ' + str(subprocess.check_output(shlex.split('date +%I:%M'))))
-		consolef.print(f'parent\'s label = {self.parent.plainlabel} / {self.parent.label}')
+		loghide.debug("HIDE: %s (parent's label = %s / %s)", self.plainlabel, self.parent.plainlabel, self.parent.label)
 		if self.parent is not None and self.parent.type == Type.hidenode:
-			consolef.print('Parent is a ... case')  # assumes parent of Type.closenode is impossible
+			loghide.debug('Parent is a ... case')  # assumes parent of Type.closenode is impossible
 			# parent is hidden [s]parent is closed or hidden...[/s] no wait, closed ... by definition has no children (and could go by plainlabel for this (impossible) case)
 			if len(self.parent.children) == 1:
 				self.parent.addhidden(self)
@@ -811,15 +881,15 @@ class CSnode(Ctree):
 					# Usually child becomes cur, but if no child, parent
 					self.parent.makecur()
 			else:
-				consolef.print(f'Parent cannot have multiple children')
+				loghide.debug('Parent cannot have multiple children')
 			# TODO: what about next/prev?
 		elif self.children and len(self.children) == 1 and self.children[0].type == Type.hidenode:
-			consolef.print(f'child is a ... case: {self.children[0].plainlabel} / {self.children[0].label}')
+			loghide.debug('child is a ... case: %s / %s', self.children[0].plainlabel, self.children[0].label)
 			self.children[0].addhidden(self)
 			# if there's a pedge, copy it over (TODO: what do if already had a pedge?)
 			if hasattr(self, 'parent_edge_label'):
 				if hasattr(self.children[0], 'parent_edge_label'):
-					print('already has pedge')
+					loghide.error('already has pedge')
 					sys.exit(1)
 				else:
 					self.children[0].parent_edge_label = self.parent_edge_label
@@ -830,15 +900,12 @@ class CSnode(Ctree):
 				try:
 					idx = self.parent.children.index(self)
 				except ValueError:
-					consolef.rule('should never happen: not in own parent\'s children')
 					# hit hide() twice, said not in list
-					inspect(self, console=consolef)
-					inspect(self.parent, console=consolef)
-					inspect(self.parent.children, console=consolef)
+					loghide.error("should never happen: not in own parent's children\n%s%s%s", Inspected(self), Inspected(self.parent), Inspected(self.parent.children))
 					sys.exit(1)
 				self.parent.children[idx] = self.children[0]
 			else:
-				consolef.print('Impossible')
+				loghide.error('Impossible')
 			# update next/prev
 			if self.next:
 				self.children[0].next = self.next
@@ -853,7 +920,7 @@ class CSnode(Ctree):
 				self.children[0].makecur()
 			# TODO: trueself stuff here
 		elif self.type == Type.hidenode:
-			consolef.print(f'self case: {self.plainlabel} / {self.label}')
+			loghide.debug('self case: %s / %s', self.plainlabel, self.label)
 			# self is already a ... node, so consume child, if any
 			if len(self.children) == 1:
 				self.addhidden(self)
@@ -861,7 +928,7 @@ class CSnode(Ctree):
 				self.children[0].parent = self
 				self.children = self.children[0].children
 			else:
-				consolef.print(f"can't hide: no children or multiple children")
+				loghide.debug("can't hide: no children or multiple children")
 				# TODO: no children case maybe hide upwards
 			# TODO: what about next/prev?
 		elif len(self.children) > 1:
@@ -869,7 +936,7 @@ class CSnode(Ctree):
 			pass
 		else:
 			# No ...'s anywhere, so turn self into a ... and hide child inside
-			consolef.print(f'no ... (new node) self case: {self.plainlabel} / {self.label}')
+			loghide.debug('no ... (new node) self case: %s / %s', self.plainlabel, self.label)
 			#nodots = True
 			hidedots = self.tree.newnode('...')
 			hidedots.type = Type.hidenode
@@ -890,10 +957,7 @@ class CSnode(Ctree):
 					# give new node old node's child's children
 					hidedots.children = self.children[0].children
 				except IndexError:
-					consolef.rule('[0] no good')
-					inspect(self, console=consolef)
-					inspect(self.parent, console=consolef)
-					inspect(self.parent.children, console=consolef)
+					loghide.error('[0] no good\n%s%s%s', Inspected(self), Inspected(self.parent), Inspected(self.parent.children))
 					sys.exit(1)
 				# give new ... node its hiddens property (children[0] known to exist at this point)
 				hidedots.addhidden(self.children[0])
@@ -901,7 +965,7 @@ class CSnode(Ctree):
 					# make new parentage bidirectional
 					self.children[0].parent = hidedots
 				except:
-					consolef.rule('could not make child\'s parent into hidedots')
+					loghide.error("could not make child's parent into hidedots")
 					raise
 				# Update child's child's parent
 				if self.children[0].children:
@@ -917,11 +981,8 @@ class CSnode(Ctree):
 			try:
 				idx = self.parent.children.index(self)
 			except ValueError:
-				consolef.rule('# hit hide() twice, said not in list')
 				# hit hide() twice, said not in list
-				inspect(self, console=consolef)
-				inspect(self.parent, console=consolef)
-				inspect(self.parent.children, console=consolef)
+				loghide.error('hit hide() twice, said not in list\n%s%s%s', Inspected(self), Inspected(self.parent), Inspected(self.parent.children))
 				sys.exit(1)
 			self.parent.children[idx] = hidedots  # removes self? Should.
 
@@ -962,6 +1023,72 @@ class CSnode(Ctree):
 
 # End of class CSnode(Ctree)
 
+# CStree.nodes: a dict of id -> CSnode that also keeps an index of startln -> ids, so ln2id() doesn't have to scan every node. Kept up to date by whatever adds, replaces or removes nodes (make_csnodes, newnode, rereading a scene into the same tree)
+class NodeDict(dict):
+	def __init__(self):
+		super().__init__()
+		self.bystartln = {}
+		self.order = {}  # id -> when it was first added, since ln2id() wants the first node (in dict order) with a startln
+		self.added = 0
+
+	def lnkey(self, node):
+		try:
+			return int(node.startln)
+		except ValueError:
+			# some nodes have no startln like new nodes created by remove_cycles and singleparent
+			return None
+
+	def __setitem__(self, id, node):
+		if id in self:
+			self.unindex(id)
+		else:
+			self.order[id] = self.added
+			self.added += 1
+		super().__setitem__(id, node)
+		ln = self.lnkey(node)
+		if ln is not None:
+			self.bystartln.setdefault(ln, []).append(id)
+
+	def unindex(self, id):
+		ln = self.lnkey(self[id])
+		if ln is not None:
+			self.bystartln[ln].remove(id)
+			if not self.bystartln[ln]:
+				del self.bystartln[ln]
+
+	def __delitem__(self, id):
+		self.unindex(id)
+		del self.order[id]
+		super().__delitem__(id)
+
+	def pop(self, id, *default):
+		if id not in self:
+			return super().pop(id, *default)
+		node = self[id]
+		del self[id]
+		return node
+
+	def clear(self):
+		super().clear()
+		self.bystartln.clear()
+		self.order.clear()
+
+	def update(self, *args, **kwargs):
+		for id, node in dict(*args, **kwargs).items():
+			self[id] = node
+
+	def setdefault(self, id, node=None):
+		if id not in self:
+			self[id] = node
+		return self[id]
+
+	# id of the first node with this startln, else None
+	def startln2id(self, linenum):
+		ids = self.bystartln.get(linenum)
+		if not ids:
+			return None
+		return min(ids, key=self.order.get)
+
 class CStree():
 	def __init__(self, configfile=None):
 		def mkdir_p(path):
@@ -976,12 +1103,19 @@ class CStree():
 		self.cur: CSnode = None
 		self.maxid = '0'
 		self.dot_orig: pgv.AGraph
-		self.dot_acyclic: pgv.AGraph
+		self.dot_acyclic: CSgraph
 		# self.nodes: CSnode  # list of them, so...
-		self.nodes = {}
+		self.nodes = NodeDict()
 		self.allvarnames = []
 		self.colorcycle = cycle(vardark + varlight)
 		self.varcolors = {}
+		self.paths = PathTrie()  # what node.vars' paths are ids of
+		self.memohits = 0  # allvars() traversals skipped because it had done them already
+		self.memomisses = 0
+		self.estimated = None  # what estimate() last came up with, and the mode choosemode() picked from it
+		self.mode = None  # the mode allvars() last ran in
+		self.truncated = 0  # sampled paths allsamples() cut short for going around a loop
+		self.stages = StageTimer()  # how long each stage took (see stage()). Replace it with a new one to start over
 		self.config = ConfigParser()
 
 		if configfile is None:
@@ -1001,6 +1135,18 @@ class CStree():
 			config.set('main', 'selected', 'reverse')
 			config.set('main', 'default_squasheds', 'goto, label, text, choice, option')      # squashed means could be visible but becomes part of parent node
 			config.set('main', 'hidden commands', 'comment, page_break, line_break')  # hidden means not visible
+			config.set('main', 'parser', 'python')  # python (csparse), pool (csparse on parserpool workers) or java (choicescript-graphviz)
+			config.set('main', 'allvars', 'auto')  # paths (every path's values), values (just the values each var can have, for big games), sample (the values on some random paths) or auto (pick one from estimate())
+			config.set('main', 'maxpaths', '10000')  # auto: paths mode up to this many paths through the scene...
+			config.set('main', 'maxvardepth', '500')  # ...and this many var nodes on one path
+			config.set('main', 'bigmode', 'values')  # auto: values or sample, for scenes past those
+			config.set('main', 'samples', '1000')  # sample: how many paths
+			config.set('main', 'sampleseed', '0')
+			config.set('main', 'sampleworkers', '1')  # sample: processes to walk them on (1: just this one, 0: one per cpu, each run starting a pool of them)
+			config.set('main', 'maxvalues', '100')  # values: most values a var can pile up at a node by going around a loop (a *set before a *goto back up) before it's marked unbounded
+			config.set('main', 'maxstates', '100000')  # countpaths(): most different sets of values at one node before it gives up
+			config.set('main', 'loglevel', 'warning')  # debug, info, warning or error, then optionally stage=level's, e.g. 'warning, allvars=debug' (see cslog.py). CSTREE_LOGLEVEL wins over it
+			config.set('main', 'maxnodes', '50000')  # auto: scenes with more nodes than this are turned away (TooBigError)
 			config.set('node properties', 'goto.squashed', 'hidden')
 			config.set('node properties', 'label.squashed', 'inline')
 			config.set('node properties', 'label.suffix', '": "')
@@ -1027,6 +1173,7 @@ class CStree():
 			#inspect(config.get('colors', 'varname'))  # can also use .getint and .getfloat
 			#inspect(config.get('main', 'hidden commands'))  # spaces ok, it seems
 			#sys.exit()
+		cslog.setup(config.get('main', 'loglevel', fallback='warning'))
 
 	def nextid(self):
 		# Sets maxid to maxid + 1 and returns it
@@ -1034,132 +1181,107 @@ class CStree():
 		return self.maxid
 
 	def remove_cycles(self, dot):
-		def remove_cycle(dot, G):
-			try:
-				C = nx.find_cycle(G, '0')
-			except nx.NetworkXNoCycle:
-				return False
-			#for n in C:
-			#	print(f'{dot.get_node(n[0]).attr["label"]}({n[0]}) -> {dot.get_node(n[1]).attr["label"]}({n[1]})')
-			n = C[-1]  # Assume last node is the node that goes back to the first node
+		# One DFS from the start node finding all the back edges (edges to a node on the current path), in the order nx.find_cycle() would have found them one at a time. Each gets replaced by an edge to a new loopgoto node.
+		backedges = []
+		start = dot.index['0']
+		onpath = {start}
+		done = set()
+		stack = [(start, iter(dot.successors(start)))]
+		while stack:
+			n, children = stack[-1]
+			for child in children:
+				if child in onpath:
+					backedges.append((dot.names[n], dot.names[child]))
+				elif child not in done:
+					onpath.add(child)
+					stack.append((child, iter(dot.successors(child))))
+					break
+			else:
+				stack.pop()
+				onpath.remove(n)
+				done.add(n)
+
+		maxid = max(int(n) for n in dot.names)
+		for c, n in enumerate(backedges, 1):
+			#print(f'{dot.get_node(n[0]).attr["label"]}({n[0]}) -> {dot.get_node(n[1]).attr["label"]}({n[1]})')
 			predstartln = dot.get_node(n[0]).attr['startln']
 			dot.remove_edge(n[0], n[1])
-			maxid = sorted(G.nodes, key=int)[-1]
-			nextid = str(int(maxid)+1)
-			#dot.add_node(nextid, label=f'(cycle) Goto node {n[1]}')
+			nextid = str(maxid+c)
 			startln = dot.get_node(n[1]).attr['startln']
 			targetlabel = colorgoto(dot, n[1])
 			dot.add_node(nextid, label=f'(cycle) [bold yellow]{predstartln}: [not bold white]Goto {targetlabel}')
 			dot.get_node(nextid).attr['oldgoto'] = startln
 			dot.get_node(nextid).attr['loopgoto'] = 1  # true
 			dot.add_edge(n[0], nextid)
-			return True
-
-		c = 0
-		G = nx.nx_agraph.from_agraph(dot)  # since remove_cycles changes G, thought bug might be due to it, but no
-		while remove_cycle(dot, G):
-			c += 1
-			G = nx.nx_agraph.from_agraph(dot)
+		c = len(backedges)
 		if c > 1:
-			print(f'Removed {c} cycles from dot graph')
+			logcycles.info('Removed %d cycles from dot graph', c)
 		elif c == 1:
-			print(f'Removed 1 cycle from dot graph')
+			logcycles.info('Removed 1 cycle from dot graph')
 
 	def singleparent(self, dot):
-		def allbutone(dot, preds):
+		def allbutone(preds):
 			# TODO: see if this always works: go by all but biggest (want longest), unless an *if, then go by Y
 			# Consider this alternate: *goto's should be preds (maybe it will always be 1 or more gotos with the other pred being anything?)
 			if len(preds) == 2:
 				# want to be the Y branch to more closely imitate the way the code looks (so far only simple *if with not *else or *elif)
-				if getnodetype(dot.get_node(preds[0])) == Type.cond:
+				if types[preds[0]] == Type.cond:
 					del(preds[0])
 					return
-				if getnodetype(dot.get_node(preds[1])) == Type.cond:
+				if types[preds[1]] == Type.cond:
 					del(preds[1])
 					return
 			elif len(preds) < 2:
-				print('impossible')
+				logcycles.error('impossible')
 				sys.exit(1)
-			# all other cases
-			# debug/planning: see what type preds can be. So far: all goto's, 1 goto and something else, so for now, consider removing the (a?) non-goto, and only fall back to the "always works?" guess below
-			typescount = {}
-			for i in preds:
-				t = getnodetype(dot.get_node(i))
-				print(f'preds: type is {t}')
-				try:
-					typescount[t] += 1
-				except KeyError:
-					typescount[t] = 1
-			print(f'\n{typescount}\n')
-			# count up non-gotos
-			nongotos = 0
-			for i in preds:
-				t = getnodetype(dot.get_node(i))
-				if t != Type.goto:
-					nongotos += 1
-			# debug
-			try:
-				if len(preds) - nongotos != typescount[Type.goto]:
-					print('found something other than expected 2 cases (see above)')
-					sys.exit(1)
-			except KeyError:
-				# no goto's. Happens in mygame-spcln in the *if *else stuff
-				print('no gotos case')
+			# all other cases. So far preds have been all goto's, 1 goto and something else, or no goto's (mygame-spcln's *if *else stuff)
 			# remove the nongoto if there's only 1
-			if nongotos == 1:
-				for i in preds:
-					t = getnodetype(dot.get_node(i))
-					if t != Type.goto:
-						print('removed a non-goto')
-						preds.remove(i)
-						return
-			# fallback:
-			print('fallback reached')  # happens in all gotos case (i.e. not a cond or a text (or whatever) falling thru)
+			nongotos = [i for i in preds if types[i] != Type.goto]
+			if len(nongotos) == 1:
+				preds.remove(nongotos[0])
+				return
+			# fallback: happens in all gotos case (i.e. not a cond or a text (or whatever) falling thru)
 			# all but biggest (want longest, always works?)
-			preds.sort()
+			preds.sort(key=lambda i: dot.names[i])
 			del(preds[-1])
 
-		# Convert dot to networkx for its additional analysis functions
-		G = nx.nx_agraph.from_agraph(dot)  # wasteful as do this in remove_cycles too, but for some reason, when tried to generate it only once (and pass as a parm), it caused graph to split into two at guesspassword
-		maxid = sorted(G.nodes, key=int)[-1]
-		nextid = str(int(maxid)+1)
-		for n2 in G.nodes:
-			#print(list(G.predecessors(n2)))
-			preds = list(G.predecessors(n2))
-			if len(preds) > 1:
-				otherparents = []
-				allbutone(dot, preds)
-				for n in preds:
-					predstartln = dot.get_node(n).attr['startln']
-					otherparents.append(predstartln)
-					edgelabel = ''
-					try:
-						edgelabel = dot.get_edge(n, n2).attr['label']
-					except IndexError:
-						# fine if edge doesn't have a label
-						inspect(dot.get_edge(n, n2))
-						prompt('e')
-						pass
-					#print(f"{dot.get_node(n).attr['startln']}: {dot.get_node(n).attr['label']} / {dot.get_node(n).attr['shape']} - {edgelabel} -> {dot.get_node(n2).attr['startln']}: {dot.get_node(n2).attr['label']}")
-					dot.remove_edge(n, n2)
-					#dot.add_node(nextid, label=f'[bold yellow]{nextid}: [white]Goto {n2} ({n})')  # node id version
-					startln = dot.get_node(n2).attr['startln']
-					targetlabel = colorgoto(dot, n2)  # consists of label and startln or just startln if not label
-					dot.add_node(nextid, label=f'[bold yellow]{predstartln}: [not bold white]Goto {targetlabel}')
-					dot.get_node(nextid).attr['oldgoto'] = startln
-					dot.get_node(nextid).attr['loopgoto'] = 1  # false
-					if edgelabel:
-						dot.add_edge(n, nextid, label=edgelabel)
-					else:
-						dot.add_edge(n, nextid)
-					nextid = str(int(nextid)+1)
-				# dot.get_node(n2).attr['otherparents'] = otherparents  # Hmm, seems list gets converted to str here???
-				if otherparents:
-					dot.get_node(n2).attr['otherparents'] = ' '.join(otherparents)  # so make a space-delimited string
+		# Types and predecessors of every node, as they are before any get split off below
+		types = [getnodetype(n) for n in dot.nodes()]
+		allpreds = [dot.predecessors(i) for i in range(len(dot))]
+		maxid = max(int(n) for n in dot.names)
+		nextid = str(maxid+1)
+		for i2, preds in enumerate(allpreds):
+			if len(preds) < 2:
+				continue
+			n2 = dot.names[i2]
+			startln = dot.get_node(n2).attr['startln']
+			targetlabel = colorgoto(dot, n2)  # consists of label and startln or just startln if not label
+			otherparents = []
+			allbutone(preds)
+			for i in preds:
+				n = dot.names[i]
+				predstartln = dot.get_node(n).attr['startln']
+				otherparents.append(predstartln)
+				edgelabel = dot.get_edge(n, n2).attr['label']  # fine if edge doesn't have a label
+				#print(f"{dot.get_node(n).attr['startln']}: {dot.get_node(n).attr['label']} / {dot.get_node(n).attr['shape']} - {edgelabel} -> {dot.get_node(n2).attr['startln']}: {dot.get_node(n2).attr['label']}")
+				dot.remove_edge(n, n2)
+				#dot.add_node(nextid, label=f'[bold yellow]{nextid}: [white]Goto {n2} ({n})')  # node id version
+				dot.add_node(nextid, label=f'[bold yellow]{predstartln}: [not bold white]Goto {targetlabel}')
+				dot.get_node(nextid).attr['oldgoto'] = startln
+				dot.get_node(nextid).attr['loopgoto'] = 1  # false
+				if edgelabel:
+					dot.add_edge(n, nextid, label=edgelabel)
 				else:
-					dot.get_node(n2).attr['otherparents'] = ''  #03/29/22-strange bug. Sometimes worked, then .split() in make_csnodes below errored out cuz was a list, so added this
+					dot.add_edge(n, nextid)
+				nextid = str(int(nextid)+1)
+			# dot.get_node(n2).attr['otherparents'] = otherparents  # Hmm, seems list gets converted to str here???
+			if otherparents:
+				dot.get_node(n2).attr['otherparents'] = ' '.join(otherparents)  # so make a space-delimited string
+			else:
+				dot.get_node(n2).attr['otherparents'] = ''  #03/29/22-strange bug. Sometimes worked, then .split() in make_csnodes below errored out cuz was a list, so added this
 
 	def make_csnodes(self, dot_acyclic):
+		debug = lognodes.isEnabledFor(cslog.DEBUG)
 		# pgv nodes to CStree nodes
 		for i in dot_acyclic.nodes():  # could also use iternodes() or nodes_iter()
 			self.nodes[i] = CSnode(i, self, guide_style="blue")
@@ -1192,7 +1314,8 @@ class CStree():
 				#self.nodes[id2].label_prepend('[orange3]' + edge_label)
 				self.nodes[id2].label_prepend(colorlabel(startln, Type.option, edge_label))
 			# Set maxid
-			print(f'm: {maxid}, 1: {id1}, 2: {id2}')
+			if debug:
+				lognodes.debug('m: %s, 1: %s, 2: %s', maxid, id1, id2)
 			if int(id1) > int(id2) and int(id1) > maxid:
 				maxid = int(id1)
 				self.maxid = id1
@@ -1202,22 +1325,22 @@ class CStree():
 
 		# convert otherparents from startln to CSnode
 		for node in self.nodes.values():
-			consolef.print(f'make_csnodes: on {node.startln} (id: {node.id}) - {node.otherparents}')
+			if debug:
+				lognodes.debug('make_csnodes: on %s (id: %s) - %s', node.startln, node.id, node.otherparents)
 			if node.otherparents:
 				nodelist = []
 				try:
 					oplist = node.otherparents.split()
 				except AttributeError:
 					# 03/30/22-Strange bug still happening. Says list has no split().
-					inspect(node, console=consolef)
+					lognodes.warning('otherparents is not a string of startlns\n%s', Inspected(node))
 					oplist = []  # assume this, but verify
 				for startln in oplist:
 					opnode = self.getln(startln)
 					if opnode is not None:
 						nodelist.append(opnode)
 					else:
-						print(f'No node has startln of {startln}. Other parents: {node.otherparents}')
-						prompt()
+						lognodes.warning('No node has startln of %s. Other parents: %s', startln, node.otherparents)
 				node.otherparents = nodelist
 		#debug
 		#for node in self.nodes.values():
@@ -1236,46 +1359,104 @@ class CStree():
 			self.cur = self.nodes['0']
 			self.cur.makecur()
 
+	# Read a .dot file made by choicescript-graphviz (java) and build the tree from it
 	def readdot(self, dotfile):
+		agraph = None
+		with self.stages.stage('readdot', lambda: {'nodes': len(agraph) if agraph is not None else None}):
+			agraph = pgv.AGraph(dotfile, strict=False, directed=True)
+		self.readagraph(agraph)
+
+	# Parse a choicescript scene file and build the tree from it. parser is 'python' (csparse, in memory, no JVM), 'pool' (csparse on a warm parserpool.ParserPool worker, needs pool) or 'java' (choicescript-graphviz, needs csgvfolder). Default from config main.parser, else python. With a resultcache.ResultCache, csparse's output is cached (stage 'items') by the scene's hash.
+	def readscene(self, scenefile, parser=None, csgvfolder=None, pool=None, cache=None):
+		if parser is None:
+			parser = self.config.get('main', 'parser', fallback='python')
+		if parser == 'java':
+			dotfile = scenefile + '.dot'
+			with self.stage('java'):
+				status = os.system(f'java -cp "{csgvfolder}" Main "{scenefile}" > "{dotfile}"')
+			if status != 0:
+				logparse.error('choicescript-graphviz returned %s', status)
+				raise Exception("Couldn't parse scene file")
+			self.readdot(dotfile)
+		elif parser in ['python', 'pool']:
+			agraph = None
+			with self.stages.stage('parse', lambda: {'nodes': len(agraph) if agraph is not None else None}):
+				items = None
+				if cache:
+					with open(scenefile, 'rb') as f:
+						key = cache.key(f.read(), 'csparse')
+					items = cache.get(key, 'items')
+				if items is None:
+					if parser == 'pool':
+						items = pool.parse(scenefile)
+					else:
+						items = csparse.parsescenefile(scenefile)
+					if cache:
+						cache.put(key, 'items', items)
+				agraph = csparse.scene2agraph(items)
+			self.readagraph(agraph)
+		else:
+			raise Exception(f'Unknown parser: {parser}')
+
+	# Build the tree from a pgv.AGraph in choicescript-graphviz's format (see readdot() and readscene())
+	def readagraph(self, dot_orig):
 		def fixemptylabels(dot_orig):
-			dot = dot_orig.copy()
+			dot = CSgraph.from_agraph(dot_orig)
 			for i in dot:
 				#print(f"{i.attr['startln']} ({i}): {i.attr['label']}")
-				if i.attr['label'] == '\\N':  # pgv.AGraph puts \N if there's no label
+				if i.attr['label'] in ['\\N', '']:  # pgv.AGraph puts \N if there's no label (or '', the default, when read from a .dot file)
 					#print('\tdid')
 					i.attr['label'] = '*'	  # I guess just change it to an asterisk (shouldn't hardcode)
 			return dot
 
-		self.dot_orig = pgv.AGraph(dotfile, strict=False, directed=True)
-		dot = fixemptylabels(self.dot_orig)
-		self.remove_cycles(dot)
-		self.singleparent(dot)
+		self.dot_orig = dot_orig
+		self.paths = PathTrie()  # new nodes, so none of the old paths are used anymore
+		self.estimated = None
+		self.mode = None
+		with self.stage('readagraph', dot_orig):
+			dot = fixemptylabels(self.dot_orig)
+		with self.stage('remove_cycles', dot):
+			self.remove_cycles(dot)
+		with self.stage('singleparent', dot):
+			self.singleparent(dot)
 		self.dot_acyclic = dot
-		self.make_csnodes(dot)
+		with self.stage('make_csnodes'):
+			self.make_csnodes(dot)
 		#sys.s
 
+	# Time what's in the with as stage name, in self.stages, with how many nodes there are after it (in graph, when there aren't CSnode's for them yet) and how many paths: paths (those allvars() estimated, if it did), pathids (distinct paths in self.paths)
+	def stage(self, name, graph=None):
+		def counts():
+			return {'nodes': len(graph) if graph is not None else len(self.nodes), 'paths': self.estimated['paths'] if self.estimated else None, 'pathids': len(self.paths)}
+		return self.stages.stage(name, counts)
+
+	# Everything after reading in the scene, each as a stage (see stage()): the stats (allvars() in mode, then countpaths() if it fits, see countable()), squashing *goto's and *label's, what to show on each node, hiding, and the dot code, which it returns
+	def analyze(self, mode=None):
+		with self.stage('allvars'):
+			self.allvars(mode)
+		with self.stage('countpaths'):
+			if self.countable():
+				self.countpaths()
+		with self.stage('squash_goto'):
+			self.squash_goto()
+		with self.stage('squash_label'):
+			self.squash_label()
+		with self.stage('showimportantvars3'):
+			self.showimportantvars3()
+		with self.stage('hideall'):
+			self.hideall()
+		with self.stage('makedot'):
+			return self.makedot()
+
 	# Return the id where startln == linenum, else None. Also check linenum+1, cuz it happens
 	def ln2id(self, linenum):
-		# Return the id where startln == linenum, else None
-		def _ln2id(linenum):
-			for k, v in self.nodes.items():
-				#print(f'if int({v.startln}) == {linenum}:')
-				try:
-					if int(v.startln) == linenum:
-						return k
-				except ValueError:
-					# some nodes have no startln like new nodes created by remove_cycles and singleparent
-					pass
-			return None
-
 		if type(linenum) is not int:
 			linenum = int(linenum)
 		# Return the node that corresponds to linenum, else None
-		ret = _ln2id(linenum)
+		ret = self.nodes.startln2id(linenum)
 		# user might enter a startln that has no corresponding node, so look ahead
 		if ret is None:
-			linenum += 1
-			ret = _ln2id(linenum)
+			ret = self.nodes.startln2id(linenum + 1)
 		# Return id of linenum if exists, else id of linenum+1 if exists, else None
 		return ret
 
@@ -1286,11 +1467,7 @@ class CStree():
 			return(self.nodes[self.ln2id(linenum)])
 		except KeyError:
 			# ln2id returns None sometimes (I think not anymore)
-			print(f'ln2id returned None for {linenum}')
-			print(f'len: {len(self.nodes)}')
-			for i in self.nodes:
-				print(f'{i} ', end='')
-			print('')
+			logtree.warning('ln2id returned None for %s (%d nodes: %s)', linenum, len(self.nodes), ' '.join(self.nodes))
 
 	def inspectln(self, linenum):
 		id = self.ln2id(linenum)
@@ -1329,22 +1506,22 @@ class CStree():
 		for k, v in self.nodes.items():
 			if v.type == Type.goto:
 				if v.parent.type == Type.choice:
-					print(f'not squashing this goto ({v.startln}) on account of its parent being a choice, just modding label to remove 2nd renderable')
+					logsquash.debug('not squashing this goto (%s) on account of its parent being a choice, just modding label to remove 2nd renderable', v.startln)
 					if isinstance(v.label, Group):
 						# could just (scary) del 2nd renderable in the label, but how 'bout matching it with its truelabel, just to be safe
 						v.label.renderables.remove(v.truelabel)
 						# self.parent.label_append(self.label)	# wrong. Node was a goto after an "edge" (i.e. a #option), and this will make it merge with the *choice (but other #options remained chidren of it)
 						# TODO: need to be able to unsquash, i.e. put back the *?
 					else:
-						print('imp?')  # didn't happen, so can del?
+						logsquash.error('imp?')  # didn't happen, so can del?
 				else:
-					print('sg')
+					logsquash.debug('squash_goto: %s', v.startln)
 					v.squash()
 
 	def squash_choice(self):
 		for k, v in self.nodes.items():
 			if v.type == Type.choice:
-				print('cs')
+				logsquash.debug('squash_choice: %s', v.startln)
 				v.squash()
 
 	def squash_label(self):
@@ -1353,7 +1530,7 @@ class CStree():
 				if v.parent is not None:
 					#inspect(v)  # ah, was the *scene_list, which is indeed parentless, so this is ok
 					if v.parent.type == Type.label:
-						print(f'sl: {v.startln}')
+						logsquash.debug('squash_label: %s', v.startln)
 						v.squash()
 				#inspect(v)
 				#inspect(v.parent)
@@ -1367,13 +1544,8 @@ class CStree():
 	# Put ... for groups of inconsequential nodes. Assumes allvars() called already.
 	def hideall(self):
 	# TODO: consider changing names for: squash (next node incorporated into current node), open/close (whole branch onward replaced by ...), and hide (next node replaced by ... only)
-		def traverse(node):
-			if node.children is None or len(node.children) == 0:  # None case is just in case, but should never happen (programmer paranoia)
-				# do nothing, yes? (programmer confused)
-				return
-			# Recurse first
-			for child in node.children:
-				traverse(child)
+		# node's part, once all its children have been done
+		def visit(node):
 			# Start from leaves on up. First, don't hide if child is a loop or multi goto
 			if node.children and node.children[0].type in [Type.loopgoto, Type.multigoto]:
 				return
@@ -1409,10 +1581,19 @@ class CStree():
 					#consolef.print(f'l: {node.label}')
 					#inspect(node.children[0].label, console=consolef)
 
-		# start the recursion
-		traverse(self.nodes['0'])
-		# all recursive calls complete
-		#node.label_append(str(node.vars))
+		# Children first (depth first, on an explicit stack instead of recursing, so no recursion limit), then the node. Leaves have nothing to do
+		root = self.nodes['0']
+		if not root.children:  # None case is just in case, but should never happen (programmer paranoia)
+			return
+		stack = [(root, iter(root.children))]
+		while stack:
+			node, children = stack[-1]
+			child = next(children, None)
+			if child is None:
+				stack.pop()
+				visit(node)
+			elif child.children:
+				stack.append((child, iter(child.children)))
 
 	# traverse the cstree and return it in dot format
 	def makedot(self, startid=0):
@@ -1431,8 +1612,8 @@ class CStree():
 		#		print(f'sum not group {node.label}')
 		#		return nostyle(node.label)
 
-		def traverse(node):
-			nonlocal dotstr
+		# node's line of dot code
+		def nodeline(node):
 			# get dotnode
 			try:
 				#dotnode = self.dot_orig.get_node(node.id)
@@ -1480,38 +1661,47 @@ class CStree():
 					print('will not happen')
 					sys.exit(1)
 			tooltip = f' tooltip="{tooltip}"'
-			dotstr += f'\t{node.id} [label="{label}" shape={shape} fillcolor={fillcolor} style={style}{border}{tooltip}]\n'
+			return f'\t{node.id} [label="{label}" shape={shape} fillcolor={fillcolor} style={style}{border}{tooltip}]\n'
+
+		# Depth first from startid (on an explicit stack, so no recursion limit): each node's line, then for each child, its edge, then the child and everything under it
+		root = self.nodes[str(startid)]
+		dot = ['digraph {\n', nodeline(root)]
+		stack = [(root, iter(root.children))]
+		while stack:
+			node, children = stack[-1]
+			child = next(children, None)
+			if child is None:
+				stack.pop()
+				continue
 			#if isinstance(node.label, Group):
 			#	print(node.id, ': ', end='')
 			#	print(node.label.renderables[0])
 			#else:
 			#	print(f'{node.id}: {node.label}')
-			for child in node.children:
-				#print(f'\t{child.id}: {child.type} - {child.label}')
-				#if isinstance(child.label, Group):
-				#	print(f'\t', child.label.renderables[0], end='')
-				#else:
-				#	print(f'\t {child.label}', end='')
-				#print(' - ', child.type)
-				if child.type == Type.multigoto:
-					child = self.getln(child.oldgoto)
-					try:
-						pedge = f' [label="{child.parent_edge_label}"]'
-					except AttributeError:
-						pedge = ''  # most in fact do not have
-					dotstr += f'\t{str(node.id)} -> {str(child.id)}{pedge}\n'
-				else:
-					try:
-						pedge = f' [label="{child.parent_edge_label}"]'
-					except AttributeError:
-						pedge = ''  # most in fact do not have
-					dotstr += f'\t{str(node.id)} -> {str(child.id)}{pedge}\n'
-					# only traverse once, i.e. not a goto (loopgoto's not in this at all. Ok?)
-					traverse(child)
-		dotstr = 'digraph {\n'
-		traverse(self.nodes[str(startid)])
-		dotstr += '}\n'
-		return dotstr
+			#print(f'\t{child.id}: {child.type} - {child.label}')
+			#if isinstance(child.label, Group):
+			#	print(f'\t', child.label.renderables[0], end='')
+			#else:
+			#	print(f'\t {child.label}', end='')
+			#print(' - ', child.type)
+			if child.type == Type.multigoto:
+				child = self.getln(child.oldgoto)
+				try:
+					pedge = f' [label="{child.parent_edge_label}"]'
+				except AttributeError:
+					pedge = ''  # most in fact do not have
+				dot.append(f'\t{str(node.id)} -> {str(child.id)}{pedge}\n')
+			else:
+				try:
+					pedge = f' [label="{child.parent_edge_label}"]'
+				except AttributeError:
+					pedge = ''  # most in fact do not have
+				dot.append(f'\t{str(node.id)} -> {str(child.id)}{pedge}\n')
+				# only traverse once, i.e. not a goto (loopgoto's not in this at all. Ok?)
+				dot.append(nodeline(child))
+				stack.append((child, iter(child.children)))
+		dot.append('}\n')
+		return ''.join(dot)
 
 	# Write new graphviz code to a file
 	def cs2dot(self, filename="newdot.dot", startid=0):
@@ -1530,199 +1720,591 @@ class CStree():
 		with open("newdot.dot", "wt") as f:
 			f.write(dotstr)
 
+	# A cond node's (*if's) children, as (truechild, falsechild), following gotos. None for a side that doesn't go anywhere (an *if with nothing under it, an *else with nothing after it)
+	def ifchildren(self, node):
+		if node.type != Type.cond:
+			raise
+		truechild = falsechild = None
+		for child in node.children:
+			# The Y/N is on the edge to node's own child, so for a goto, get it before going (the goto's target has some other parent's edge label, or none)
+			pedge = getattr(child, 'parent_edge_label', '')
+			if hasattr(child, 'oldgoto'):
+				child = self.getln(child.oldgoto)
+			if pedge == 'Y':
+				truechild = child
+			elif pedge == 'N':
+				falsechild = child
+			else:
+				#inspect(child)
+				prompt('WTF is up with this child?')
+		return truechild, falsechild
+
+	# Add back children that singleparent() removed (in a copy of children) and return it
+	def includegotos(self, node):
+		# TODO: DONE but test: potential bug but seems working: this doesn't remove the goto child itself
+		#allchildren = node.children.copy()
+		allchildren = []
+		for child in node.children:
+			if hasattr(child, 'oldgoto'):
+				allchildren.append(self.getln(child.oldgoto))
+			else:
+				allchildren.append(child)
+		return allchildren
+
+	# An *elseif/*else (a cond node too, whose N side is the next *elseif/*else, or what comes after them all)
+	@staticmethod
+	def iselse(node):
+		return node.type == Type.cond and node.plainlabel.split(' ', 1)[0] in ['ELSEIF', 'ELSIF', 'ELSE']
+
+	# Point each *elseif/*else node at the *if/*elseif it's the N side of (node.elseparent). The parser has the end of each *if/*elseif branch carry on into the next *elseif/*else, so an *if nested at the end of a branch has its N edge going there too. Those all come from inside the branch, so the one nearest the top of the scene is it
+	def linkelses(self):
+		for node in self.nodes.values():
+			node.elseparent = None
+		for node in self.nodes.values():
+			if node.type == Type.cond:
+				falsechild = self.ifchildren(node)[1]
+				if falsechild is not None and self.iselse(falsechild):
+					if falsechild.elseparent is None or int(node.startln) < int(falsechild.elseparent.startln):
+						falsechild.elseparent = node
+
+	# node, or if it's an *elseif/*else, what comes after that whole *if chain (None if nothing does)
+	def pastelses(self, node):
+		while node is not None and self.iselse(node):
+			node = self.ifchildren(node)[1]
+		return node
+
+	# The children a path through node goes on to, as allvars() follows them: a cond node's true and false child (None: that side goes nowhere), else includegotos(). Only a false *if/*elseif goes on to test its own *elseif/*else: getting to one any other way (see linkelses()) means a branch before it was taken, so it goes past them all. Needs linkelses() first
+	def pathchildren(self, node):
+		if node.type == Type.cond:
+			truechild, falsechild = self.ifchildren(node)
+			if falsechild is not None and self.iselse(falsechild) and falsechild.elseparent is not node:
+				falsechild = self.pastelses(falsechild)
+			return [truechild, falsechild]
+		return [self.pastelses(child) for child in self.includegotos(node)]
+
+	# node's children as pathchildren() gives them, leaving out the sides that go nowhere. Needs linkelses() first
+	def successors(self, node):
+		return [child for child in self.pathchildren(node) if child is not None]
+
+	# The nodes reachable from the start node, in topological order (reverse postorder of a depth-first walk, following successors()). Needs linkelses() first
+	# A loop (a *goto back up the scene) has no such order: the edge going back up it, to a node the walk is still under, is left out, and added to backedges, if given, as (node, child)
+	def toporder(self, backedges=None):
+		root = self.nodes['0']
+		order = []
+		seen = {root.id}
+		under = {root.id}  # the nodes on the stack
+		stack = [(root, iter(self.successors(root)))]
+		while stack:
+			node, children = stack[-1]
+			for child in children:
+				if child.id not in seen:
+					seen.add(child.id)
+					under.add(child.id)
+					stack.append((child, iter(self.successors(child))))
+					break
+				if backedges is not None and child.id in under:
+					backedges.append((node, child))
+			else:
+				stack.pop()
+				under.discard(node.id)
+				order.append(node)
+		order.reverse()
+		return order
+
+	# How big allvars() will be, without doing it: one pass in topological order counting, for each node, the paths from the start to it (the sum of its parents' counts) and the most var nodes on any of them. Both sides of every *if are counted, so paths is an upper bound, but for loops: those are counted once around. Returns {'nodes', 'paths' (to the ends of the scene), 'work' (node visits paths mode would make: every node once per path to it), 'vardepth', 'loops' (*goto's back up the scene, see toporder())}, counts as exact ints (see bignum() to show them)
+	def estimate(self):
+		self.linkelses()
+		backedges = []
+		order = self.toporder(backedges)
+		npaths = {order[0].id: 1}
+		depth = {order[0].id: 0}
+		work = paths = vardepth = 0
+		for node in order:
+			count = npaths[node.id]
+			nodedepth = depth[node.id] + (node.type == Type.var)
+			work += count
+			vardepth = max(vardepth, nodedepth)
+			children = self.successors(node)
+			if not children:
+				paths += count
+			for child in children:
+				npaths[child.id] = npaths.get(child.id, 0) + count
+				depth[child.id] = max(depth.get(child.id, 0), nodedepth)
+		return {'nodes': len(order), 'paths': paths, 'work': work, 'vardepth': vardepth, 'loops': len(backedges)}
+
+	# The allvars() mode for a scene as big as estimated (see estimate()): paths if its paths and var depth are within config main.maxpaths and main.maxvardepth and it has no loops (paths mode raises LoopError on those), else main.bigmode (values or sample, default values), or TooBigError if it has more nodes than main.maxnodes
+	def choosemode(self, estimated):
+		maxpaths = self.config.getint('main', 'maxpaths', fallback=10000)
+		maxvardepth = self.config.getint('main', 'maxvardepth', fallback=500)
+		maxnodes = self.config.getint('main', 'maxnodes', fallback=50000)
+		if estimated['nodes'] > maxnodes:
+			raise TooBigError(f"Scene too big to analyze: {estimated['nodes']} nodes (limit {maxnodes})")
+		if not estimated['loops'] and estimated['paths'] <= maxpaths and estimated['vardepth'] <= maxvardepth:
+			return 'paths'
+		return self.config.get('main', 'bigmode', fallback='values')
+
+	# The scene as sampler.py takes it (see there), from the nodes reachable from the start. Also adds the vars it *create's to self.allvarnames, as the other modes do when they get to them. Needs linkelses() first
+	def samplegraph(self):
+		graph = {}
+		for node in self.toporder():
+			var = None
+			if node.type == Type.var:
+				kind = 'var'
+				cmd, varname, varvalue, valuestr = csexpr(node.plainlabel)
+				var = (cmd, varname, valuestr)
+				if cmd != 'SET' and varname not in self.allvarnames:
+					self.allvarnames.append(varname)
+					self.varcolors[varname] = next(self.colorcycle)
+			elif node.type == Type.cond:
+				kind = 'cond'
+			else:
+				kind = 'node'
+			# ids as plain str's (some are csgraph NodeView's, which don't pickle) to go to the workers
+			if kind == 'cond':
+				children = tuple(str(child.id) if child is not None else None for child in self.pathchildren(node))
+			else:
+				children = tuple(str(child.id) for child in self.successors(node))
+			graph[str(node.id)] = (kind, str(node.startln), str(node.plainlabel), children, var)
+		return graph
+
+	# allvars() on just some random paths from the start to an end (see sampler.py), for scenes with too many paths to follow them all. nwalks paths (default config main.samples, else 1000), their choices seeded by seed (main.sampleseed, else 0), on workers processes (main.sampleworkers, else 1: this one; 0 is one per cpu, on a process pool started for the call)
+	# node.vars comes out in the same form allvars() gives, with the values the walks came through node with, each keyed by the path of the first walk that had it, so multival(), showimportantvars3(), hideall() work as is. Values no walk had are missing, so it's the other way around from values mode: what's shown is always real, but maybe not all of it. How much is in node.samples (walks through node), node.samplecounts (var: {val: how many of them had it}) and node.confidence (see sampler.confidence(), for its least sure var). Walks stuck in a loop get cut short (see sampler.py), and self.truncated is how many were
+	def allsamples(self, nwalks=None, seed=None, workers=None):
+		if nwalks is None:
+			nwalks = self.config.getint('main', 'samples', fallback=1000)
+		if seed is None:
+			seed = self.config.getint('main', 'sampleseed', fallback=0)
+		if workers is None:
+			workers = self.config.getint('main', 'sampleworkers', fallback=1)
+		if workers <= 0:
+			workers = os.cpu_count() or 1
+		# a walk's path (startln's) as a self.paths id. Values further down a walk have paths that go on from ones already done, so it only extends from the longest of those
+		pathids = {(): PathTrie.ROOT}
+		def pathid(path):
+			done = len(path)
+			while path[:done] not in pathids:
+				done -= 1
+			key = pathids[path[:done]]
+			for i in range(done, len(path)):
+				key = pathids[path[:i+1]] = self.paths.extend(key, path[i])
+			return key
+
+		self.linkelses()
+		graph = self.samplegraph()
+		seen, truncated = sampler.sample(graph, '0', nwalks, seed, workers)
+		self.truncated = truncated
+		if truncated:
+			logvars.warning('allvars: %d of %d sampled paths went around a loop for over %d steps and were cut short', truncated, nwalks, sampler.STEPSPERNODE * len(graph))
+		for node in self.nodes.values():
+			node.clearvars()
+		for nodeid, (count, vars) in seen.items():
+			node = self.nodes[nodeid]
+			node.samples = count
+			node.confidence = 1.0
+			for varname, vals in vars.items():
+				paths = {pathid(path): val for val, (valcount, path) in vals.items()}
+				node.setvars(varname, paths)
+				node.samplecounts[varname] = {val: valcount for val, (valcount, path) in vals.items()}
+				node.confidence = min(node.confidence, sampler.confidence(vals, count))
+		logvars.info('allvars: %d paths sampled, %d of %d nodes reached', nwalks, len(seen), len(self.nodes))
+
 	# Traverse whole tree and give each node its vars (starts at nodes[0], so unconnected parts missed)
 	# Also fills in self.allvarnames
-	def allvars(self):
+	# mode: 'paths' follows every path from the start, keeping each path's values apart (what's below), 'values' only works out the values each var can have at each node (see allvalues(), much faster when there are lots of paths), 'sample' follows only some random paths (see allsamples()), 'auto' picks one of those from estimate() (see choosemode()) and leaves what it estimated and picked in self.estimated (None in the other modes). Default from config main.allvars, else auto
+	def allvars(self, mode=None):
+		if mode is None:
+			mode = self.config.get('main', 'allvars', fallback='auto')
+		self.estimated = None
+		if mode == 'auto':
+			estimated = self.estimate()
+			mode = estimated['mode'] = self.choosemode(estimated)
+			self.estimated = estimated
+			logvars.info('allvars: %d nodes, %s paths, var depth %d, %d loops: %s mode', estimated['nodes'], bignum(estimated['paths']), estimated['vardepth'], estimated['loops'], mode)
+		self.mode = mode
+		if mode == 'values':
+			return self.allvalues()
+		elif mode == 'sample':
+			return self.allsamples()
+		elif mode != 'paths':
+			raise Exception(f'Unknown allvars mode: {mode}')
 		# Given a node, recursively traverse all its children, collecting all vars (allows erroneous choicescript, no randoms, just basic + and - a number (not another var) for *set for now. In future, maybe call js: https://stackoverflow.com/questions/39096901/call-javascript-from-python )
 
 		# TODO: bug: if run this when there's a closed node (openclose()) get AttributeError: Ctree has no attr vars (caused on line with node.vars
 
-		# make var table, vars first, yellow on grey, line between vars, only print var name once
-		def traverse(node, curpath, curvars):
-			# merge vars2 (vars coming in from previous nodes) into vars1 (vars node already has)
-			print(f'allvars: traversing node {node.id}', file=sys.stderr)
-			c=0
-			if node.id == '33' or node.id == '75':
-				# 33 34 35 75
-				inspect(node, console=consolef)
-				if c > 3:
-					sys.exit(1)
-				c += 1
-			def merge(vars1, vars2):
-				vars2 = copy.deepcopy(vars2)  # got: for path1, val1 in paths1.items(): RuntimeError: dictionary changed size during iteration , so tried this, but didn't fix, so maybe don't need, but leave just in case, because lazy
-				for var2, paths2 in vars2.items():
-					#print(f'var2={var2}')
-					if var2 in vars1.keys():
-						for path2, val2 in paths2.items():
-							#print(f'\tpath2={path2}, val2={val2}')
-							for var1, paths1 in vars1.items():
-								#print(f'\t\tvar1={var1}')
-								if var1 == var2:
-									paths1 = paths1.copy()
-									for path1, val1 in paths1.items():
-										#print(f'\t\t\tpath1={path1}, val1={val1}')
-										# Check if we've been here before
-										# TODO: I worry might get into infinite loop, but maybe that possibility handled in remove_cycles()? For now, that is, but eventually, should allow a few (how many?) to see if any vars change
-										if path2 == path1 and val2 == val1:
-											# so far, has happened when two ways to get to END on same branch. I guess nothing to do
-											#print('been here before')
-											pass
-										#elif path2.startswith(path1):
-										#	# paths are different (same at first, then diverged, but... this is *always* true. Hmm...), so values might be different
-										#	print(f'{var2} already exists in node {node.startln}, loop kind')
-										#	prompt()
-										else:
-											#print(f'{var2} already exists in node {node.startln}, but came by diff path, so add it too, even if value is the same')
-											vars1[var1][path2] = val2
-					else:
-						# incoming var not in node yet, so just copy it on over
-						vars1[var2] = paths2.copy()
-			# End def merge()
+		self.linkelses()
+		# Coming to a node again with the same values (e.g. after several *choice options *goto the same *label) means everything from there on comes out the same as last time, but for the paths. So each (node, values) is only traversed once (self.memomisses counts them), and the other times (self.memohits) just point back at it.
+		# For that, node.vars isn't written during the traversal. Every write goes in writes, in order, as (node, path, vars), path a self.paths id and vars all the node's var: value's on that path, and a skipped traversal is a (memo entry, path) standing in for all the writes it would have made. expand() then does them all at the end, with the paths they'd have had, in the same order they'd have been done.
+		# The values on a path (curvars) are a VarMap, so each child gets the same one, a *set makes a new one sharing the rest, and writes holds on to them instead of copies
+		writes = []
+		memo = {}  # (node id, incoming values) -> (its first write, last write + 1, its path)
+		seen = {}  # node id -> var names its node.vars will have (for *create's check)
+		onpath = set()  # ids of the nodes the traversal is under right now
+
+		# Do all of writes to node.vars. Each stack entry is writes[start:end], made by a traversal that came in on path, to be done as if it had come in on newpath. A skipped traversal's writes get done right where it was skipped, then the rest
+		def expand():
+			rebased = {}
+			def rebase(varpath, path, newpath):
+				key = (varpath, path, newpath)
+				if key not in rebased:
+					rebased[key] = self.paths.rebase(varpath, path, newpath)
+				return rebased[key]
+
+			root = PathTrie.ROOT
+			stack = [(0, len(writes), root, root)]
+			while stack:
+				start, end, path, newpath = stack.pop()
+				for i in range(start, end):
+					write = writes[i]
+					if len(write) == 2:
+						(hitstart, hitend, hitpath), wherepath = write
+						stack.append((i + 1, end, path, newpath))
+						stack.append((hitstart, hitend, hitpath, rebase(wherepath, path, newpath)))
+						break
+					node, varpath, vars = write
+					varpath = rebase(varpath, path, newpath)
+					for var, val in vars.items():
+						node.setvar(var, varpath, val)
 
-			def ifchildren(node):
-				if node.type != Type.cond:
-					raise
-				for child in node.children:
-					pedge = ''
-					if hasattr(child, 'oldgoto'):
-						# It's a goto, but before going, need parent_edge_label
-						if child.parent_edge_label:
-							pedge = child.parent_edge_label
-						child = self.getln(child.oldgoto)
-					if child.parent_edge_label == 'Y' or pedge == 'Y':
-						truechild = child
-					elif child.parent_edge_label == 'N' or pedge == 'N':
-						falsechild = child
-					else:
-						#inspect(child)
-						prompt('WTF is up with this child?')
-				return truechild, falsechild
-			# End ifchildren()
-
-			# Add back children that singleparent() removed (in a copy of children) and return it
-			def includegotos(node):
-				# TODO: DONE but test: potential bug but seems working: this doesn't remove the goto child itself
-				#allchildren = node.children.copy()
-				allchildren = []
-				for child in node.children:
-					if hasattr(child, 'oldgoto'):
-						allchildren.append(self.getln(child.oldgoto))
-					else:
-						allchildren.append(child)
-				return allchildren
-			# End def includegotos(), End sub-functions
+		# make var table, vars first, yellow on grey, line between vars, only print var name once
+		# Does node's part of the traversal, coming in on curpath with curvars. Returns (its memo state, its first write, curpath, [(child, its curpath, its curvars), ...]) for the children to traverse next, or None if it's been done before
+		def visit(node, curpath, curvars):
+			if debug:
+				logvars.debug('allvars: traversing node %s', node.id)
+				if node.id in inspectnodes:
+					logvars.debug('%s', Inspected(node))
 
 		# Begin traverse() main code proper:
 			# TODO: check if node closed by openclose() here and use correct node, not fake ... node
-			# All nodes get all previous vars added to them
-			#print(f'{node.startln}: merging node\'s previous vars {node.vars} with curvars {curvars}')
-			merge(node.vars, curvars)
-			#print(f'so now, node vars are {node.vars}')  # node may have had no vars if first time being iterated, or could have some if visited already
-			# In addition, var nodes modify curvars and node.vars
+			# Been here with these values before?
+			state = (node.id, tuple(sorted((var, type(val), val) for var, val in curvars.items())))
+			if state in memo:
+				self.memohits += 1
+				writes.append((memo[state], curpath))
+				return None
+			if node.id in onpath:
+				raise LoopError(f'Infinite loop in scene: came back to line {node.startln} ({nostyle(node.plainlabel)})')
+			onpath.add(node.id)
+			self.memomisses += 1
+			start = len(writes)
+			inpath = curpath
+			children = []
+			nodeseen = seen.setdefault(node.id, set(node.vars))
+			nodeseen.update(curvars)
+			# var nodes modify curvars and node.vars
 			#print(f'[yellow]Processing node: {node.startln}')
 			if node.type == Type.var:
-				# make new curpath (tack on new startln, save previous to oldcurpath)
-				oldcurpath = curpath
-				if curpath:
-					curpath += f'.{node.startln}'
-				else:
-					curpath = f'{node.startln}'
-				# When come to another var node, update all node.vars's paths (their indices) to append the new startln
-				for var, paths in node.vars.items():
-					for path, val in paths.copy().items():
-						if path == oldcurpath:
-							#print(f'updating node\'s {path}:{var} to {curpath}')
-							del node.vars[var][path]
-							node.vars[var][curpath] = val
-						else:
-							#print(f'failed updating {path}:{var} to {curpath} because needed path to be {oldcurpath}, but this is fine (i.e. stop showing this message) as it just means came to the node again, so it (changing the path) was done already')
-							pass
-				# also update all curvars's paths (their indices)
-				for var, paths in curvars.items():
-					for path, val in paths.copy().items():
-						if path == oldcurpath:
-							#print(f'updating curvars\'s {path}:{var} to {curpath}')
-							del curvars[var][path]
-							curvars[var][curpath] = val
-						else:
-							# getting here is um, possibly... impossible?
-							print(f'Updating curvars: failed updating {path}:{var} to {curpath}')
-							prompt()
+				# make new curpath (tack on new startln)
+				curpath = self.paths.extend(curpath, node.startln)
+			# All nodes get all previous vars added to them (var nodes on the new curpath)
+			writes.append((node, curpath, curvars))
+			if node.type == Type.var:
 				# split the *set/*create/etc into cmd, varname, and varvalue tokens
-				#tokens = node.plainlabel.split()
-				#cmd = tokens[0]
-				#varname = tokens[1]
-				#varvalue = ''.join(tokens[2:])	# so "+ 1" becomes "+1"
 				cmd, varname, varvalue, valuestr = csexpr(node.plainlabel)
 				# Add/update the var to/in node.vars
-				if varname in node.vars.keys():
-					#print(f'{varname} exists already and has value {node.vars[varname]}')
+				if varname in nodeseen:
+					#print(f'{varname} exists already')
 					if cmd == 'SET':
-						# iterate all var-paths for this var and do the *set on each one
-						for path in node.vars[varname].copy():
-							#print(f'setting {varname} to {varvalue} (path={path}) (was: {node.vars[varname][path]})')
+						if varname in curvars:
+							#print(f'setting {varname} to {varvalue} (was: {curvars[varname]})')
 							# calculate new result
-							#print(f'[yellow]{node.startln}:[default] ', end='')
-							result, arrowstr = seteval(node.plainlabel, curvars)
+							result, arrowstr = seteval(node, curvars)
 							# put in new var-path
-							oldval = node.vars[varname][path]
-							node.vars[varname][path] = str(oldval) + arrowstr  # for testing, still arrow form
-							#node.vars[varname][curpath] = result  # use this after test phase (and del oldval)
-							#print(f'{varname} in node: {node.vars[varname]}')
-							curvars[varname][path] = result
-							#inspect(path)
+							oldval = curvars[varname]
+							writes.append((node, curpath, {varname: str(oldval) + arrowstr}))  # for testing, still arrow form
+							curvars = curvars.set(varname, result)
 					else:
-						print(f'creating a var that already exists? {varname}')
+						logvars.warning('creating a var that already exists? %s', varname)
 				else:
 					#print(f'{varname} not yet seen')
 					if cmd != 'SET':  # i.e. CREATE or TEMP
 						self.allvarnames.append(varname)
-						curvars[varname] = {}
-						curvars[varname][curpath] = valuestr
-						# node.vars[varname] = copy.deepcopy(curvars)[varname]	# tried deepcopy due to mysterious reference/not value error
-						node.vars[varname] = curvars[varname].copy()  # had this originally. Put back. Seems to work now.
-						#node.vars[varname] = curvars[varname]	# even this seems to work??? I'm too leery...
-						#print(f"setting node's {varname} to {curvars[varname]} = {node.vars[varname]}")
+						curvars = curvars.set(varname, valuestr)
+						writes.append((node, curpath, {varname: valuestr}))
+						nodeseen.add(varname)
 						# set var's color
 						self.varcolors[varname] = next(self.colorcycle)
-
 					else:
-						print(f'setting a var before creation? {varname}')
-				# debug
-				#inspect(node)
-				#print('curvars after: ', curvars)
-				#prompt()
-
-				# debug
-				#print(' Recurse children')
-				#for child in node.children:
-				#	inspect(child)
-				#print('with gotos')
-				#for child in includegotos(node):
-				#	inspect(child)
-				#prompt()
-
+						logvars.warning('setting a var before creation? %s', varname)
+			if node.type == Type.cond:
+				# only the side this path's values take (an *else is always true)
+				truechild, falsechild = self.pathchildren(node)
+				child = truechild if ifeval(node, curvars) else falsechild
+				if child is not None:
+					children.append((child, curpath, curvars))
+			else:
 				# Recurse children
-				for child in includegotos(node):
+				for child in self.pathchildren(node):
 					# TODO: what about goto's remove_cycles takes out?
-					traverse(child, curpath, copy.deepcopy(curvars))
-			elif node.type == Type.cond:
-				truechild, falsechild = ifchildren(node)
-				if ifeval(node.plainlabel, curvars):
-					traverse(truechild, curpath, copy.deepcopy(curvars))
+					if child is not None:
+						children.append((child, curpath, curvars))
+			return state, start, inpath, children
+
+		# Depth first from the start node, same order as recursing would go, but on an explicit stack so how long a scene can be isn't limited by python's recursion limit. A 'done' is a node whose children have all been traversed, so its memo entry can be made
+		debug = logvars.isEnabledFor(cslog.DEBUG)
+		inspectnodes = self.config.get('main', 'inspect nodes', fallback='').replace(',', ' ').split()  # node ids to log all of, when debugging
+		self.memohits = 0
+		self.memomisses = 0
+		stack = [('visit', self.nodes['0'], PathTrie.ROOT, VarMap())]
+		while stack:
+			step, *args = stack.pop()
+			if step == 'done':
+				state, start, inpath = args
+				memo[state] = (start, len(writes), inpath)
+				onpath.discard(state[0])
+				continue
+			visited = visit(*args)
+			if visited is None:
+				continue
+			state, start, inpath, children = visited
+			stack.append(('done', state, start, inpath))
+			for child in reversed(children):
+				stack.append(('visit', *child))
+		expand()
+		logvars.info('allvars: %d node states traversed, %d skipped as seen before', self.memomisses, self.memohits)
+		#node.label_append(str(node.vars))
+
+	# allvars() without walking every path: each node gets the set of values each var can have there, merging what comes in from all its parents (join = union of value sets). Nodes are worked out in topological order, and one is done again whenever what comes in to it grows, until nothing does (the fixpoint). On a DAG that's one pass, so time goes with the size of the tree instead of the number of paths; a *goto back up the scene sends values round again
+	# A var that keeps getting new values around a loop (a *set str +10 before the *goto) stops taking new ones at a node that's been done already once it has config main.maxvalues (default 100) there: it's in node.unbounded there and everywhere after, and only some of its values are shown
+	# node.vars comes out in the same form allvars() gives, so multival(), showimportantvars3(), hideall() work as is. Each value is there once, and its "path" is where it came from: the startln of the *create, then of each *set that made it (e.g. 3.10.25)
+	# Vars are tracked separately, so a *set or *if that reads 2+ vars is tried on every combination of their values, which can give values no real path has
+	# vectorize=False does every *set/*if one combination at a time, even where vectoreval() could do them all at once
+	def allvalues(self, vectorize=True):
+		maxvalues = self.config.getint('main', 'maxvalues', fallback=100)
+		self.linkelses()
+		# key, made unique among keys (a var's values can't share a path) by tacking on node's startln. skips (key: a key further down its chain, with everything up to it taken) lets a caller that only adds to keys jump over what it took last time, instead of walking the whole chain again for every value that starts from the same key
+		def uniquekey(key, keys, node, skips=None):
+			start = key
+			while key in keys:
+				if skips is not None and key in skips:
+					key = skips[key]
 				else:
-					traverse(falsechild, curpath, copy.deepcopy(curvars))
+					key = self.paths.extend(key, node.startln)
+			if skips is not None and key != start:
+				skips[start] = key
+			return key
+
+		# merge vars (var: {val: path}) and cut (the vars unbounded where they come from) into what node has coming in so far, and queue node to be done (again) if that grew
+		def join(node, vars, cut):
+			grew = False
+			nodecut = unbounded.setdefault(node.id, set())
+			if not cut <= nodecut:
+				nodecut |= cut
+				grew = True
+			invars = incoming.get(node.id)
+			if invars is None:
+				incoming[node.id] = {var: vals.copy() for var, vals in vars.items()}
+				grew = True
 			else:
-				# Recurse children
-				# for child in node.children:
-				for child in includegotos(node):
-					# TODO: what about goto's remove_cycles takes out?
-					traverse(child, curpath, copy.deepcopy(curvars))
+				for var, vals in vars.items():
+					if var not in invars:
+						invars[var] = vals.copy()
+						grew = True
+						continue
+					keys = set(invars[var].values())
+					skips = {}
+					for val, key in vals.items():
+						if val not in invars[var]:
+							if node.id in done and len(invars[var]) >= maxvalues:
+								if var not in nodecut:
+									nodecut.add(var)
+									cutat.setdefault(var, node.startln)
+									grew = True
+								break
+							invars[var][val] = uniquekey(key, keys, node, skips)
+							keys.add(invars[var][val])
+							grew = True
+			if grew and node.id not in queued:
+				queued.add(node.id)
+				heapq.heappush(queue, rank[node.id])
+
+		# every combination of the values of varnames, as (var: val for seteval()/ifeval(), var: that val's path)
+		def combinations(varnames, vars):
+			varnames = [varname for varname in dict.fromkeys(varnames) if varname in vars]
+			for combo in product(*[list(vars[varname].items()) for varname in varnames]):
+				yield {varname: val for varname, (val, key) in zip(varnames, combo)}, {varname: key for varname, (val, key) in zip(varnames, combo)}
+
+		# seteval() on every combination of node's var and what else its *set reads, as (the var's old value, its path, result, seteval()'s arrow string)
+		def setcombinations(node, varname, vars):
+			expr = nodeexpr(node)
+			vec = vectoreval(expr, [varname] + expr.varnames, vars) if vectorize else None
+			# results too big for int() to give the same as seteval()'s
+			if vec is not None and not np.all(np.abs(vec[2]) < 2**53):
+				vec = None
+			if vec is None:
+				for values, keys in combinations([varname] + expr.varnames, vars):
+					result, arrowstr = seteval(node, values)
+					yield values[varname], keys[varname], result, arrowstr
+				return
+			varnames, rows, results = vec
+			items = list(vars[varname].items())
+			for i, result in zip(rows[varname].tolist(), results.astype(np.int64).tolist()):
+				oldval, oldkey = items[i]
+				yield oldval, oldkey, result, f' -> {expr.display} = {result}'
+
+		order = self.toporder()
+		rank = {node.id: i for i, node in enumerate(order)}
+		for node in order:
+			node.clearvars()
+		incoming = {}  # node id -> everything that's come in to it so far (var: {val: path})
+		unbounded = {}  # node id -> vars cut off at maxvalues there or before
+		cutat = {}  # var -> startln of the first node it was cut off at
+		queue = []  # ranks of nodes to do (again), lowest (topologically first) first
+		queued = set()
+		done = set()  # node ids done at least once: more coming in to one of them is from a loop
+		join(order[0], {}, set())
+		while queue:
+			node = order[heapq.heappop(queue)]
+			queued.discard(node.id)
+			done.add(node.id)
+			vars = incoming[node.id]
+			cut = unbounded[node.id]
+			node.clearvars()
+			node.unbounded = set(cut)
+			for var, vals in vars.items():
+				node.setvars(var, {key: val for val, key in vals.items()})
+			if node.type == Type.var:
+				cmd, varname, varvalue, valuestr = csexpr(node.plainlabel)
+				if cmd == 'SET':
+					if varname in vars:
+						# do the *set on every value, and show it arrow form like allvars() does
+						arrows = {}
+						results = {}
+						skips = {}
+						for oldval, oldkey, result, arrowstr in setcombinations(node, varname, vars):
+							key = uniquekey(self.paths.extend(oldkey, node.startln), arrows, node, skips)
+							arrows[key] = str(oldval) + arrowstr
+							if result not in results:
+								results[result] = key
+						node.setvars(varname, arrows)
+						vars = dict(vars)
+						vars[varname] = results
+					else:
+						logvars.warning('setting a var before creation? %s', varname)
+				else:  # i.e. CREATE or TEMP
+					if varname in vars:
+						logvars.warning('creating a var that already exists? %s', varname)
+					else:
+						if varname not in self.allvarnames:
+							self.allvarnames.append(varname)
+							self.varcolors[varname] = next(self.colorcycle)
+						vars = dict(vars)
+						key = self.paths.extend(PathTrie.ROOT, node.startln)
+						vars[varname] = {valuestr: key}
+						node.setvars(varname, {key: valuestr})
+			if node.type == Type.cond:
+				# each side gets the values of the *if's vars that go that way (None: no values do)
+				truechild, falsechild = self.pathchildren(node)
+				branches = {True: None, False: None}
+				expr = nodeexpr(node)
+				vec = vectoreval(expr, expr.varnames, vars) if vectorize else None
+				if vec is not None:
+					varnames, rows, results = vec
+					truthy = results != 0
+					for taken, mask in [(True, truthy), (False, ~truthy)]:
+						if mask.any():
+							branches[taken] = {}
+							for varname in varnames:
+								# the values that go this way, in the order they first do
+								indexes, firsts = np.unique(rows[varname][mask], return_index=True)
+								items = list(vars[varname].items())
+								branches[taken][varname] = dict(items[i] for i in indexes[np.argsort(firsts)].tolist())
+				else:
+					for values, keys in combinations(expr.varnames, vars):
+						taken = bool(ifeval(node, values))
+						if branches[taken] is None:
+							branches[taken] = {}
+						for var, val in values.items():
+							branches[taken].setdefault(var, {})[val] = keys[var]
+				for child, branch in [(truechild, branches[True]), (falsechild, branches[False])]:
+					if child is not None and branch is not None:
+						join(child, {**vars, **branch}, cut)
+			else:
+				for child in self.successors(node):
+					join(child, vars, cut)
+		for var, startln in cutat.items():
+			logvars.warning('allvars: %s had more than maxvalues (%d) values at line %s, going around a loop? Only some of them are shown from there on', var, maxvalues, startln)
+
+	# Whether countpaths() fits in config main.maxstates, going by what allvars() did: in values mode no node can have more states than the product of how many values each of its vars has there, and otherwise (paths mode, or sample mode, which only knows some values) no more than estimate()'s paths. So a scene auto sent to bigmode for having too many paths only gets them counted if its vars have few enough values. Never for loops (see countpaths())
+	def countable(self):
+		maxstates = self.config.getint('main', 'maxstates', fallback=100000)
+		self.linkelses()
+		estimated = self.estimated or self.estimate()
+		if estimated['loops']:
+			return False
+		if self.mode != 'values':
+			return estimated['paths'] <= maxstates
+		for node in self.nodes.values():
+			states = 1
+			for vals in node.varvalues.values():
+				states *= len(vals)
+				if states > maxstates:
+					logvars.info('countpaths: up to %s different sets of values at line %s, more than maxstates (%d), skipping it', bignum(math.prod(len(vals) for vals in node.varvalues.values())), node.startln, maxstates)
+					return False
+		return True
+
+	# How many paths from the start get to each node with each value of each var, without following them: in topological order, each node gets the states (all the vars' values, as a sorted tuple of (var, val)) it's come to with, each with how many paths (python ints, so no limit) come with it, adds up its parents' and sends them on, each state down the side of an *if its values take. So time goes with the number of distinct states, not paths. Only real paths are counted (unlike values mode, vars aren't split up)
+	# Leaves node.npaths (None if none get there) and node.histogram (var: {val: paths}, the values after a node's own *set/*create). Any allvars() mode can go before or after. Gives up (histograms left empty, returns False) if a node gets more than config main.maxstates (default 100000) states, or the scene has a loop (infinitely many paths)
+	def countpaths(self):
+		maxstates = self.config.getint('main', 'maxstates', fallback=100000)
+		self.linkelses()
+
+		def giveup():
+			for node in self.nodes.values():
+				node.npaths = None
+				node.histogram = {}
+			return False
 
-		# start the recursion
-		traverse(self.nodes['0'], '', {})
-		# all recursive calls complete
-		#node.label_append(str(node.vars))
+		giveup()
+		backedges = []
+		order = self.toporder(backedges)
+		if backedges:
+			# a loop has as many paths as times around it: one pass would count each only once and show it as exact
+			node, child = backedges[0]
+			logvars.info('countpaths: line %s goes back up to line %s (a loop), not counting paths', node.startln, child.startln)
+			return False
+		root = self.nodes['0']
+		incoming = {root.id: {(): 1}}
+		for node in order:
+			states = incoming.pop(node.id, None)
+			if states is None:
+				continue
+			if node.type == Type.var:
+				cmd, varname, varvalue, valuestr = csexpr(node.plainlabel)
+				newstates = {}
+				for state, count in states.items():
+					vars = dict(state)
+					if cmd == 'SET':
+						if varname in vars:
+							vars[varname] = seteval(node, vars)[0]
+					elif varname not in vars:
+						vars[varname] = cseval.value(valuestr)
+					state = tuple(sorted(vars.items(), key=lambda item: item[0]))
+					newstates[state] = newstates.get(state, 0) + count
+				states = newstates
+			node.npaths = sum(states.values())
+			for state, count in states.items():
+				for var, val in state:
+					vals = node.histogram.setdefault(var, {})
+					vals[val] = vals.get(val, 0) + count
+			if node.type == Type.cond:
+				truechild, falsechild = self.pathchildren(node)
+				sides = [(child, {}) for child in [truechild, falsechild]]
+				for state, count in states.items():
+					child, childstates = sides[0] if ifeval(node, dict(state)) else sides[1]
+					childstates[state] = count
+			else:
+				sides = [(child, states) for child in self.successors(node)]
+			for child, childstates in sides:
+				if child is None or not childstates:
+					continue
+				instates = incoming.setdefault(child.id, {})
+				for state, count in childstates.items():
+					instates[state] = instates.get(state, 0) + count
+				# checked as they pile up, before child's own *set's multiply them
+				if len(instates) > maxstates:
+					logvars.warning('countpaths: over %d different sets of values at line %s, more than maxstates, giving up', maxstates, child.startln)
+					return giveup()
+		return True
 
 	# (short version calls showvars() on every node. Not short version is my first version. Useless? Sorted by varname first, shows: varname, path, value. Puts underline when varname changes to separate (looks bad; too close to top one; oh, and WTF, thought it was working but no, just underlines each line geez)
 	def showallvars(self, short=True):
@@ -1822,43 +2404,21 @@ class CStree():
 
 	# Return True if and only if var at this node can have > 1 value
 	def multival(self, node, var):
-		oldval = None
-		try:
-			node.vars[var]
-		except KeyError:
-			# node.vars was {}. Return False if var not even in node.vars
-			#inspect(node)
-			return False
-
-		# check for multiple values
-		for path, val in node.vars[var].items():
-			if oldval is None:
-				oldval = val
-			elif val != oldval:
-				return True
-		return False
+		# node.varvalues has var's distinct values (nothing if var not even in node.vars)
+		return len(node.varvalues.get(var, ())) > 1
 
 	# Return True iff node has at least one var with > 1 value
 	def multival_all(self, node):
-		for var in node.vars.keys():
-			if self.multival(node, var):
-				return True
-		return False
+		return node.nmultivals > 0
 
 	# show vars on these nodes only: *if, *set, and multi-parent. Only relevant vars for *if and *set, and only if came in with multiple values. Multi-parent only vars with multiple values.
 	# this also adds attribute multivars to the node
 	def showimportantvars3(self):
-		# looks in a *set or *if expression and returns list of all var names found in it
-		def findvarnames(rest):
-			vars = []
-			if len(rest) != 3:
-				print('bad command')
-				sys.exit(1)
-			rest = [rest[0]] + rest[1]  # varname and varvalue (no cmd, no valuestr)
-			for token in rest:
-				if token in self.allvarnames:
-					vars.append(token)
-			return vars
+		# returns list of all var names in a *set (the var it sets first) or *if expression, i.e. what its compiled expression reads
+		def findvarnames(node):
+			expr = nodeexpr(node)
+			names = ([expr.target] if expr.target else []) + expr.varnames
+			return [name for name in dict.fromkeys(names) if name in self.allvarnames]
 
 		for node in self.nodes.values():
 			#inspect(node)
@@ -1874,7 +2434,7 @@ class CStree():
 			elif cmd == 'SET' or cmd == 'IF':  # TODO: consider future case when *else, etc are also supported
 				# Show vars on *set and *if, only if a var in it has multiple values
 				# find relevant vars
-				vars_in_set = findvarnames(rest)
+				vars_in_set = findvarnames(node)
 				for var in vars_in_set:
 					#print(f'checking if "{var}" is in "{node.plainlabel}"...', end='')
 					if self.multival(node, var):
@@ -1891,6 +2451,24 @@ class CStree():
 				multivars = node.showvars(showvars, perline=True, nolabel=True)
 				if multivars is not None:
 					node.multivars = nostyle(multivars)
+			if node.samples and hasattr(node, 'multivars'):
+				# sample mode: how many walks had each value, and about how many of all paths these values cover
+				for var in showvars:
+					counts = ', '.join(f'{val} x{count}' for val, count in node.samplecounts[var].items())
+					node.multivars += f'\n{var}: {counts}'
+				node.multivars += f'\n{node.samples} sampled paths, about {node.confidence:.0%} of all paths have these values'
+			if node.unbounded and hasattr(node, 'multivars'):
+				# values mode cut a var off going around a loop
+				for var in showvars:
+					if var in node.unbounded:
+						node.multivars += f"\n{var}: more than {self.config.getint('main', 'maxvalues', fallback=100)} values (around a loop), only some shown"
+			if node.npaths and hasattr(node, 'multivars'):
+				# countpaths() done: how many paths have each value
+				for var in showvars:
+					if var in node.histogram:
+						counts = ', '.join(f'{val} ({bignum(count)})' for val, count in node.histogram[var].items())
+						node.multivars += f'\n{var} (paths): {counts}'
+				node.multivars += f'\n{bignum(node.npaths)} paths get here'
 
 	async def interactive(self) -> None:
 		done = asyncio.Event()
@@ -2170,8 +2748,9 @@ A number by itself means to print the CStree in a pager. A number paired with a
 				self.dot_orig.draw('test.png')
 				os.system('sxiv test.png')
 			elif cmd == 'dota':
-				self.dot_acyclic.layout(prog='dot')
-				self.dot_acyclic.draw('test.png')
+				dot = self.dot_acyclic.to_agraph()
+				dot.layout(prog='dot')
+				dot.draw('test.png')
 				os.system('sxiv test.png')
 			elif cmd == 'dotc':
 				# output and show the graph in sxiv (just for testing. dotw or D below is better)
@@ -1,29 +1,46 @@
 import os
-import sys
+import atexit
+import threading
+import time
 import tempfile
-from rich import inspect
-from rich.console import Console
-from flask import Flask, redirect, url_for, request, render_template, flash, send_file
+from flask import Flask, redirect, url_for, request, render_template, flash, send_file, make_response
 #from flask_cors import CORS
 from flask import json
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import HTTPException
-from cstree import CStree
+from cstree import CStree, LoopError, TooBigError, bignum
+import cslog
+from cslog import Inspected
+from parserpool import ParserPool
+from resultcache import ResultCache
+from stagetimer import StageTimer
 import requests
 import json
 from dotenv import load_dotenv
 
 # Use venv. (Highest version on pythonanywhere is python3.9, so using this locally too.) On pythonanywhere, in shell, do `workon myvirtualenv`. Locally, `. venv/bin/activate.fish`. Install all needed modules. (See Dependencies list below.) To run flask locally: `python flask_app.py`, then in browser: `http://localhost:5000' or `http://127.0.0.1:5000/`
 
-# Dependencies (besides cstree and ctree): flask, prompt_toolkit, networkx, pygraphviz, asteval, rich, flask_cors, requests, python-dotenv
+# Dependencies (besides cstree and ctree): flask, prompt_toolkit, pygraphviz, rich, flask_cors, requests, python-dotenv
 
-consolef = Console(stderr=True)
+log = cslog.getlogger('web')
 #sys.setrecursionlimit(10000)
 load_dotenv()  # https://stackoverflow.com/questions/51228227/standard-practice-for-wsgi-secret-key-for-flask-applications-on-github-reposito
 app = Flask(__name__, static_url_path="", static_folder="static")
 
 UPLOAD_FOLDER = os.path.join(os.path.dirname(app.root_path), 'uploads')  # maybe shouldn't just dirname these...
 CSGV_FOLDER = os.path.join(os.path.dirname(app.root_path), 'choicescript-graphviz')
+PARSER = os.getenv('CSTREE_PARSER', 'python')  # python: csparse in this process. pool: csparse on warm worker processes (see getparserpool()). java: choicescript-graphviz, kept for comparison
+PARSER_PYTHON = os.getenv('CSTREE_PARSER_PYTHON')  # the python the pool's workers run on. Unset: this one's sys.executable, which under uWSGI is uwsgi, so set it there
+PARSER_WORKERS = int(os.getenv('CSTREE_PARSER_WORKERS', '2'))
+PARSER_TIMEOUT = float(os.getenv('CSTREE_PARSER_TIMEOUT', '10'))  # seconds per scene before its worker is killed and replaced
+# CSTREE_LOGLEVEL: how much to log, e.g. info or 'warning, allvars=debug' (see cslog.setup()). Unset: config.ini's main.loglevel, else warning
+ALLVARS = os.getenv('CSTREE_ALLVARS')  # paths, values, sample or auto (see CStree.allvars()). Unset: config.ini's main.allvars, else auto
+SAMPLE_WORKERS = os.getenv('CSTREE_SAMPLEWORKERS', '1')  # sample mode's processes, whatever config.ini says: more than 1 starts a pool of them for every request that samples
+CACHE_FOLDER = os.path.join(os.path.dirname(app.root_path), 'cache')
+CACHE_MB = float(os.getenv('CSTREE_CACHE_MB', '50'))  # 0 turns the result cache off
+CACHE_STAGES = os.getenv('CSTREE_CACHE_STAGES', 'dot')  # what to cache, comma separated: dot (final result), items (parser output)
+PROFILE = os.getenv('CSTREE_PROFILE', '') == '1'  # 1: a request with ?profile=1 is run under cProfile (skipping the result cache), its pstats dumped in PROFILE_FOLDER
+PROFILE_FOLDER = os.path.join(os.path.dirname(app.root_path), 'profiles')
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'dot', 'gv'}
 
 # TODO: proper way to config: https://stackoverflow.com/questions/17077863/how-to-see-if-a-flask-app-is-being-run-on-localhost
@@ -34,6 +51,28 @@ app.secret_key = os.getenv('SECRET_KEY', 'for dev')
 #CORS(app, resources={r"/*": {"origins": "*"}})
 
 tree = CStree()
+tree.config.set('main', 'sampleworkers', SAMPLE_WORKERS)
+parserpool = None
+parserpoolpid = None
+parserpoollock = threading.Lock()
+resultcache = None
+if CACHE_MB > 0:
+	resultcache = ResultCache(CACHE_FOLDER, int(CACHE_MB*1000*1000), [stage.strip() for stage in CACHE_STAGES.split(',')])
+
+# The parser pool, started on first use in each process: one made at import would be the uWSGI master's, its workers' pipes shared by every forked process
+def getparserpool():
+	global parserpool, parserpoolpid
+	with parserpoollock:
+		if parserpoolpid != os.getpid():
+			parserpool = ParserPool(PARSER_WORKERS, PARSER_TIMEOUT, python=PARSER_PYTHON)
+			parserpoolpid = os.getpid()
+			atexit.register(closeparserpool, parserpool, parserpoolpid)
+		return parserpool
+
+# At exit, close pool, unless this is a process forked after pid made it (its workers are pid's)
+def closeparserpool(pool, pid):
+	if os.getpid() == pid:
+		pool.close()
 
 def is_production():
     """ Determines if app is running on the production server or not.
@@ -85,7 +124,7 @@ def uploadgist(dotcode):
 		if j['message'] == 'Bad credentials':
 			return ''
 		else:
-			print('uploadgist(): ', j, file=sys.stderr)
+			log.error('uploadgist(): %s', j)
 			raise
 
 @app.route('/')
@@ -101,15 +140,25 @@ def final(file):
 @app.route('/result/<csfile>')
 def download_file(csfile):
 	#flash(f'{csfile}')
-	dotfile = csfile + '.dot'
+	#dotfile = csfile + '.dot'
 	#if os.path.isfile(f"{UPLOAD_FOLDER}/{dotfile}") and os.path.getsize(f"{UPLOAD_FOLDER}/{dotfile}") > 0:
 	#	return redirect(f"http://dreampuf.github.io/GraphvizOnline/?url=https://flurrywinde.pythonanywhere.com/uploads/{csfile}")
 	# TODO: get java output for debugging
-	status = os.system(f'java -cp {CSGV_FOLDER} Main "{UPLOAD_FOLDER}/{csfile}" > "{UPLOAD_FOLDER}/{dotfile}"')
-	if status != 0:
-		print(f'choicescript-graphviz returned {status}', file=sys.stderr)
-		raise Exception("Couldn't parse scene file")
-	return success(f"{UPLOAD_FOLDER}/{dotfile}")
+	scenefile = f"{UPLOAD_FOLDER}/{csfile}"
+	newstages(csfile)
+	if resultcache and not tree.stages.profiler:
+		# Same scene, same config: same result
+		with open(scenefile, 'rb') as f:
+			key = resultcache.key(f.read(), tree.config, PARSER, ALLVARS)
+		with tree.stages.stage('cache'):
+			dotcode = resultcache.get(key, 'dot')
+		if dotcode is not None:
+			return senddot(dotcode)
+	tree.readscene(scenefile, parser=PARSER, csgvfolder=CSGV_FOLDER, pool=getparserpool() if PARSER == 'pool' else None, cache=resultcache)
+	dotcode = analyze()
+	if resultcache and not tree.stages.profiler:
+		resultcache.put(key, 'dot', dotcode)
+	return senddot(dotcode)
 
 def allowed_file(filename):
 	return '.' in filename and \
@@ -137,7 +186,7 @@ def upload_file():
 			try:
 				file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
 			except FileNotFoundError:
-				print(f'on server: {request.url_root}. Upload of {filename} failed.')
+				log.error('on server: %s. Upload of %s failed.', request.url_root, filename)
 				raise
 			return redirect(url_for('download_file', csfile=filename))
 	#return redirect('https://flurrywinde.pythonanywhere.com/upload.html')
@@ -154,25 +203,54 @@ def upload_file():
 
 @app.route('/success/<dotcode>')
 def success(dotcode):
+	newstages('success')
 	tree.readdot(dotcode)
-	tree.allvars()
-	tree.squash_goto()
-	tree.squash_label()
-	tree.showimportantvars3()
-	tree.hideall()
-	dotcode = tree.makedot()
+	return senddot(analyze())
+
+# Run the stat analysis on the tree read in by download_file() or success(). Returns the resulting dot code, with a comment at the top saying how big the scene was estimated to be and which allvars mode that picked (auto mode only), so it's in the result and the cache
+def analyze():
+	dotcode = tree.analyze(ALLVARS)
+	if tree.estimated:
+		dotcode = f'// {estimatestr(tree.estimated)}\n' + dotcode
+	return dotcode
+
+# CStree.estimate()'s estimate (and the mode picked) in one line
+def estimatestr(estimated):
+	return f"{estimated['nodes']} nodes, {bignum(estimated['paths'])} paths, var depth {estimated['vardepth']}, {estimated['loops']} loops, {estimated['mode']} mode"
+
+# Start timing this request's stages over (see stagetimer.py), under cProfile if it asked for it (?profile=1) and that's allowed. name: what the pstats file gets named after
+def newstages(name):
+	tree.stages = StageTimer(name, profile=PROFILE and request.args.get('profile') == '1')
+
+# Send the dot code to GraphvizOnline (via a gist), or just show it if that fails. How long each stage took goes in the Server-Timing and X-CStree-Stages (all of StageTimer.asdict(), as JSON) headers, or with ?stages=json, that JSON is all that's sent
+def senddot(dotcode):
 	#tempfile.mkstemp(suffix=None, prefix=None, dir=None, text=False)
 	#handle, filename = tempfile.mkstemp(dir='/home/  Flurrywinde  /mysite/output')
 	#tree.cs2dot(filename)
 	#newdot = os.path.basename(filename)
 
 	# creating gist and getting url, script and clone link
-	gisturl = uploadgist(dotcode)
-	if gisturl:
+	with tree.stages.stage('uploadgist'):
+		gisturl = uploadgist(dotcode)
+	if tree.stages.profiler:
+		os.makedirs(PROFILE_FOLDER, exist_ok=True)
+		tree.stages.dump(os.path.join(PROFILE_FOLDER, f"{secure_filename(tree.stages.name)}-{time.strftime('%Y%m%d-%H%M%S')}.pstats"))
+	stages = tree.stages.asdict()
+	log.info('%s: %.3fs (%.3fs cpu): %s', tree.stages.name, stages['wall'], stages['cpu'], ', '.join(f"{entry['stage']} {entry['wall']:.3f}s" for entry in stages['stages']))
+	if request.args.get('stages') == 'json':
+		response = make_response(json.dumps(stages))
+		response.content_type = 'application/json'
+	elif gisturl:
 		#return redirect(f"http://dreampuf.github.io/GraphvizOnline/?url=https://flurrywinde.pythonanywhere.com/output/{newdot}")
-		return redirect(f"http://dreampuf.github.io/GraphvizOnline/?url={gisturl}")
+		response = redirect(f"http://dreampuf.github.io/GraphvizOnline/?url={gisturl}")
 	else:
-		return render_template('choice_template.html', dotcode = dotcode)
+		response = make_response(render_template('choice_template.html', dotcode = dotcode))
+	# analyze()'s estimate comment, if there is one, as a header too
+	if dotcode.startswith('// '):
+		response.headers['X-CStree-Estimate'] = dotcode.split('\n', 1)[0][3:]
+	response.headers['Server-Timing'] = tree.stages.servertiming()
+	response.headers['X-CStree-Stages'] = json.dumps(stages)
+	return response
 
 # For old, unused method of submitting scene file via textarea. (templates/choice.html)
 @app.route('/choice',methods = ['POST', 'GET'])
@@ -211,13 +289,14 @@ def basic_error(e):
 		user_ip = request.remote_addr 
 		requested_path = request.path 
 	 
-		print("User with IP %s tried to access endpoint: %s" % (user_ip , requested_path), file=sys.stderr)
-		print(e, file=sys.stderr)
-		inspect(e, console=consolef)
+		log.error('User with IP %s tried to access endpoint: %s: %s', user_ip, requested_path, e)
+		log.debug('%s', Inspected(e))
 		possible_causes = '\n<br>\n<br>Possible causes:\n<br>\n<br>'
 		# TODO: not on-the-fly html
-		if str(e) == 'maximum recursion depth exceeded':
+		if isinstance(e, LoopError) or str(e) == 'maximum recursion depth exceeded':
 			possible_causes += '\t* Infinite loop in your scene'
+		elif isinstance(e, TooBigError):
+			possible_causes += '\t* Scene too big for the server. Try splitting it up, or run cstree locally with a higher maxnodes in config.ini'
 		elif isinstance(e, FileNotFoundError):
 			possible_causes = '\n<br>\n<br>* File upload failure'
 		else:
@@ -0,0 +1,125 @@
+#!/usr/bin/python
+
+# whatis: A few long-lived parser worker processes the flask app keeps warm, so an upload doesn't pay for starting a parser (a JVM, back when choicescript-graphviz did all the parsing), and a scene that hangs or crashes the parser only takes down its worker.
+# Usage: pool = ParserPool(workers=2, timeout=10) (python: the interpreter the workers run on, default sys.executable), then items = pool.parse(scenefile) (same items as csparse.parsescene()) or tree.readscene(scenefile, parser='pool', pool=pool). pool.close() when done.
+# Protocol (one JSON object per line over the worker's stdin/stdout):
+#   request: {"id": 1, "scene": "/path/to/scene.txt"} or {"id": 1, "text": "scene text"}
+#   reply:   {"id": 1, "items": [...]} or {"id": 1, "error": "message"}
+# Run `python parserpool.py` to be a worker. Anything speaking the same protocol (e.g. a java main loop around choicescript-graphviz) can be used instead by passing its command line as cmd.
+
+import os
+import sys
+import json
+import queue
+import threading
+import subprocess
+
+import csparse
+import cslog
+
+log = cslog.getlogger('parserpool')
+
+class ParserError(Exception):
+	pass
+
+class Worker():
+	def __init__(self, cmd):
+		self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, encoding='utf-8', bufsize=1)
+		self.replies = queue.Queue()
+		# Reading on a thread is what lets request() time out (readline() itself can't)
+		self.reader = threading.Thread(target=self.readreplies, daemon=True)
+		self.reader.start()
+		self.jobid = 0
+
+	def readreplies(self):
+		for line in self.proc.stdout:
+			self.replies.put(line)
+		self.replies.put(None)	# EOF: the worker died
+
+	def alive(self):
+		return self.proc.poll() is None
+
+	def request(self, job, timeout):
+		self.jobid += 1
+		job = dict(job, id=self.jobid)
+		try:
+			self.proc.stdin.write(json.dumps(job) + '\n')
+			self.proc.stdin.flush()
+		except (BrokenPipeError, OSError):
+			raise ParserError('parser worker died')
+		while True:
+			try:
+				line = self.replies.get(timeout=timeout)
+			except queue.Empty:
+				raise ParserError(f'parser worker timed out after {timeout}s')
+			if line is None:
+				raise ParserError(f'parser worker died (exit status {self.proc.wait()})')
+			reply = json.loads(line)
+			if reply.get('id') == self.jobid:	# anything else is left over from a job that timed out
+				return reply
+
+	def kill(self):
+		if self.alive():
+			self.proc.kill()
+		self.proc.wait()
+		self.proc.stdin.close()
+
+class ParserPool():
+	def __init__(self, workers=2, timeout=10, cmd=None, python=None):
+		self.cmd = cmd or [python or sys.executable, os.path.abspath(__file__)]
+		self.timeout = timeout
+		self.idle = queue.Queue()
+		self.restarts = 0
+		for i in range(workers):
+			self.idle.put(Worker(self.cmd))
+
+	# Parse a scene file (or, with text=True, scene text) on the next free worker. Raises ParserError if the scene doesn't parse, the worker crashes, or it takes longer than timeout (the worker is then replaced)
+	def parse(self, scene, text=False, timeout=None):
+		if timeout is None:
+			timeout = self.timeout
+		worker = self.idle.get()
+		try:
+			if not worker.alive():
+				worker = self.restart(worker)
+			reply = worker.request({'text' if text else 'scene': scene}, timeout)
+		except ParserError:
+			worker = self.restart(worker)
+			raise
+		finally:
+			self.idle.put(worker)
+		if 'error' in reply:
+			raise ParserError(reply['error'])
+		return reply['items']
+
+	def restart(self, worker):
+		worker.kill()
+		self.restarts += 1
+		log.warning('restarting worker (restart #%d)', self.restarts)
+		return Worker(self.cmd)
+
+	def close(self):
+		while not self.idle.empty():
+			worker = self.idle.get()
+			worker.proc.stdin.close()	# worker exits on EOF
+			try:
+				worker.proc.wait(timeout=1)
+			except subprocess.TimeoutExpired:
+				worker.kill()
+
+# Worker side: answer jobs from stdin until it's closed
+def serve(infile=sys.stdin, outfile=sys.stdout):
+	for line in infile:
+		job = json.loads(line)
+		reply = {'id': job.get('id')}
+		try:
+			if 'text' in job:
+				reply['items'] = csparse.parsescene(job['text'])
+			else:
+				reply['items'] = csparse.parsescenefile(job['scene'])
+		except Exception as e:
+			reply['error'] = f'{type(e).__name__}: {e}'
+		outfile.write(json.dumps(reply) + '\n')
+		outfile.flush()
+
+if __name__ == '__main__':
+	serve()
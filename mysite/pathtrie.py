@@ -0,0 +1,68 @@
+#!/usr/bin/python
+
+# whatis: PathTrie, the paths allvars() keys node.vars by, as int ids into one trie of var-node line numbers shared by the whole tree. A path is the startln's of the var nodes on the way to a node (what used to be the string '3.10.25'), so extending one is a dict lookup, two are the same path iff their ids are equal, and each distinct path is stored once instead of as a string in every node's vars.
+# Usage: paths = PathTrie(), then p = paths.extend(paths.ROOT, 3), p = paths.extend(p, 10), paths.str(p) -> '3.10', paths.sum[p] -> 13 (what showvars sorts by), paths.rebase(p, old, new) moves p's part below old onto new.
+# Strings are only made (and then kept) by str(), for showing them.
+
+from array import array
+
+class PathTrie():
+	ROOT = 0  # the empty path
+
+	def __init__(self):
+		self.parent = array('l', [-1])
+		self.ln = array('l', [0])
+		self.depth = array('l', [0])
+		self.sum = array('l', [0])  # of its ln's
+		self.ids = {}  # (parent id, ln) -> id
+		self.strs = {self.ROOT: ''}
+
+	def __len__(self):
+		return len(self.parent)
+
+	# id of path with ln tacked on
+	def extend(self, path, ln):
+		ln = int(ln)
+		key = (path, ln)
+		id = self.ids.get(key)
+		if id is None:
+			id = len(self.parent)
+			self.ids[key] = id
+			self.parent.append(path)
+			self.ln.append(ln)
+			self.depth.append(self.depth[path] + 1)
+			self.sum.append(self.sum[path] + ln)
+		return id
+
+	# path's ln's, from the top
+	def lns(self, path):
+		lns = []
+		while path != self.ROOT:
+			lns.append(self.ln[path])
+			path = self.parent[path]
+		lns.reverse()
+		return lns
+
+	# path, which starts with old, with that start swapped for new
+	def rebase(self, path, old, new):
+		if old == new:
+			return path
+		lns = []
+		while path != old:
+			lns.append(self.ln[path])
+			path = self.parent[path]
+		for ln in reversed(lns):
+			new = self.extend(new, ln)
+		return new
+
+	def str(self, path):
+		# up to the nearest path that already has its string, then build them back down
+		todo = []
+		while path not in self.strs:
+			todo.append(path)
+			path = self.parent[path]
+		s = self.strs[path]
+		for path in reversed(todo):
+			s = f'{s}.{self.ln[path]}' if s else f'{self.ln[path]}'
+			self.strs[path] = s
+		return s
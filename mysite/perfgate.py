@@ -0,0 +1,130 @@
+#!/usr/bin/python
+
+# whatis: Catches cstree getting slower or bigger: runs a fixed set of scenes (CORPUS) through the whole pipeline (see scenebench.measure()), compares each stage's time and memory to the baseline (perfbaseline.json, committed with the code), and exits with 1, showing a table of what changed, if any stage got worse by more than the tolerances.
+# Usage: `python perfgate.py` to check, `python perfgate.py --update` to make what this version does the new baseline (after a change that's meant to be slower or bigger, or on a new machine: times only compare on the same one). Time is each stage's CPU time (the fastest of --repeat runs), which other things running on the machine move around less than wall time. --time-tolerance 0.5 (the default) lets a stage be 50% slower, as long as that's more than --min-time seconds (so stages that take no time at all don't fail on noise); --memory-tolerance and --min-memory do the same for its peak memory.
+# Memory is tracemalloc's peak for each stage (see stagetimer.py), which comes out about the same every run, so it can be held much tighter than time (--memory-tolerance 0.1). Times from run to run on the same machine can be 30% apart, more on a busy one.
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+from rich.console import Console
+from rich.table import Table
+
+import scenebench
+import scenegen
+
+console = Console()
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perfbaseline.json')
+UPLOADS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads')
+
+# name: (scene file in uploads/ or scenegen.makescene() sizes, allvars mode)
+CORPUS = {
+	'mygame-orig': ('mygame-orig.txt', 'auto'),
+	'paths': ({'blocks': 10}, 'auto'),
+	'options': ({'blocks': 8, 'options': 4}, 'auto'),
+	'depth': ({'blocks': 5, 'depth': 2}, 'auto'),
+	'ifs': ({'blocks': 10, 'ifs': 1.0}, 'auto'),
+	'loops': ({'blocks': 10, 'loops': 4}, 'auto'),
+	'values': ({'blocks': 40, 'stats': 1}, 'values'),
+}
+
+def scenetext(scene):
+	if isinstance(scene, dict):
+		return scenegen.makescene(**scene)
+	with open(os.path.join(UPLOADS, scene)) as f:
+		return f.read()
+
+# Run the corpus, repeat times each for the times. Returns {name: {'nodes': ..., 'error': ..., 'stages': {stage: {'wall', 'cpu', 'peak', 'allocated'}}}}
+def runcorpus(repeat=5):
+	results = {}
+	for name, (scene, mode) in CORPUS.items():
+		result = scenebench.measure(scenetext(scene), name, mode, repeat=repeat)
+		results[name] = {
+			'mode': result['mode'],
+			'nodes': result['nodes'],
+			'error': result['error'],
+			'stages': {entry['stage']: {key: entry[key] for key in ['wall', 'cpu', 'peak', 'allocated']} for entry in result['stages']},
+		}
+	return results
+
+def change(old, new):
+	return f'{(new - old) / old:+.0%}' if old else ''
+
+# Compare results to baseline's. Returns (rows for the table, whether anything got worse). A scene with different nodes or another mode, or a stage the baseline has that wasn't run, counts as worse too: its numbers don't compare anymore, so if that's meant, it needs a new baseline (--update)
+def compare(baseline, results, timetolerance, mintime, memorytolerance, minmemory):
+	rows = []
+	worse = False
+	for name, result in results.items():
+		if name not in baseline:
+			rows.append((name, '', '', '', '', '', 'not in baseline'))
+			continue
+		old = baseline[name]
+		if result['error']:
+			rows.append((name, '', '', '', '', '', f"error: {result['error']}"))
+			worse = True
+			continue
+		if result['nodes'] != old['nodes'] or result['mode'] != old['mode']:
+			rows.append((name, '', '', '', '', '', f"scene changed: {old['nodes']} -> {result['nodes']} nodes, {old['mode']} -> {result['mode']} mode"))
+			worse = True
+		for stage, oldentry in old['stages'].items():
+			if stage not in result['stages']:
+				rows.append((name, stage, f"{oldentry['cpu']*1000:.1f}ms", '', f"{oldentry['peak']/1e6:.2f}MB", '', 'stage missing'))
+				worse = True
+		for stage, entry in result['stages'].items():
+			if stage not in old['stages']:
+				rows.append((name, stage, '', f"{entry['cpu']*1000:.1f}ms", '', f"{entry['peak']/1e6:.2f}MB", 'new stage'))
+				continue
+			oldentry = old['stages'][stage]
+			problems = []
+			if entry['cpu'] > oldentry['cpu'] * (1 + timetolerance) and entry['cpu'] - oldentry['cpu'] > mintime:
+				problems.append('slower')
+			if entry['peak'] > oldentry['peak'] * (1 + memorytolerance) and entry['peak'] - oldentry['peak'] > minmemory:
+				problems.append('bigger')
+			worse = worse or bool(problems)
+			rows.append((name, stage, f"{oldentry['cpu']*1000:.1f}ms", f"{entry['cpu']*1000:.1f}ms {change(oldentry['cpu'], entry['cpu'])}", f"{oldentry['peak']/1e6:.2f}MB", f"{entry['peak']/1e6:.2f}MB {change(oldentry['peak'], entry['peak'])}", ', '.join(problems) or 'ok'))
+	return rows, worse
+
+def showrows(rows, onlyworse=False):
+	table = Table('scene', 'stage', 'baseline cpu', 'cpu', 'baseline peak', 'peak', '', title='perfgate')
+	for row in rows:
+		if onlyworse and row[-1] == 'ok':
+			continue
+		table.add_row(*row, style=None if row[-1] in ['ok', 'new stage', 'not in baseline'] else 'red')
+	console.print(table)
+
+def main(args):
+	parser = argparse.ArgumentParser(description="Check cstree's stages aren't slower or bigger than in the baseline")
+	parser.add_argument('--baseline', default=BASELINE, help='baseline JSON (default: perfbaseline.json next to this)')
+	parser.add_argument('--update', action='store_true', help='save this run as the baseline instead of checking it')
+	parser.add_argument('--repeat', type=int, default=5, help="runs per scene, keeping each stage's fastest (default 5)")
+	parser.add_argument('--time-tolerance', type=float, default=0.5, help='how much slower a stage can be, as a fraction (default 0.5)')
+	parser.add_argument('--min-time', type=float, default=0.01, help="slowdowns under this many seconds don't count (default 0.01)")
+	parser.add_argument('--memory-tolerance', type=float, default=0.10, help="how much more a stage's peak memory can be, as a fraction (default 0.10)")
+	parser.add_argument('--min-memory', type=int, default=64000, help="increases under this many bytes don't count (default 64000)")
+	parser.add_argument('--all', action='store_true', help="show every stage, not just the ones that got worse")
+	args = parser.parse_args(args)
+
+	results = runcorpus(args.repeat)
+	if args.update:
+		baseline = {'version': scenebench.gitversion(), 'python': platform.python_version(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'repeat': args.repeat, 'scenes': results}  # version before opening the file, which would make it -dirty
+		with open(args.baseline, 'w') as f:
+			json.dump(baseline, f, indent=1)
+		console.print(f'Saved the baseline in {args.baseline}')
+		return 0
+	with open(args.baseline) as f:
+		baseline = json.load(f)
+	rows, worse = compare(baseline['scenes'], results, args.time_tolerance, args.min_time, args.memory_tolerance, args.min_memory)
+	showrows(rows, onlyworse=worse and not args.all)
+	if worse:
+		console.print(f"[red]Worse than the baseline ({baseline['version']}, {baseline['date']}). If that's meant, `python perfgate.py --update` makes this the baseline")
+		return 1
+	console.print(f"No stage worse than the baseline ({baseline['version']}, {baseline['date']})")
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
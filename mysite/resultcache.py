@@ -0,0 +1,89 @@
+#!/usr/bin/python
+
+# whatis: On-disk cache of parse and analysis results, keyed by a hash of the scene's bytes plus whatever else changes the result (config, parser), so re-uploading the same scene skips the whole pipeline. Size-bounded, least recently used entries go first.
+# Usage: cache = ResultCache(folder, maxbytes), key = cache.key(scenebytes, config, 'pool'), then cache.get(key, 'dot') (None on a miss) and cache.put(key, 'dot', dotcode).
+# Each entry is one file, <key>.<stage>, e.g. the final makedot() output is stage 'dot' and csparse's items are stage 'items'. A file's mtime is its last use, which is what eviction goes by.
+
+import os
+import io
+import json
+import hashlib
+import tempfile
+
+# Bump when a code change would change cached results, so old entries stop matching
+CACHE_VERSION = '2'
+
+class ResultCache():
+	def __init__(self, folder, maxbytes=50*1000*1000, stages=('dot',)):
+		self.folder = folder
+		self.maxbytes = maxbytes
+		self.stages = stages	# the ones put() actually stores; the others are ignored
+		self.hits = 0
+		self.misses = 0
+		os.makedirs(folder, exist_ok=True)
+
+	# Hash of the scene's bytes and the other things its results depend on. A ConfigParser is hashed by its full text, so any config change is a different key
+	def key(self, scenebytes, *extra):
+		h = hashlib.sha256()
+		h.update(CACHE_VERSION.encode())
+		h.update(scenebytes)
+		for e in extra:
+			if hasattr(e, 'write'):
+				buf = io.StringIO()
+				e.write(buf)
+				e = buf.getvalue()
+			h.update(b'\0' + str(e).encode('utf-8'))
+		return h.hexdigest()
+
+	def path(self, key, stage):
+		return os.path.join(self.folder, f'{key}.{stage}')
+
+	def get(self, key, stage='dot'):
+		path = self.path(key, stage)
+		try:
+			with open(path, encoding='utf-8') as f:
+				value = f.read()
+			os.utime(path)	# mark as recently used
+		except OSError:
+			self.misses += 1
+			return None
+		self.hits += 1
+		return json.loads(value) if stage == 'items' else value
+
+	def put(self, key, stage, value):
+		if stage not in self.stages:
+			return
+		if stage == 'items':
+			value = json.dumps(value)
+		# Write then rename, so a concurrent get() never sees half a file
+		fd, tmppath = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+		with os.fdopen(fd, 'w', encoding='utf-8') as f:
+			f.write(value)
+		os.replace(tmppath, self.path(key, stage))
+		self.evict()
+
+	# Delete least recently used entries until the cache fits in maxbytes
+	def evict(self):
+		entries = []
+		total = 0
+		with os.scandir(self.folder) as it:
+			for entry in it:
+				if entry.name.endswith('.tmp'):
+					continue
+				st = entry.stat()
+				entries.append((st.st_mtime, st.st_size, entry.path))
+				total += st.st_size
+		entries.sort()
+		for mtime, size, path in entries:
+			if total <= self.maxbytes:
+				break
+			try:
+				os.remove(path)
+			except OSError:
+				pass	# someone else already evicted it
+			total -= size
+
+	def clear(self):
+		with os.scandir(self.folder) as it:
+			for entry in it:
+				os.remove(entry.path)
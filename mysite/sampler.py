@@ -0,0 +1,156 @@
+#!/usr/bin/python
+
+# whatis: Random walks through a scene, for allvars()' sample mode (CStree.allsamples()). Each walk goes from the start to an end, taking a random option at every *choice and doing every *set/*if on its way, and what values each node saw, and on how many walks, gets added up.
+# Walks are done in batches of BATCH on a process pool. Walk i's choices come from its own random.Random seeded with the seed and i, so the result depends only on the seed and how many walks, not on how many workers or in what order they finish.
+# The scene is passed in as a plain dict (see CStree.samplegraph()), not CSnode's:
+#   node id: (kind, startln, label, children, var), kind 'var' (a *create/*temp/*set), 'cond' (an *if, children (truechild, falsechild), None for a side that goes nowhere) or 'node' (anything else, one child taken at random), var (cmd, varname, valuestr) for a 'var'
+# What comes back (walks(), sample()): node id: [walks through it, var: {val: [walks with it, path of the first of them]}], a path being the startln's of the var nodes on the way (e.g. ('3', '10', '25')), and how many walks were cut short
+# A *goto back up the scene makes a loop, which a walk can go around forever (always, for one with no *choice on the way out), so a walk is cut short after STEPSPERNODE times as many steps as the scene has nodes. What it saw up to then still counts
+
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import cseval
+
+BATCH = 100  # walks per pool task
+STEPSPERNODE = 10  # a walk taking more steps than this times the nodes is going around a loop
+
+graph = None  # the scene, in each worker (see setgraph())
+exprs = {}  # node id -> its compiled *set/*if, in each worker
+
+def setgraph(newgraph):
+	global graph
+	graph = newgraph
+	exprs.clear()
+
+def nodeexpr(nodeid):
+	if nodeid not in exprs:
+		exprs[nodeid] = cseval.compilecommand(graph[nodeid][2])
+	return exprs[nodeid]
+
+# expr on vars, as seteval()/ifeval() do it
+def run(expr, vars):
+	return expr({varname: cseval.value(vars[varname]) for varname in expr.varnames if varname in vars})
+
+# Walks start to stop - 1 from root, seeded with seed. Returns what they saw and how many were cut short (see above)
+# The values on a walk only change at var nodes, so a walk counts which state (all its var: val's, numbered the first time any walk has them) it came through each node with, and that's only turned into var: {val: ...} at the end
+def walks(root, start, stop, seed):
+	states = {}  # ((var, val), ...) -> its number
+	statevars = []  # number -> its var: val's
+	def stateof(vars):
+		state = tuple(sorted(vars.items(), key=lambda item: item[0]))
+		if state not in states:
+			states[state] = len(statevars)
+			statevars.append(vars)
+		return states[state]
+
+	visits = {}  # node id -> {state: [walks through node with it, first of them, its path]}
+	maxsteps = STEPSPERNODE * len(graph)
+	truncated = 0
+	for i in range(start, stop):
+		rng = random.Random(f'{seed}:{i}')
+		vars = {}
+		state = stateof(vars)
+		path = []
+		nodeid = root
+		steps = 0
+		while nodeid is not None:
+			steps += 1
+			if steps > maxsteps:
+				truncated += 1
+				break
+			kind, startln, label, children, var = graph[nodeid]
+			nodestate = state
+			if kind == 'var':
+				path.append(startln)
+				cmd, varname, valuestr = var
+				if cmd == 'SET':
+					if varname in vars:
+						result = run(nodeexpr(nodeid), vars)
+						try:
+							result = int(result)
+						except (TypeError, ValueError):
+							pass
+						# shown in arrow form on the *set itself, like allvars() does
+						nodestate = stateof({**vars, varname: f'{vars[varname]} -> {nodeexpr(nodeid).display} = {result}'})
+						vars = {**vars, varname: result}
+						state = stateof(vars)
+				elif varname not in vars:
+					vars = {**vars, varname: valuestr}
+					state = nodestate = stateof(vars)
+			nodevisits = visits.setdefault(nodeid, {})
+			if nodestate in nodevisits:
+				nodevisits[nodestate][0] += 1
+			else:
+				nodevisits[nodestate] = [1, i, tuple(path)]
+			if kind == 'cond':
+				nodeid = children[0] if run(nodeexpr(nodeid), vars) else children[1]
+			elif len(children) > 1:
+				nodeid = rng.choice(children)
+			elif children:
+				nodeid = children[0]
+			else:
+				nodeid = None
+
+	seen = {}
+	for nodeid, nodevisits in visits.items():
+		vars = {}
+		firsts = {}
+		for nodestate, (count, first, path) in nodevisits.items():
+			for varname, val in statevars[nodestate].items():
+				vals = vars.setdefault(varname, {})
+				if val in vals:
+					vals[val][0] += count
+					if first < firsts[varname, val]:
+						vals[val][1] = path
+						firsts[varname, val] = first
+				else:
+					vals[val] = [count, path]
+					firsts[varname, val] = first
+		seen[nodeid] = [sum(count for count, first, path in nodevisits.values()), vars]
+	return seen, truncated
+
+def batch(args):
+	return walks(*args)
+
+# add what later walks saw (more) into what earlier ones did (seen)
+def merge(seen, more):
+	for nodeid, (count, vars) in more.items():
+		if nodeid not in seen:
+			seen[nodeid] = [count, vars]
+			continue
+		node = seen[nodeid]
+		node[0] += count
+		for varname, vals in vars.items():
+			nodevals = node[1].setdefault(varname, {})
+			for val, (valcount, path) in vals.items():
+				if val in nodevals:
+					nodevals[val][0] += valcount
+				else:
+					nodevals[val] = [valcount, path]
+
+# nwalks walks through scenegraph from root, on workers processes (1: no pool, just this one). Returns what they saw and how many were cut short
+def sample(scenegraph, root, nwalks, seed=0, workers=1):
+	jobs = [(root, start, min(start + BATCH, nwalks), seed) for start in range(0, nwalks, BATCH)]
+	seen = {}
+	truncated = 0
+	if workers <= 1 or len(jobs) <= 1:
+		setgraph(scenegraph)
+		results = map(batch, jobs)
+	else:
+		pool = ProcessPoolExecutor(max_workers=workers, initializer=setgraph, initargs=(scenegraph,))
+		# map() gives them back in order, so the first walk to see a value is the one whose path it keeps
+		results = pool.map(batch, jobs)
+	try:
+		for more, moretruncated in results:
+			merge(seen, more)
+			truncated += moretruncated
+	finally:
+		if workers > 1 and len(jobs) > 1:
+			pool.shutdown()
+	return seen, truncated
+
+# About how many of all the paths have one of vals (val: [walks with it, ...]), seen on count walks (Good-Turing: the chance the next walk brings a new one is about how many were seen on just one walk, over count). Values only very few paths have can still be missing at close to 1
+def confidence(vals, count):
+	once = sum(1 for valcount, path in vals.values() if valcount == 1)
+	return 1 - once / count
@@ -0,0 +1,164 @@
+#!/usr/bin/python
+
+# whatis: How cstree scales: runs scenegen.py's scenes through the whole pipeline (CStree.readscene() then analyze(), the same stages the website does), making one size bigger at a time, and shows how long each stage took and the most memory it used, per size. With --out, it's all saved as JSON, to compare with what another version of cstree did.
+# Usage: `python scenebench.py blocks depth --out bench.json` (or no series to run them all). --set blocks=20 changes a size for all series (the rest are scenegen.SIZES), --mode picks the allvars mode (default auto, whatever config.ini says, so runs on different machines compare).
+# Each scene is run twice: once for the times, once with tracemalloc on for the memory (--no-memory to skip that), since tracing slows everything down. --snapshots N also takes tracemalloc snapshots around each stage in that run, and shows the biggest scene of each series' memory per node and per path, and each stage's top N allocators (see stagetimer.py).
+
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+from rich.console import Console
+from rich.table import Table
+
+from cstree import CStree, LoopError, bignum
+from stagetimer import StageTimer, memorytable
+import scenegen
+
+console = Console()
+
+# size: what it goes through in its series
+SERIES = {
+	'blocks': [5, 10, 20, 40],
+	'options': [2, 3, 4],
+	'depth': [1, 2, 3],
+	'stats': [1, 2, 5, 10],
+	'converge': [0.25, 0.5, 0.75, 1.0],
+	'loops': [0, 2, 4, 8],
+	'ifs': [0, 0.25, 0.5, 1.0],
+}
+
+# The commit this is (with -dirty if there are changes), to tell runs apart
+def gitversion():
+	try:
+		return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True).stdout.strip() or None
+	except OSError:
+		return None
+
+# The scene text through the pipeline, in allvars mode mode. Returns its StageTimer.asdict(), with the scene's nodes, paths (estimate()'s, None if it couldn't), allvars mode, and error (what went wrong, if something did: the stages up to it are still there)
+def runscene(text, name='', mode='auto', snapshots=0):
+	tree = CStree()
+	tree.stages = StageTimer(name, snapshots=snapshots)
+	error = None
+	paths = None
+	with tempfile.TemporaryDirectory() as folder:
+		scenefile = os.path.join(folder, 'scene.txt')
+		with open(scenefile, 'w') as f:
+			f.write(text)
+		try:
+			tree.readscene(scenefile, parser='python')
+			try:
+				paths = tree.estimate()['paths']  # before analyze(): its squashing leaves a tree estimate() can't go through
+			except LoopError:
+				pass
+			tree.analyze(mode)
+		except Exception as e:
+			error = f'{type(e).__name__}: {e}'
+	result = tree.stages.asdict()
+	result['nodes'] = len(tree.nodes)
+	result['paths'] = paths
+	result['mode'] = tree.estimated['mode'] if tree.estimated else mode
+	result['error'] = error
+	return result
+
+# runscene() repeat times, keeping each stage's fastest (with the garbage collector off, like timeit does, so a collection landing in one stage or another doesn't move times around), and again with tracemalloc on for each stage's peak and allocated (and with snapshots, its top allocators, pernode and perpath)
+def measure(text, name='', mode='auto', memory=True, snapshots=0, repeat=1):
+	gc.collect()
+	gc.disable()
+	try:
+		result = runscene(text, name, mode)
+		for i in range(repeat - 1):
+			again = runscene(text, name, mode)
+			for entry, againentry in zip(result['stages'], again['stages']):
+				entry['wall'] = min(entry['wall'], againentry['wall'])
+				entry['cpu'] = min(entry['cpu'], againentry['cpu'])
+	finally:
+		gc.enable()
+	if repeat > 1:
+		result['wall'] = sum(entry['wall'] for entry in result['stages'])
+		result['cpu'] = sum(entry['cpu'] for entry in result['stages'])
+	if memory:
+		tracemalloc.start()
+		try:
+			traced = runscene(text, name, mode, snapshots)
+		finally:
+			tracemalloc.stop()
+		for entry, tracedentry in zip(result['stages'], traced['stages']):
+			for key in ['peak', 'allocated', 'top', 'pernode', 'perpath']:
+				if key in tracedentry:
+					entry[key] = tracedentry[key]
+		result['peak'] = max((entry['peak'] for entry in result['stages']), default=0)
+	return result
+
+# Run series (its SERIES sizes, the rest from base). Returns a result (see runscene()) per size, each with its scene's sizes
+def runseries(series, base, mode='auto', memory=True, snapshots=0):
+	results = []
+	for value in SERIES[series]:
+		sizes = {**base, series: value}
+		result = measure(scenegen.makescene(**sizes), f'{series}={value}', mode, memory, snapshots)
+		result['sizes'] = sizes
+		results.append(result)
+	return results
+
+def cell(entry):
+	if entry is None:
+		return '-'
+	if 'peak' in entry:
+		return f"{entry['wall']*1000:.1f}ms {entry['peak']/1e6:.2f}MB"
+	return f"{entry['wall']*1000:.1f}ms"
+
+# A table of series' results: a row per stage, a column per size
+def showseries(series, results):
+	table = Table(series, *[str(result['sizes'][series]) for result in results], title=series)
+	table.add_row('mode', *[result['mode'] for result in results])
+	table.add_row('nodes', *[str(result['nodes']) for result in results])
+	table.add_row('paths', *['-' if result['paths'] is None else bignum(result['paths']) for result in results])
+	stages = []
+	for result in results:
+		for entry in result['stages']:
+			if entry['stage'] not in stages:
+				stages.append(entry['stage'])
+	for stage in stages:
+		table.add_row(stage, *[cell(next((entry for entry in result['stages'] if entry['stage'] == stage), None)) for result in results])
+	table.add_row('total', *[f"{result['wall']:.3f}s" for result in results], style='bold')
+	for result in results:
+		if result['error']:
+			table.add_row('error', *[result['error'] or '' for result in results], style='red')
+			break
+	console.print(table)
+
+def main(args):
+	parser = argparse.ArgumentParser(description='Time (and memory) for each cstree stage on bigger and bigger made-up scenes')
+	parser.add_argument('series', nargs='*', help=f'sizes to grow, one at a time (default: all): {", ".join(SERIES)}')
+	parser.add_argument('--set', nargs='*', default=[], metavar='SIZE=VALUE', help='sizes for all the scenes, instead of scenegen.SIZES')
+	parser.add_argument('--mode', default='auto', help='allvars mode (paths, values, sample or auto, the default)')
+	parser.add_argument('--out', help='save the results here, as JSON')
+	parser.add_argument('--snapshots', type=int, default=0, metavar='N', help="tracemalloc snapshots around each stage, showing the biggest scene's top N allocators per stage")
+	parser.add_argument('--no-memory', dest='memory', action='store_false', help="don't measure memory (one run per scene instead of two)")
+	args = parser.parse_args(args)
+	for series in args.series:
+		if series not in SERIES:
+			parser.error(f'Unknown series: {series}. Choose from: {", ".join(SERIES)}')
+	base = {**scenegen.SIZES, **scenegen.parsesizes(args.set)}
+
+	results = {'version': gitversion(), 'python': platform.python_version(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'base': base, 'series': {}}
+	for series in args.series or list(SERIES):
+		results['series'][series] = runseries(series, base, args.mode, args.memory, args.snapshots)
+		showseries(series, results['series'][series])
+		if args.memory and args.snapshots:
+			biggest = results['series'][series][-1]
+			console.print(memorytable(biggest, title=f"{series}={biggest['sizes'][series]}: memory"))
+	if args.out:
+		with open(args.out, 'w') as f:
+			json.dump(results, f, indent=1)
+		console.print(f'Saved in {args.out}')
+
+if __name__ == '__main__':
+	main(sys.argv[1:])
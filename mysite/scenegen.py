@@ -0,0 +1,71 @@
+#!/usr/bin/python
+
+# whatis: Made-up choicescript scenes of whatever size, to see how cstree scales (see scenebench.py). makescene() returns the scene's text.
+# The scene: stats stats (s0, s1, ...) *create'd at 50, then blocks *label'd *choice's one after the other. Each *choice has options options, and each option *set's a random stat, then (down to depth *choice's deep) has a *choice of its own, or else *goto's the next block (converge of the time; otherwise it *finish'es, but the first option of a *choice always goes on, so every block gets reached).
+# ifs: how many of the options (0 to 1) also have an *if on some stat, *set'ing another one under it. loops: how many blocks get an extra option going back to their own *label (like "Look around again"), which makes a cycle (auto then picks values or sample mode: paths mode raises LoopError on those).
+# Usage: makescene(blocks=20, options=3) (see SIZES for the rest), or `python scenegen.py blocks=20 options=3` to print one
+# The same arguments (seed included) always give the same scene.
+
+import sys
+import random
+
+# makescene()'s arguments and what they are unless given
+SIZES = {
+	'stats': 3,
+	'blocks': 10,
+	'options': 2,
+	'depth': 1,
+	'converge': 1.0,
+	'loops': 0,
+	'ifs': 0.25,
+	'seed': 0,
+}
+
+def makescene(stats=3, blocks=10, options=2, depth=1, converge=1.0, loops=0, ifs=0.25, seed=0):
+	rng = random.Random(seed)
+	lines = [f'*create s{i} 50' for i in range(stats)]
+	loopblocks = set(rng.sample(range(blocks), min(loops, blocks)))
+
+	def setline(indent):
+		return f"{indent}*set s{rng.randrange(stats)} {rng.choice('+-')}{rng.randint(1, 5)}"
+
+	# A *choice indent deep, level *choice's down in block i
+	def choice(indent, i, level):
+		lines.append(f'{indent}*choice')
+		for j in range(options):
+			lines.append(f'{indent}\t#Option {j+1}')
+			body = indent + '\t\t'
+			lines.append(setline(body))
+			if rng.random() < ifs:
+				lines.append(f'{body}*if s{rng.randrange(stats)} > 50')
+				lines.append(setline(body + '\t'))
+			if level < depth:
+				choice(body, i, level + 1)
+			elif j == 0 or rng.random() < converge:
+				lines.append(f'{body}*goto block{i+1}')
+			else:
+				lines.append(f'{body}*finish')
+		if level == 1 and i in loopblocks:
+			lines.append(f'{indent}\t#Look around again')
+			lines.append(f'{indent}\t\t*goto block{i}')
+
+	for i in range(blocks):
+		lines.append(f'*label block{i}')
+		lines.append(f'Block {i}.')
+		choice('', i, 1)
+	lines.append(f'*label block{blocks}')
+	lines.append('*finish')
+	return '\n'.join(lines) + '\n'
+
+# 'name=value' args to makescene() keyword args, with SIZES' types
+def parsesizes(args):
+	sizes = {}
+	for arg in args:
+		name, value = arg.split('=', 1)
+		if name not in SIZES:
+			raise ValueError(f'Unknown size: {name}. Choose from: {", ".join(SIZES)}')
+		sizes[name] = type(SIZES[name])(value)
+	return sizes
+
+if __name__ == '__main__':
+	print(makescene(**parsesizes(sys.argv[1:])), end='')
@@ -0,0 +1,116 @@
+#!/usr/bin/python
+
+# whatis: StageTimer, how long each stage of an analysis took (parse, remove_cycles, singleparent, make_csnodes, allvars, ..., makedot, uploadgist), in wall time and CPU time, and how many nodes and paths there were after it. The flask app makes one per request (CStree.stages) and sends it back in headers (see flask_app.py's senddot()).
+# Usage: timer = StageTimer(name) (name: what's being timed, e.g. the scene file), then `with timer.stage('allvars', counts):` around each stage, counts a function giving {'nodes': ..., ...} to record after it (see CStree.stage()). timer.asdict() is it all, as JSON-able dicts.
+# CPU time is this thread's (time.thread_time()), so it leaves out other requests' threads, but also the parser pool's workers and the JVM: their stages' wall time minus CPU time is mostly waiting on those.
+# If tracemalloc is tracing (tracemalloc.start()), each stage also gets peak, the most memory it had allocated at once (on top of what there was before it), and allocated, how much more there is after it than before. Tracing slows everything down, so don't take the times from those runs
+# With snapshots (and tracemalloc tracing), a tracemalloc snapshot is taken before and after each stage too, and the stage gets top, the snapshots lines of code whose allocations grew the most over it, and pernode and perpath, its allocated over its nodes and pathids (so for make_csnodes, about what a CSnode costs, and for allvars, what each path it keeps in node.vars does). memorytable() shows them. Snapshots of a big heap are slow, so only ask for them when looking for where the memory goes
+# With profile, a cProfile.Profile runs during the stages (and only then), and dump() writes its pstats file, to look at with `python -m pstats file` or snakeviz.
+
+import os
+import time
+import tracemalloc
+import cProfile
+import contextlib
+
+from rich.table import Table
+
+# What's left out of the snapshots: tracemalloc itself, this file's own bookkeeping, and imports
+SNAPSHOTFILTERS = [
+	tracemalloc.Filter(False, tracemalloc.__file__),
+	tracemalloc.Filter(False, __file__),
+	tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+	tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+	tracemalloc.Filter(False, '<unknown>'),
+]
+
+# The n lines of code whose allocations grew (or shrank) the most from snapshot before to after, as {'where': file:line, 'size': bytes, 'count': allocations}
+def topallocations(before, after, n):
+	stats = after.filter_traces(SNAPSHOTFILTERS).compare_to(before.filter_traces(SNAPSHOTFILTERS), 'lineno')
+	return [{'where': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}', 'size': stat.size_diff, 'count': stat.count_diff} for stat in stats[:n]]
+
+# filename:line, shorter: from site-packages/ on for a package, just the file for anything else
+def shortwhere(where):
+	if 'site-packages' + os.sep in where:
+		return where.split('site-packages' + os.sep, 1)[1]
+	return os.path.basename(where)
+
+def mb(size):
+	return f'{size/1e6:.2f}MB'
+
+# A table of a run's stages (StageTimer.asdict()): wall and CPU time, nodes and path ids after each
+def timetable(stages, title=None):
+	table = Table('stage', 'wall (ms)', 'cpu (ms)', 'nodes', 'path ids', title=title)
+	for entry in stages['stages']:
+		table.add_row(entry['stage'], f"{entry['wall']*1000:.1f}", f"{entry['cpu']*1000:.1f}", str(entry.get('nodes', '-')), str(entry.get('pathids', '-')))
+	table.add_row('total', f"{stages['wall']*1000:.1f}", f"{stages['cpu']*1000:.1f}", '', '', style='bold')
+	return table
+
+# A table of a run's stages (StageTimer.asdict()) memory: peak, allocated, per node and per path, and the top allocators, if it took snapshots
+def memorytable(stages, title=None):
+	table = Table('stage', 'peak', 'allocated', 'per node', 'per path', 'top allocators', title=title)
+	for entry in stages['stages']:
+		if 'peak' not in entry:
+			continue
+		top = '\n'.join(f"{shortwhere(alloc['where'])} {alloc['size']/1e3:+.1f}kB ({alloc['count']:+d})" for alloc in entry.get('top', []))
+		pernode = '-' if entry.get('pernode') is None else f"{entry['pernode']:.0f}B"
+		perpath = '-' if entry.get('perpath') is None else f"{entry['perpath']:.0f}B"
+		table.add_row(entry['stage'], mb(entry['peak']), mb(entry['allocated']), pernode, perpath, top)
+	return table
+
+class StageTimer():
+	def __init__(self, name='', profile=False, snapshots=0):
+		self.name = name
+		self.snapshots = snapshots  # how many top allocators to keep per stage (0: no snapshots)
+		self.stages = []  # {'stage': name, 'wall': s, 'cpu': s, and whatever counts gave}, in the order they were done
+		self.profiler = cProfile.Profile() if profile else None
+		self.profilefile = None  # where dump() put the pstats
+
+	# Time what's in the with as stage name. counts(), if given, is called after (unless the stage raised: what it counts may not be there), and what it returns goes in the stage's entry
+	@contextlib.contextmanager
+	def stage(self, name, counts=None):
+		if self.profiler:
+			self.profiler.enable()
+		tracing = tracemalloc.is_tracing()
+		snapshot = tracing and self.snapshots and tracemalloc.take_snapshot()
+		if tracing:
+			tracemalloc.reset_peak()
+			before = tracemalloc.get_traced_memory()[0]
+		wall = time.perf_counter()
+		cpu = time.thread_time()
+		done = False
+		try:
+			yield
+			done = True
+		finally:
+			entry = {'stage': name, 'wall': time.perf_counter() - wall, 'cpu': time.thread_time() - cpu}
+			if tracing:
+				current, peak = tracemalloc.get_traced_memory()
+				entry['peak'] = peak - before
+				entry['allocated'] = current - before
+			if snapshot:
+				entry['top'] = topallocations(snapshot, tracemalloc.take_snapshot(), self.snapshots)
+			if self.profiler:
+				self.profiler.disable()
+			if counts and done:
+				entry.update(counts())
+				if snapshot:
+					entry['pernode'] = entry['allocated'] / entry['nodes'] if entry.get('nodes') else None
+					entry['perpath'] = entry['allocated'] / entry['pathids'] if entry.get('pathids', 0) > 1 else None  # one path id is just the root: no paths yet (or values mode)
+			self.stages.append(entry)
+
+	def total(self, key):
+		return sum(entry[key] for entry in self.stages)
+
+	def asdict(self):
+		return {'name': self.name, 'stages': self.stages, 'wall': self.total('wall'), 'cpu': self.total('cpu'), 'profile': self.profilefile}
+
+	# Server-Timing header value: each stage's wall time, in ms, so browsers' dev tools show them on the request's Timing tab
+	def servertiming(self):
+		return ', '.join(f"{entry['stage']};dur={entry['wall']*1000:.1f}" for entry in self.stages)
+
+	# Write the profile (if profiling) as a pstats file named filename
+	def dump(self, filename):
+		if self.profiler:
+			self.profiler.dump_stats(filename)
+			self.profilefile = filename
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+
+# whatis: VarMap, an immutable (persistent) mapping for allvars()' var values. set() gives a new VarMap that shares everything with the old one but the few trie nodes on the way down to the changed key, so handing a node's vars on to each of its children costs nothing and a *set doesn't copy the rest of the vars.
+# Usage: vars = VarMap().set('strength', 50), then vars2 = vars.set('strength', 60) (vars still has 50), vars2['strength'], 'strength' in vars2, dict(vars2). Iterates in insertion order, like a dict.
+# It's a hash array mapped trie (HAMT), what clojure's maps and python's own contextvars use: each level of the trie takes the next 5 bits of the key's hash, and a branch only has room for the children it actually has (bitmap says which).
+
+from collections.abc import Mapping
+from itertools import count
+
+BITS = 5
+MASK = (1 << BITS) - 1
+
+# Order keys were first added in, across all VarMaps (a key keeps its number when its value changes)
+seq = count()
+
+def popcount(n):
+	return bin(n).count('1')
+
+class Leaf():
+	__slots__ = ('hash', 'key', 'val', 'seq')
+
+	def __init__(self, hash, key, val, seq):
+		self.hash = hash
+		self.key = key
+		self.val = val
+		self.seq = seq
+
+# Keys whose hashes are exactly the same
+class Bucket():
+	__slots__ = ('hash', 'leaves')
+
+	def __init__(self, hash, leaves):
+		self.hash = hash
+		self.leaves = leaves
+
+class Branch():
+	__slots__ = ('bitmap', 'children')
+
+	def __init__(self, bitmap, children):
+		self.bitmap = bitmap
+		self.children = children
+
+def find(node, hash, key):
+	shift = 0
+	while isinstance(node, Branch):
+		bit = 1 << ((hash >> shift) & MASK)
+		if not node.bitmap & bit:
+			return None
+		node = node.children[popcount(node.bitmap & (bit - 1))]
+		shift += BITS
+	if isinstance(node, Leaf):
+		return node if node.hash == hash and node.key == key else None
+	if node is not None and node.hash == hash:
+		for leaf in node.leaves:
+			if leaf.key == key:
+				return leaf
+	return None
+
+# node (the subtrie at depth shift) with leaf put in, as a new subtrie. Only the nodes on leaf's way down are new
+def insert(node, shift, leaf):
+	if node is None:
+		return leaf
+	if isinstance(node, Branch):
+		bit = 1 << ((leaf.hash >> shift) & MASK)
+		i = popcount(node.bitmap & (bit - 1))
+		if node.bitmap & bit:
+			children = list(node.children)
+			children[i] = insert(children[i], shift + BITS, leaf)
+			return Branch(node.bitmap, tuple(children))
+		return Branch(node.bitmap | bit, node.children[:i] + (leaf,) + node.children[i:])
+	if node.hash == leaf.hash:
+		if isinstance(node, Leaf):
+			if node.key == leaf.key:
+				return leaf
+			return Bucket(leaf.hash, (node, leaf))
+		leaves = tuple(old for old in node.leaves if old.key != leaf.key)
+		return Bucket(leaf.hash, leaves + (leaf,))
+	# a leaf or bucket in the way, with a different hash: push it down a level
+	return insert(insert(Branch(0, ()), shift, node), shift, leaf)
+
+class VarMap(Mapping):
+	__slots__ = ('root', 'size', 'order')
+
+	def __init__(self, root=None, size=0):
+		self.root = root
+		self.size = size
+		self.order = None  # leaves in insertion order, made the first time it's iterated
+
+	def set(self, key, val):
+		hash_ = hash(key)
+		old = find(self.root, hash_, key)
+		if old is not None and old.val is val:
+			return self
+		leaf = Leaf(hash_, key, val, next(seq) if old is None else old.seq)
+		return VarMap(insert(self.root, 0, leaf), self.size + (old is None))
+
+	def __getitem__(self, key):
+		leaf = find(self.root, hash(key), key)
+		if leaf is None:
+			raise KeyError(key)
+		return leaf.val
+
+	def __contains__(self, key):
+		return find(self.root, hash(key), key) is not None
+
+	def __len__(self):
+		return self.size
+
+	def leaves(self):
+		if self.order is None:
+			leaves = []
+			stack = [self.root] if self.root is not None else []
+			while stack:
+				node = stack.pop()
+				if isinstance(node, Branch):
+					stack.extend(node.children)
+				elif isinstance(node, Leaf):
+					leaves.append(node)
+				else:
+					leaves.extend(node.leaves)
+			leaves.sort(key=lambda leaf: leaf.seq)
+			self.order = leaves
+		return self.order
+
+	def __iter__(self):
+		return (leaf.key for leaf in self.leaves())
+
+	def items(self):
+		return [(leaf.key, leaf.val) for leaf in self.leaves()]
+
+	def __repr__(self):
+		return f'VarMap({dict(self.items())!r})'
@@ -0,0 +1,6 @@
+# The modules are run from mysite/ (see flask_app.py), so that's where the tests import them from
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mysite'))
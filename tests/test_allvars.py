@@ -0,0 +1,97 @@
+# allvars()' modes on scenes with a *goto back up (a loop), each with its own default config.ini
+
+import pytest
+
+from cstree import CStree, LoopError
+
+# str goes up 10 every time around, for as long as you like
+TRAINING = '''*create str 50
+*label top
+*choice
+	#Train
+		*set str +10
+		*goto top
+	#Leave
+		*goto done
+*label done
+*finish
+'''
+
+# round and round until str gets to 80
+UPTO80 = '''*create str 50
+*label top
+*if str < 80
+	*set str +10
+	*goto top
+*finish
+'''
+
+def maketree(tmp_path, text):
+	scenefile = tmp_path / 'scene.txt'
+	scenefile.write_text(text)
+	tree = CStree(str(tmp_path / 'config.ini'))
+	tree.readscene(str(scenefile), parser='python')
+	return tree
+
+def values(node, var):
+	return {str(val) for val in node.vars.get(var, {}).values()}
+
+def end(tree):
+	return tree.nodes[tree.ln2id(-1)]
+
+def test_values_mode_goes_around_loops(tmp_path):
+	tree = maketree(tmp_path, UPTO80)
+	tree.allvars('values')
+	assert values(end(tree), 'str') == {'80'}
+	assert not end(tree).unbounded
+
+def test_values_mode_has_what_sampling_sees(tmp_path):
+	tree = maketree(tmp_path, TRAINING)
+	tree.allvars('sample')
+	sampled = values(end(tree), 'str')
+	assert len(sampled) > 1
+	tree = maketree(tmp_path, TRAINING)
+	tree.allvars('values')
+	assert sampled <= values(end(tree), 'str')
+
+def test_values_mode_cuts_off_unbounded_vars(tmp_path):
+	tree = maketree(tmp_path, TRAINING)
+	tree.config.set('main', 'maxvalues', '20')
+	tree.allvars('values')
+	assert 'str' in end(tree).unbounded
+	assert len(values(end(tree), 'str')) <= 22
+
+def test_paths_mode_raises_on_loops(tmp_path):
+	tree = maketree(tmp_path, TRAINING)
+	with pytest.raises(LoopError):
+		tree.allvars('paths')
+
+def test_estimate_counts_loops(tmp_path):
+	tree = maketree(tmp_path, TRAINING)
+	estimated = tree.estimate()
+	assert estimated['loops'] == 1
+	assert tree.choosemode(estimated) == 'values'
+	tree = maketree(tmp_path, TRAINING.replace('*goto top', '*goto done'))
+	estimated = tree.estimate()
+	assert estimated['loops'] == 0
+	assert tree.choosemode(estimated) == 'paths'
+
+def test_auto_mode_on_loops(tmp_path):
+	tree = maketree(tmp_path, UPTO80)
+	tree.allvars('auto')
+	assert tree.estimated['mode'] == 'values'
+	assert values(end(tree), 'str') == {'80'}
+
+def test_countpaths_skips_loops(tmp_path):
+	tree = maketree(tmp_path, TRAINING)
+	tree.allvars('sample')
+	assert tree.countpaths() is False
+	assert end(tree).npaths is None
+	assert end(tree).histogram == {}
+
+def test_countpaths(tmp_path):
+	tree = maketree(tmp_path, TRAINING.replace('*goto top', '*goto done'))
+	tree.allvars('paths')
+	assert tree.countpaths() is True
+	assert end(tree).npaths == 2
+	assert end(tree).histogram == {'str': {50: 1, 60: 1}}
@@ -0,0 +1,49 @@
+# compilecommand() on the choicescript that isn't plain python: fairmath, modulo, & and numbers-only * and /
+
+import pytest
+
+import cseval
+
+def run(label, **vars):
+	return cseval.compilecommand(label)(vars)
+
+def test_fairmath():
+	assert run('SET strength %+ 20', strength=50) == 60
+	assert run('SET strength %- 20', strength=50) == 40
+	assert run('SET strength %+ 50', strength=90) == 95
+	assert run('SET strength %- 50', strength=10) == 5
+
+def test_modulo():
+	assert run('SET n n modulo 3', n=10) == 1
+	assert run('IF (n modulo 2) = 0', n=4) is True
+
+def test_concatenation():
+	assert run('SET name & " the Bold"', name='Ann') == 'Ann the Bold'
+	assert run('SET name name & n', name='Ann', n=2) == 'Ann2'
+
+def test_times_takes_numbers_only():
+	assert run('SET n * 3', n='5') == 15
+	assert run('SET s * 999999999', s='abc') is None
+	assert run('SET n / 2', n=True) is None
+
+def test_target_and_varnames():
+	expr = cseval.compilecommand('SET strength %+ leadership')
+	assert expr.target == 'strength'
+	assert set(expr.varnames) == {'strength', 'leadership'}
+
+def test_divide_and_modulo_take_numbers_only():
+	assert run('SET n / "4"', n=10) == 2.5
+	assert run('SET n n modulo 3', n='abc') is None
+	assert run('SET n / 2', n='abc') is None
+
+def test_vectorized_times():
+	np = pytest.importorskip('numpy')
+	f = cseval.compilecommand('SET n * 2').vectorized()
+	assert f({'n': np.array([1, 2, 3])}).tolist() == [2, 4, 6]
+
+def test_bad_expression():
+	assert run('SET n +', n=1) is None
+	assert run('IF (n > 2', n=3) is None
+
+def test_cache_is_bounded():
+	assert cseval.compilecommand.cache_info().maxsize == 4096
@@ -0,0 +1,29 @@
+# csparse against choicescript-graphviz: mygame-orig.txt.dot is what `java -cp choicescript-graphviz Main uploads/mygame-orig.txt` printed
+
+import os
+
+import pygraphviz as pgv
+
+import csparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCENE = os.path.join(os.path.dirname(HERE), 'uploads', 'mygame-orig.txt')
+JAVADOT = os.path.join(HERE, 'mygame-orig.txt.dot')
+
+def javadot():
+	with open(JAVADOT) as f:
+		return f.read()
+
+def test_scene2dot_matches_java():
+	assert csparse.scene2dot(csparse.parsescenefile(SCENE)) == javadot()
+
+# What the rest of cstree sees: the same nodes and edges, with the same attributes, in the same order
+def test_scene2agraph_matches_java():
+	java = pgv.AGraph(JAVADOT, strict=False, directed=True)
+	ours = csparse.scene2agraph(csparse.parsescenefile(SCENE))
+	assert [(n, dict(n.attr)) for n in ours.nodes()] == [(n, dict(n.attr)) for n in java.nodes()]
+	assert [(e, dict(e.attr)) for e in ours.edges()] == [(e, dict(e.attr)) for e in java.edges()]
+
+def test_parsescene_text():
+	with open(SCENE, encoding='utf-8') as f:
+		assert csparse.parsescene(f.read()) == csparse.parsescenefile(SCENE)
@@ -0,0 +1,37 @@
+# PathTrie: paths as interned ids
+
+from pathtrie import PathTrie
+
+def path(paths, *lns):
+	p = paths.ROOT
+	for ln in lns:
+		p = paths.extend(p, ln)
+	return p
+
+def test_same_path_same_id():
+	paths = PathTrie()
+	assert path(paths, 3, 10, 25) == path(paths, 3, 10, 25)
+	assert path(paths, 3, 10) != path(paths, 3, 25)
+	assert paths.extend(paths.ROOT, '3') == path(paths, 3)  # startln's come in as strings
+	assert len(paths) == 5  # root, 3, 3.10, 3.10.25, 3.25
+
+def test_str_lns_sum():
+	paths = PathTrie()
+	p = path(paths, 3, 10, 25)
+	assert paths.str(p) == '3.10.25'
+	assert paths.str(paths.ROOT) == ''
+	assert paths.lns(p) == [3, 10, 25]
+	assert paths.sum[p] == 38
+	assert paths.depth[p] == 3
+	# made from a longer path's strings, and the other way around
+	assert paths.str(path(paths, 3, 10)) == '3.10'
+	assert paths.str(path(paths, 3, 10, 25, 40)) == '3.10.25.40'
+
+def test_rebase():
+	paths = PathTrie()
+	old = path(paths, 3, 10)
+	new = path(paths, 5)
+	assert paths.rebase(path(paths, 3, 10, 25, 40), old, new) == path(paths, 5, 25, 40)
+	assert paths.rebase(old, old, new) == new
+	p = path(paths, 3, 10, 25)
+	assert paths.rebase(p, old, old) == p
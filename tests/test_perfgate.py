@@ -0,0 +1,27 @@
+# perfgate.compare(): what fails the gate
+
+import perfgate
+
+def entry(cpu=0.1, peak=1000000):
+	return {'wall': cpu, 'cpu': cpu, 'peak': peak, 'allocated': 0}
+
+def result(mode='paths', nodes=10, **stages):
+	return {'mode': mode, 'nodes': nodes, 'error': None, 'stages': stages or {'allvars': entry(), 'makedot': entry()}}
+
+def worse(baseline, results):
+	return perfgate.compare(baseline, results, 0.5, 0.01, 0.1, 64000)[1]
+
+def test_same_passes():
+	assert not worse({'a': result()}, {'a': result()})
+
+def test_slower_or_bigger_fails():
+	assert worse({'a': result()}, {'a': result(allvars=entry(cpu=0.2), makedot=entry())})
+	assert worse({'a': result()}, {'a': result(allvars=entry(peak=2000000), makedot=entry())})
+
+def test_changed_scene_fails():
+	assert worse({'a': result()}, {'a': result(mode='values')})
+	assert worse({'a': result()}, {'a': result(nodes=11)})
+
+def test_missing_stage_fails():
+	assert worse({'a': result()}, {'a': result(allvars=entry())})
+	assert not worse({'a': result(allvars=entry())}, {'a': result()})  # a new one doesn't
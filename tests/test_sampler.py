@@ -0,0 +1,46 @@
+# sampler on small scenes in CStree.samplegraph()'s form: the same seed always gives the same walks, however many workers
+
+import sampler
+
+# *create str 50, then a *choice: *set str +10, or not
+CHOICE = {
+	'0': ('node', '0', 'START', ('1',), None),
+	'1': ('var', '1', 'CREATE str 50', ('2',), ('CREATE', 'str', '50')),
+	'2': ('node', '2', '*', ('3', '4'), None),
+	'3': ('var', '4', 'SET str +10', ('5',), ('SET', 'str', '+10')),
+	'4': ('node', '6', '*', ('5',), None),
+	'5': ('node', '-1', 'END', (), None),
+}
+
+# *label top, *goto top: no way out
+ENDLESS = {
+	'0': ('node', '0', 'START', ('1',), None),
+	'1': ('node', '1', 'top', ('1',), None),
+}
+
+def test_walks_see_both_sides():
+	seen, truncated = sampler.sample(CHOICE, '0', 200, seed=1)
+	assert truncated == 0
+	count, vars = seen['5']
+	assert count == 200
+	assert set(vars['str']) == {'50', 60}
+	assert sum(valcount for valcount, path in vars['str'].values()) == 200
+	assert vars['str'][60][1] == ('1', '4')
+	assert vars['str']['50'][1] == ('1',)
+
+def test_same_seed_same_walks():
+	assert sampler.sample(CHOICE, '0', 300, seed=3) == sampler.sample(CHOICE, '0', 300, seed=3)
+	assert sampler.sample(CHOICE, '0', 300, seed=3) != sampler.sample(CHOICE, '0', 300, seed=4)
+
+def test_workers_dont_change_the_walks():
+	assert sampler.sample(CHOICE, '0', 300, seed=3, workers=2) == sampler.sample(CHOICE, '0', 300, seed=3, workers=1)
+
+def test_endless_loop_is_cut_short():
+	seen, truncated = sampler.sample(ENDLESS, '0', 50)
+	assert truncated == 50
+	assert seen['1'][0] == 50 * (sampler.STEPSPERNODE * len(ENDLESS) - 1)
+
+def test_confidence():
+	# one value seen on only one walk of 10: about 1 in 10 of the next walks could bring another
+	assert sampler.confidence({'a': [1, ()], 'b': [9, ()]}, 10) == 0.9
+	assert sampler.confidence({'a': [10, ()]}, 10) == 1.0
@@ -0,0 +1,94 @@
+# VarMap against a plain dict, with hashes picked to make it split branches and fill buckets
+
+import random
+
+from varmap import VarMap, Bucket, Branch, BITS
+
+# A key with whatever hash it's given
+class Key():
+	def __init__(self, name, hash):
+		self.name = name
+		self.hash = hash
+
+	def __hash__(self):
+		return self.hash
+
+	def __eq__(self, other):
+		return isinstance(other, Key) and (self.name, self.hash) == (other.name, other.hash)
+
+	def __repr__(self):
+		return f'Key({self.name!r})'
+
+def test_set_and_get():
+	vars = VarMap().set('strength', 50).set('name', 'Ann')
+	assert vars['strength'] == 50
+	assert 'name' in vars
+	assert 'charm' not in vars
+	assert len(vars) == 2
+	assert dict(vars) == {'strength': 50, 'name': 'Ann'}
+
+def test_set_leaves_the_old_one_alone():
+	vars = VarMap().set('strength', 50)
+	vars2 = vars.set('strength', 60).set('charm', 1)
+	assert vars['strength'] == 50
+	assert 'charm' not in vars
+	assert vars2['strength'] == 60
+	assert len(vars) == 1 and len(vars2) == 2
+
+def test_same_value_is_the_same_map():
+	val = object()
+	vars = VarMap().set('a', val)
+	assert vars.set('a', val) is vars
+
+def test_insertion_order():
+	vars = VarMap()
+	for key in ['c', 'a', 'b']:
+		vars = vars.set(key, 0)
+	vars = vars.set('a', 1)  # changing a value keeps its place
+	assert list(vars) == ['c', 'a', 'b']
+	assert vars.items() == [('c', 0), ('a', 1), ('b', 0)]
+
+def test_same_hash_goes_in_a_bucket():
+	a, b, c = Key('a', 7), Key('b', 7), Key('c', 7)
+	vars = VarMap().set(a, 1).set(b, 2)
+	assert isinstance(vars.root, Bucket)
+	vars2 = vars.set(c, 3).set(a, 4)
+	assert dict(vars2) == {a: 4, b: 2, c: 3}
+	assert len(vars2) == 3
+	assert dict(vars) == {a: 1, b: 2}
+	assert Key('d', 7) not in vars2
+
+def test_split_when_low_bits_match():
+	# same first two levels' bits, different third: a leaf pushed down two levels
+	a = Key('a', 3)
+	b = Key('b', 3 + (1 << (2 * BITS)))
+	vars = VarMap().set(a, 1).set(b, 2)
+	assert isinstance(vars.root, Branch)
+	assert isinstance(vars.root.children[0], Branch)
+	assert vars[a] == 1 and vars[b] == 2
+
+def test_bucket_pushed_down_by_another_hash():
+	a, b = Key('a', 5), Key('b', 5)
+	c = Key('c', 5 + (1 << BITS))
+	vars = VarMap().set(a, 1).set(b, 2).set(c, 3)
+	assert dict(vars) == {a: 1, b: 2, c: 3}
+
+def test_against_dict():
+	rng = random.Random(0)
+	model = {}
+	vars = VarMap()
+	history = []
+	for i in range(3000):
+		# few enough hashes that some collide
+		key = Key(rng.randrange(500), rng.randrange(300))
+		val = rng.randrange(10)
+		model[key] = val
+		vars = vars.set(key, val)
+		if i % 500 == 0:
+			history.append((vars, dict(model)))
+	assert len(vars) == len(model)
+	assert dict(vars) == model
+	for key in model:
+		assert vars[key] == model[key]
+	for old, oldmodel in history:
+		assert dict(old) == oldmodel